@@ -0,0 +1,73 @@
+# Streaming a compressed release straight into the parser vs. decompressing it to disk first.
+# Reports wall-clock time and the bytes read/written by the process (from /proc/self/io).
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from common import simulated_xml
+
+from parsing import iter_drugbank_drugs, open_drugbank
+from transformations import build_all_dataframes
+
+
+def _io_counters():
+    # rchar / wchar count every byte passed through read/write syscalls
+    with open('/proc/self/io') as f:
+        counters = dict(line.split(': ') for line in f.read().splitlines())
+    return int(counters['rchar']), int(counters['wchar'])
+
+
+def _compress(xml_path, suffix):
+    compressed_path = f'{xml_path}{suffix}'
+    if os.path.exists(compressed_path):
+        return compressed_path
+    if suffix == '.zip':
+        with zipfile.ZipFile(compressed_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.write(xml_path, 'full database.xml')
+    else:
+        opener = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}[suffix]
+        with open(xml_path, 'rb') as src, opener(compressed_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+    return compressed_path
+
+
+def decompress_then_parse(compressed_path):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        xml_path = os.path.join(tmp_dir, 'drugbank.xml')
+        with open_drugbank(compressed_path) as src, open(xml_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        return build_all_dataframes(iter_drugbank_drugs(xml_path))
+
+
+def stream_parse(compressed_path):
+    return build_all_dataframes(iter_drugbank_drugs(compressed_path))
+
+
+def measure(function, path):
+    read_before, written_before = _io_counters()
+    start = time.perf_counter()
+    function(path)
+    elapsed = time.perf_counter() - start
+    read_after, written_after = _io_counters()
+    return elapsed, read_after - read_before, written_after - written_before
+
+
+def main(total_drugs=20000):
+    xml_path = simulated_xml(total_drugs)
+    print(f'{total_drugs} drugs, {os.path.getsize(xml_path) / 1e6:.0f} MB uncompressed')
+
+    for suffix in ['.gz', '.bz2', '.xz', '.zip']:
+        compressed_path = _compress(xml_path, suffix)
+        print(f'{suffix} ({os.path.getsize(compressed_path) / 1e6:.1f} MB)')
+        for label, function in [('decompress then parse', decompress_then_parse), ('stream', stream_parse)]:
+            elapsed, read, written = measure(function, compressed_path)
+            print(f'  {label:22} {elapsed:6.2f} s   read {read / 1e6:7.1f} MB   written {written / 1e6:7.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
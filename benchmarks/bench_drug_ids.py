@@ -0,0 +1,62 @@
+# Typical joins and group-bys keyed on drugbank_id: string keys vs. the shared
+# int32 drug ID dictionary (encode_drug_ids), on 200k drugs (common.tiled_tables).
+import pandas as pd
+
+from common import tiled_tables, timed
+
+from analyses import approved_and_non_withdrawn_drugs, count_pathways_per_drug
+from transformations import STRING_DTYPE, drug_id_columns, encode_drug_ids
+
+TABLES = ['drugs', 'products', 'targets', 'groups', 'pathways_to_drugs', 'drug_interactions']
+
+
+def _with_string_ids(tables, dtype):
+    return {table: df.astype({column: dtype for column in drug_id_columns(table)}) for table, df in tables.items()}
+
+
+def _id_memory(tables):
+    # the dictionary is shared by every encoded column, count it once
+    total, dictionaries = 0, {}
+    for table, df in tables.items():
+        for column in drug_id_columns(table):
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                total += values.cat.codes.nbytes
+                dictionaries[id(values.dtype.categories)] = values.dtype.categories.memory_usage(deep=True)
+            else:
+                total += values.memory_usage(deep=True, index=False)
+    return total + sum(dictionaries.values())
+
+
+JOINS = {
+    'targets x groups': lambda t: t['targets'].merge(t['groups'], on='drugbank_id'),
+    'products x drugs': lambda t: t['products'].merge(t['drugs'][['drugbank_id', 'name']], on='drugbank_id'),
+    'interactions x drugs': lambda t: t['drug_interactions'].merge(
+        t['drugs'][['drugbank_id', 'type']].rename(columns={'drugbank_id': 'other_drugbank_id'}), on='other_drugbank_id'),
+    'count_pathways_per_drug': lambda t: count_pathways_per_drug(t['pathways_to_drugs']),
+    'approved_and_non_withdrawn': lambda t: approved_and_non_withdrawn_drugs(t['groups']),
+}
+
+
+def main(total_drugs=20000, copies=10):
+    tables = tiled_tables(total_drugs, TABLES, copies)
+    t_encode, encoded = timed(encode_drug_ids, tables, repeat=1)
+    variants = {
+        'object': _with_string_ids(tables, object),
+        'string': _with_string_ids(tables, STRING_DTYPE),
+        'int32 codes': encoded,
+    }
+
+    dictionary = encoded['drugs']['drugbank_id'].cat.categories
+    print(f'{total_drugs * copies} drugs, {len(dictionary)} IDs in the dictionary, encoded in {t_encode:.2f} s')
+    print(f'{"":28}' + ''.join(f'{name:>13}' for name in variants))
+    for name, join in JOINS.items():
+        times = [timed(join, variant)[0] for variant in variants.values()]
+        print(f'{name:28}' + ''.join(f'{t * 1000:10.0f} ms' for t in times) + f'  ({times[1] / times[2]:.1f}x)')
+
+    memory = [_id_memory(variant) / 1e6 for variant in variants.values()]
+    print(f'{"ID columns memory":28}' + ''.join(f'{mb:10.1f} MB' for mb in memory))
+
+
+if __name__ == '__main__':
+    main()
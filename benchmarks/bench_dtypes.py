@@ -0,0 +1,30 @@
+# Memory of every table with the declared dtypes (categoricals + string[pyarrow])
+# compared with the same data as object columns holding one Python str per cell.
+from common import simulated_xml, timed
+
+from parsing import parse_drugbank_xml
+from transformations import build_all_dataframes
+
+
+def _megabytes(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def main(total_drugs=20000):
+    root = parse_drugbank_xml(simulated_xml(total_drugs))
+    t_build, tables = timed(build_all_dataframes, root, repeat=1)
+    print(f'{total_drugs} drugs, all tables built in {t_build:.2f} s')
+
+    print(f'{"table":20} {"rows":>8} {"object MB":>10} {"typed MB":>9} {"saved":>6}')
+    total_object = total_typed = 0
+    for table, df in tables.items():
+        object_mb = _megabytes(df.astype(object))
+        typed_mb = _megabytes(df)
+        total_object += object_mb
+        total_typed += typed_mb
+        print(f'{table:20} {len(df):8} {object_mb:10.1f} {typed_mb:9.1f} {1 - typed_mb / object_mb:6.0%}')
+    print(f'{"total":29} {total_object:10.1f} {total_typed:9.1f} {1 - total_typed / total_object:6.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# Per-table extraction time of three ways to read the columns declared in TABLE_SCHEMAS:
+#   findtext       ElementPath strings built per call, like the original builders
+#   xpath          one precompiled etree.XPath per column
+#   compiled tree  the child-tag tree transformations.py compiles at import (what the builders use)
+# Only the record extraction is timed, DataFrame construction is the same for all three.
+from lxml import etree
+
+from common import simulated_xml, timed
+
+from parsing import parse_drugbank_xml, NAMESPACE
+from transformations import TABLE_SCHEMAS, _COMPILED_TABLES, _DRUG_FIELDS, _NAMESPACES, _index_drug
+
+
+def _element_path(path):
+    return '/'.join(f'{NAMESPACE}{step}' for step in path.split('/'))
+
+
+def _findtext_value(row, spec):
+    if callable(spec):
+        return spec(row)
+    if spec == '.':
+        return row.text
+    *steps, last = spec.split('/')
+    if last.startswith('@'):
+        element = row.find(_element_path('/'.join(steps))) if steps else row
+        return element.get(last[1:]) if element is not None else None
+    return row.findtext(_element_path(spec))
+
+
+def _is_drug_field(spec):
+    # DRUG_ID and DRUG_NAME columns are read once per drug, like in transformations.py
+    return any(spec is field for field in _DRUG_FIELDS)
+
+
+def _findtext_rows(element, schema, drug_values, records, values=None):
+    rows = element.findall(_element_path(schema['rows'])) if schema['rows'] else [element]
+    for row in rows:
+        if 'required' in schema and row.find(_element_path(schema['required'])) is None:
+            continue
+        row_values = dict(values or {})
+        for name, spec in schema['columns'].items():
+            if _is_drug_field(spec):
+                row_values[name] = drug_values[_DRUG_FIELDS.index(spec)]
+            elif spec is not None:
+                row_values[name] = _findtext_value(row, spec)
+        if 'nested' in schema:
+            _findtext_rows(row, schema['nested'], drug_values, records, row_values)
+        else:
+            records.append(row_values)
+
+
+def findtext_extract(drugs, table):
+    records = []
+    for drug in drugs:
+        drug_id = drug.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]')
+        name = drug.find(f'{NAMESPACE}name')
+        _findtext_rows(drug, TABLE_SCHEMAS[table], (drug_id, name.text if name is not None else None), records)
+    return records
+
+
+def _xpath(path):
+    return etree.XPath('/'.join(step if step.startswith('@') or step == '.' else f'db:{step}' for step in path.split('/')),
+                       namespaces=_NAMESPACES, smart_strings=False)
+
+
+def _compile_xpaths(schema):
+    columns = {}
+    for name, spec in schema['columns'].items():
+        if spec is None or _is_drug_field(spec) or callable(spec):
+            columns[name] = spec
+        else:
+            columns[name] = _xpath(spec)
+    return {
+        'rows': _xpath(schema['rows']) if schema['rows'] else None,
+        'required': _xpath(schema['required']) if 'required' in schema else None,
+        'columns': columns,
+        'nested': _compile_xpaths(schema['nested']) if 'nested' in schema else None,
+    }
+
+
+_XPATH_TABLES = {table: _compile_xpaths(schema) for table, schema in TABLE_SCHEMAS.items()}
+_PRIMARY_ID = etree.XPath('db:drugbank-id[@primary="true"][1]/text()', namespaces=_NAMESPACES, smart_strings=False)
+_DRUG_NAME = etree.XPath('db:name[1]', namespaces=_NAMESPACES)
+
+
+def _xpath_rows(element, compiled, drug_values, records, values=None):
+    rows = compiled['rows'](element) if compiled['rows'] is not None else [element]
+    for row in rows:
+        if compiled['required'] is not None and not compiled['required'](row):
+            continue
+        row_values = dict(values or {})
+        for name, xpath in compiled['columns'].items():
+            if _is_drug_field(xpath):
+                row_values[name] = drug_values[_DRUG_FIELDS.index(xpath)]
+            elif isinstance(xpath, etree.XPath):
+                result = xpath(row)
+                if not result:
+                    row_values[name] = None
+                else:
+                    first = result[0]
+                    row_values[name] = first if isinstance(first, str) else (first.text or '')
+            elif xpath is not None:
+                row_values[name] = xpath(row)
+        if compiled['nested'] is not None:
+            _xpath_rows(row, compiled['nested'], drug_values, records, row_values)
+        else:
+            records.append(row_values)
+
+
+def xpath_extract(drugs, table):
+    records = []
+    for drug in drugs:
+        ids, names = _PRIMARY_ID(drug), _DRUG_NAME(drug)
+        drug_values = (ids[0] if ids else None, names[0].text if names else None)
+        _xpath_rows(drug, _XPATH_TABLES[table], drug_values, records)
+    return records
+
+
+def _drug_values(drug_id, children):
+    # (drug ID, drug name), the drug-level values build_all_dataframes passes to extract
+    name = children.get(f'{NAMESPACE}name')
+    return drug_id, name.text if name is not None else None
+
+
+def compiled_extract(drugs, table):
+    compiled = _COMPILED_TABLES[table]
+    buffers = [[] for _ in compiled.columns]
+    for drug in drugs:
+        drug_id, children = _index_drug(drug)
+        compiled.extract(drug, _drug_values(drug_id, children), children, buffers)
+    return buffers
+
+
+def compiled_extract_all(drugs):
+    # the builders' real situation: the drug index is shared by every table
+    buffers = {table: [[] for _ in compiled.columns] for table, compiled in _COMPILED_TABLES.items()}
+    for drug in drugs:
+        drug_id, children = _index_drug(drug)
+        drug_values = _drug_values(drug_id, children)
+        for table, compiled in _COMPILED_TABLES.items():
+            compiled.extract(drug, drug_values, children, buffers[table])
+    return buffers
+
+
+def main(total_drugs=20000):
+    root = parse_drugbank_xml(simulated_xml(total_drugs))
+    drugs = root.findall(f'{NAMESPACE}drug')
+
+    print(f'{total_drugs} drugs, seconds per table (best of 3)')
+    totals = [0.0, 0.0, 0.0]
+    print(f'{"table":20} {"rows":>8} {"findtext":>9} {"xpath":>9} {"compiled":>9} {"gain":>6}')
+    for table in TABLE_SCHEMAS:
+        t_findtext, rows = timed(findtext_extract, drugs, table)
+        t_xpath, xpath_rows = timed(xpath_extract, drugs, table)
+        t_compiled, buffers = timed(compiled_extract, drugs, table)
+        # the three extract the same rows, or the timings are not comparable
+        assert len(rows) == len(xpath_rows) == len(buffers[0]), table
+        print(f'{table:20} {len(rows):8} {t_findtext:9.3f} {t_xpath:9.3f} {t_compiled:9.3f} {t_findtext / t_compiled:5.1f}x')
+        totals = [total + t for total, t in zip(totals, (t_findtext, t_xpath, t_compiled))]
+
+    t_all, all_buffers = timed(compiled_extract_all, drugs)
+    assert all(len(all_buffers[table][0]) == len(compiled_extract(drugs, table)[0]) for table in TABLE_SCHEMAS)
+    print(f'{"sum of tables":29} {totals[0]:9.3f} {totals[1]:9.3f} {totals[2]:9.3f} {totals[0] / totals[2]:5.1f}x')
+    print(f'{"all tables, one pass":29} {"":9} {"":9} {t_all:9.3f} {totals[0] / t_all:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Group membership queries on 200k drugs (common.tiled_tables): the original
+# groupby().apply(set) implementation vs. per-drug bitmasks (drugs_matching_groups).
+from itertools import permutations
+
+from common import tiled_tables, timed
+
+from analyses import approved_and_non_withdrawn_drugs, build_group_masks, drugs_matching_groups
+from transformations import encode_drug_ids
+
+
+def _with_sets(df_groups, include, exclude):
+    # the original approach: one Python set per drug, a generator over all of them
+    grouped = df_groups.groupby('drugbank_id', observed=True)['group'].apply(set)
+    return sum(all(group in groups for group in include) and not any(group in groups for group in exclude)
+               for groups in grouped)
+
+
+def main(total_drugs=20000, copies=10):
+    df_groups = encode_drug_ids(tiled_tables(total_drugs, ['groups'], copies))['groups']
+    vocabulary = sorted(df_groups['group'].cat.categories)
+    # every "A but not B" question plus the single groups
+    queries = [([a], [b]) for a, b in permutations(vocabulary, 2)] + [([a], []) for a in vocabulary]
+
+    # the original ran on object columns, where apply(set) is much faster than on categoricals
+    t_sets, expected = timed(_with_sets, df_groups.astype(object), ['approved'], ['withdrawn'], repeat=1)
+    t_wrapper, count = timed(approved_and_non_withdrawn_drugs, df_groups)
+    assert count == expected
+    t_build, group_masks = timed(build_group_masks, df_groups)
+    t_query, _ = timed(drugs_matching_groups, group_masks, ['approved'], ['withdrawn'])
+
+    def all_with_masks():
+        return [len(drugs_matching_groups(group_masks, include, exclude)) for include, exclude in queries]
+
+    t_all, _ = timed(all_with_masks)
+
+    print(f'{total_drugs * copies} drugs, {len(df_groups)} group rows, {len(vocabulary)} groups, '
+          f'masks of {group_masks.masks.dtype} ({group_masks.masks.nbytes / 1e6:.1f} MB)')
+    print(f'  approved and not withdrawn, sets per drug:     {t_sets * 1000:7.1f} ms')
+    print(f'  approved_and_non_withdrawn_drugs (wrapper):    {t_wrapper * 1000:7.1f} ms  '
+          f'({t_sets / t_wrapper:.0f}x)')
+    print(f'  build_group_masks once:                        {t_build * 1000:7.1f} ms')
+    print(f'  one query on the masks:                        {t_query * 1000:7.2f} ms')
+    print(f'  {len(queries)} queries on the masks:                     {t_all * 1000:7.1f} ms  '
+          f'(sets: ~{t_sets * len(queries):.0f} s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Updating the cached tables for a new release: full re-extraction vs patching the
+# previous snapshot (update_drugbank), with a small share of the drugs changed.
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+
+from common import simulated_xml, timed
+
+from cache import update_drugbank
+
+
+def _new_release(xml_path, every):
+    # the file with the indication of every `every`-th drug revised
+    counter = iter(range(10 ** 9))
+
+    def edit(match):
+        return match.group(0) + (b'Revised. ' if next(counter) % every == 0 else b'')
+
+    return re.sub(rb'<indication>', edit, Path(xml_path).read_bytes())
+
+
+def main(total_drugs=20000, every=100):
+    xml_path = simulated_xml(total_drugs)
+    release = _new_release(xml_path, every)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        current = tmp / 'drugbank.xml'
+        shutil.copy(xml_path, current)
+
+        t_full, _ = timed(update_drugbank, current, cache_dir=tmp / 'full', repeat=1)
+        update_drugbank(current, cache_dir=tmp / 'incremental')
+
+        current.write_bytes(release)
+        os.utime(current, ns=(0, 1))
+        t_patch, report = timed(update_drugbank, current, cache_dir=tmp / 'incremental', repeat=1)
+
+    print(f'{total_drugs} drugs, 1 in {every} changed')
+    print(f'  full extraction + snapshot:   {t_full:6.2f} s')
+    print(f'  patch previous snapshot:      {t_patch:6.2f} s  ({t_full / t_patch:.1f}x)')
+    print(f'  change report: {len(report)} rows')
+    print(report.groupby(['table', 'change'], observed=True).size().to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# Interaction lookups on the drug_interactions DataFrame (boolean mask scans)
+# vs. the CSR InteractionGraph, and the memory both take.
+import random
+import tempfile
+
+from common import simulated_xml, timed
+
+from interactions import InteractionGraph
+from transformations import load_tables
+
+
+def main(total_drugs=20000, queries=1000):
+    df = load_tables(simulated_xml(total_drugs), ['drug_interactions'])['drug_interactions']
+    t_build, graph = timed(InteractionGraph.from_dataframe, df, repeat=1)
+    ids = df[['drugbank_id', 'other_drugbank_id']]
+    drug_ids = random.Random(0).sample(list(graph.drug_ids), queries)
+
+    def mask_neighbors():
+        for drug_id in drug_ids:
+            set(df.loc[df['drugbank_id'] == drug_id, 'other_drugbank_id']) | \
+                set(df.loc[df['other_drugbank_id'] == drug_id, 'drugbank_id'])
+
+    def graph_neighbors():
+        for drug_id in drug_ids:
+            graph.neighbors(drug_id)
+
+    t_mask, _ = timed(mask_neighbors, repeat=1)
+    t_graph, _ = timed(graph_neighbors)
+    with tempfile.TemporaryDirectory() as tmp:
+        graph.save(tmp)
+        t_load, loaded = timed(InteractionGraph.load, tmp)
+        t_any, _ = timed(loaded.any_interaction, drug_ids[:50])
+
+    print(f'{total_drugs} drugs, {len(df)} interaction rows, {graph.num_interactions} distinct interactions')
+    print(f'  memory: DataFrame {df.memory_usage(deep=True).sum() / 1e6:.1f} MB '
+          f'(id columns {ids.memory_usage(deep=True).sum() / 1e6:.1f} MB, '
+          f'as objects {ids.astype(object).memory_usage(deep=True).sum() / 1e6:.1f} MB), '
+          f'graph {graph.nbytes() / 1e6:.2f} MB')
+    print(f'  graph built in {t_build * 1000:.0f} ms, memory-mapped load {t_load * 1000:.2f} ms')
+    print(f'  neighbors per drug: mask scan {t_mask / queries * 1e6:.0f} us, '
+          f'graph {t_graph / queries * 1e6:.1f} us ({t_mask / t_graph:.0f}x)')
+    print(f'  any_interaction among 50 drugs: {t_any * 1e6:.0f} us')
+
+
+if __name__ == '__main__':
+    main()
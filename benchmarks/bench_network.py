@@ -0,0 +1,72 @@
+# Whole-network statistics of the interaction graph: networkx (degree histogram, connected
+# components, core numbers, triangles, clustering) vs. the csgraph / NumPy versions in network.py.
+# networkx runs on the 20k simulated graph; network.py also on 10 disjoint copies of it (200k drugs).
+import networkx as nx
+import numpy as np
+from scipy import sparse
+
+from common import simulated_xml, timed
+
+from interactions import InteractionGraph
+from network import connected_components, core_numbers, degree_distribution, network_statistics, triangles
+from transformations import load_tables
+
+
+def _tiled_graph(graph, copies):
+    # `copies` disjoint copies of the graph, drug IDs suffixed by the copy number
+    adjacency = sparse.block_diag([graph.to_scipy()] * copies, format='csr')
+    drug_ids = np.concatenate([np.char.add(graph.drug_ids, f'-{k}') for k in range(copies)])
+    order = np.argsort(drug_ids, kind='stable')
+    adjacency = adjacency[order][:, order]
+    adjacency.sort_indices()
+    return InteractionGraph(drug_ids[order], adjacency.indptr.astype(np.int64), adjacency.indices.astype(np.int32))
+
+
+def _networkx(nx_graph):
+    return {
+        'degree distribution': lambda: nx.degree_histogram(nx_graph),
+        'connected components': lambda: [len(c) for c in nx.connected_components(nx_graph)],
+        'core numbers': lambda: nx.core_number(nx_graph),
+        'triangles': lambda: nx.triangles(nx_graph),
+        'clustering': lambda: nx.clustering(nx_graph),
+    }
+
+
+def _csgraph(graph):
+    return {
+        'degree distribution': lambda: degree_distribution(graph),
+        'connected components': lambda: connected_components(graph),
+        'core numbers': lambda: core_numbers(graph),
+        'triangles': lambda: triangles(graph),
+        'clustering': lambda: triangles(graph),
+    }
+
+
+def main(total_drugs=20000, copies=10):
+    df_interactions = load_tables(simulated_xml(total_drugs), ['drug_interactions'])['drug_interactions']
+    graph = InteractionGraph.from_dataframe(df_interactions)
+    tiled = _tiled_graph(graph, copies)
+
+    t_nx_build, nx_graph = timed(lambda: nx.from_scipy_sparse_array(graph.to_scipy()), repeat=1)
+    nx_graph.remove_edges_from(nx.selfloop_edges(nx_graph))
+    print(f'{len(graph)} drugs, {nx_graph.number_of_edges()} interactions; '
+          f'x{copies}: {len(tiled)} drugs (networkx graph built in {t_nx_build:.2f} s)')
+    print(f'  {"":22} {"networkx":>10} {"csgraph":>10} {"":>8} {"csgraph x" + str(copies):>12}')
+
+    expected_triangles, expected_cores = nx.triangles(nx_graph), nx.core_number(nx_graph)
+    assert triangles(graph)['triangles'].tolist() == [expected_triangles[i] for i in range(len(graph))]
+    assert core_numbers(graph)['core_number'].tolist() == [expected_cores[i] for i in range(len(graph))]
+
+    nx_calls, calls, tiled_calls = _networkx(nx_graph), _csgraph(graph), _csgraph(tiled)
+    for name in nx_calls:
+        t_nx, _ = timed(nx_calls[name], repeat=1)
+        t_cs, _ = timed(calls[name])
+        t_tiled, _ = timed(tiled_calls[name], repeat=1)
+        print(f'  {name:22} {t_nx * 1000:8.0f} ms {t_cs * 1000:7.1f} ms {t_nx / t_cs:7.0f}x {t_tiled * 1000:9.0f} ms')
+
+    t_all, _ = timed(network_statistics, tiled, repeat=1)
+    print(f'  network_statistics x{copies} (every per-drug column): {t_all * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+# Throughput of build_all_dataframes_parallel for a growing number of worker processes.
+# Usage: python bench_parallel.py [total_drugs ...]   (default: 20000 200000)
+import os
+import sys
+
+from common import simulated_xml, timed
+
+from parallel import build_all_dataframes_parallel
+from parsing import parse_drugbank_xml
+from transformations import build_all_dataframes
+
+
+def main(sizes):
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+
+    for total_drugs in sizes:
+        xml_path = simulated_xml(total_drugs)
+        t_serial, _ = timed(lambda: build_all_dataframes(parse_drugbank_xml(xml_path)), repeat=1)
+        print(f'{total_drugs} drugs, serial parse + build_all_dataframes: {t_serial:.2f} s')
+
+        for workers in worker_counts:
+            t_parallel, _ = timed(build_all_dataframes_parallel, xml_path, workers=workers, repeat=1)
+            print(f'  {workers} workers: {t_parallel:7.2f} s  '
+                  f'({total_drugs / t_parallel:,.0f} drugs/s, {t_serial / t_parallel:.2f}x)')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [20000, 200000])
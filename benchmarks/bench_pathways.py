@@ -0,0 +1,84 @@
+# Pathway analytics at 200k drugs: pandas (groupby, self-join on the drug, Python sets)
+# vs. the sparse drug x pathway incidence matrix (pathways.PathwayIncidence).
+# The simulated files reference only ~100 distinct drugs in their pathways, so next to the
+# tiled simulated table the benchmark uses a synthetic pathways_to_drugs table:
+# 200k drugs, 40% of them in 1-8 of 5000 pathways picked with Zipf-like popularity.
+import numpy as np
+import pandas as pd
+
+from common import tiled_tables, timed
+
+from pathways import PathwayIncidence
+from transformations import encode_drug_ids
+
+
+def synthetic_pathways_to_drugs(num_drugs=200000, num_pathways=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    drug_ids = np.char.add('DB', np.char.zfill(np.arange(num_drugs).astype(str), 6))
+    members = rng.choice(num_drugs, size=int(num_drugs * 0.4), replace=False)
+    per_drug = rng.integers(1, 9, size=len(members))
+    popularity = 1 / np.arange(1, num_pathways + 1) ** 0.9
+    pathways = rng.choice(num_pathways, size=per_drug.sum(), p=popularity / popularity.sum())
+    names = np.array([f'Pathway {i} Action Pathway' for i in range(num_pathways)])
+    return pd.DataFrame({
+        'pathway_name': pd.Categorical(names[pathways]),
+        'drugbank_id': pd.Categorical(drug_ids[np.repeat(members, per_drug)], categories=drug_ids),
+        'smpdb-id': pd.Categorical(np.char.add('SMP', np.char.zfill(pathways.astype(str), 7))),
+    })
+
+
+def _pandas_counts(pairs):
+    return pairs.groupby('pathway_name', observed=True)['drugbank_id'].nunique()
+
+
+def _pandas_cooccurrence(pairs):
+    joined = pairs.merge(pairs, on='drugbank_id')
+    joined = joined[joined['pathway_name_x'] < joined['pathway_name_y']]
+    return joined.groupby(['pathway_name_x', 'pathway_name_y']).size()
+
+
+def _pandas_similar(sets, drug_id, k=10):
+    # the loop a pairwise question used to take: one set operation per drug
+    query = sets[drug_id]
+    scores = sorted((-len(query & other) / len(query | other), other_id)
+                    for other_id, other in sets.items() if other_id != drug_id and query & other)
+    return scores[:k]
+
+
+def _run(label, df):
+    pairs = df[['drugbank_id', 'pathway_name']].astype(str).drop_duplicates()
+    t_build, incidence = timed(PathwayIncidence.from_dataframe, df)
+    t_counts_pd, counts_pd = timed(_pandas_counts, pairs)
+    t_counts, counts = timed(incidence.pathway_counts)
+    assert dict(zip(counts['pathway_name'], counts['num_drugs'])) == counts_pd.to_dict()
+
+    t_cooc_pd, cooc_pd = timed(_pandas_cooccurrence, pairs, repeat=1)
+    t_cooc, cooc = timed(incidence.cooccurring_pathways)
+    assert len(cooc) == len(cooc_pd) and cooc['num_drugs'].sum() == cooc_pd.sum()
+
+    members = incidence.drug_ids[np.diff(incidence.matrix.indptr) > 0]
+    queries = members[:: max(1, len(members) // 1000)][:1000]
+    t_sets, sets = timed(lambda: pairs.groupby('drugbank_id')['pathway_name'].apply(set), repeat=1)
+    t_loop, expected = timed(_pandas_similar, sets, queries[0], repeat=1)
+    t_one, similar = timed(incidence.similar_drugs, queries[0])
+    assert list(similar['similar_drugbank_id']) == [other_id for _, other_id in expected]
+    t_batch, _ = timed(incidence.similar_drugs, queries, repeat=1)
+
+    print(f'{label}: {len(incidence)} drugs, {len(incidence.pathways)} pathways, {incidence.matrix.nnz} memberships '
+          f'({incidence.nbytes() / 1e6:.1f} MB), built in {t_build * 1000:.0f} ms')
+    print(f'  drugs per pathway:  pandas {t_counts_pd * 1000:8.1f} ms   matrix {t_counts * 1000:8.2f} ms')
+    print(f'  co-occurrence:      pandas {t_cooc_pd * 1000:8.1f} ms   matrix {t_cooc * 1000:8.2f} ms  '
+          f'({len(cooc)} pathway pairs)')
+    print(f'  top-10 Jaccard, one drug: sets {t_loop * 1000:8.1f} ms (+{t_sets:.1f} s for the sets)   '
+          f'matrix {t_one * 1000:8.2f} ms')
+    print(f'  top-10 Jaccard, {len(queries)} drugs:  matrix {t_batch * 1000:8.1f} ms')
+
+
+def main(total_drugs=20000, copies=10):
+    tiled = encode_drug_ids(tiled_tables(total_drugs, ['pathways_to_drugs'], copies))['pathways_to_drugs']
+    _run(f'simulated x{copies}', tiled)
+    _run('synthetic', synthetic_pathways_to_drugs(total_drugs * copies))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+# Extracting a single table from the file with and without projection pushdown
+# (iter_drugbank_drugs(keep=required_elements(...)) vs. streaming every element).
+from common import simulated_xml, timed
+
+from parsing import iter_drugbank_drugs
+from transformations import TABLE_SCHEMAS, build_all_dataframes, load_tables, required_elements
+
+
+def main(total_drugs=20000):
+    xml_path = simulated_xml(total_drugs)
+
+    print(f'{total_drugs} drugs, seconds to build one table from the file')
+    print(f'{"table":20} {"full":>7} {"projected":>10} {"gain":>6}  kept elements')
+    for table in TABLE_SCHEMAS:
+        t_full, _ = timed(lambda: build_all_dataframes(iter_drugbank_drugs(xml_path), [table]), repeat=1)
+        t_projected, _ = timed(load_tables, xml_path, [table], repeat=1)
+        kept = ', '.join(sorted(required_elements([table])))
+        print(f'{table:20} {t_full:7.2f} {t_projected:10.2f} {t_full / t_projected:5.1f}x  {kept}')
+
+
+if __name__ == '__main__':
+    main()
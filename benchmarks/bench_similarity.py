@@ -0,0 +1,71 @@
+# "Drugs hitting the same targets as X" at 200k drugs: filtering the targets table with
+# pandas vs. the target-profile similarity index (similarity.TargetSimilarityIndex),
+# built in memory and opened from disk. The simulated files only use 12 genes, so next
+# to the tiled simulated table the benchmark uses a synthetic targets table:
+# 200k drugs with 1-10 targets among 4500 genes picked with Zipf-like popularity.
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import tiled_tables, timed
+
+from similarity import TargetSimilarityIndex
+
+
+def synthetic_targets(num_drugs=200000, num_genes=4500, seed=0):
+    rng = np.random.default_rng(seed)
+    drug_ids = np.char.add('DB', np.char.zfill(np.arange(num_drugs).astype(str), 6))
+    per_drug = rng.integers(1, 11, size=num_drugs)
+    popularity = 1 / np.arange(1, num_genes + 1) ** 0.8
+    genes = rng.choice(num_genes, size=per_drug.sum(), p=popularity / popularity.sum())
+    return pd.DataFrame({
+        'drugbank_id': pd.Categorical(np.repeat(drug_ids, per_drug), categories=drug_ids),
+        'gene_name': pd.array(np.char.add('GENE', genes.astype(str)), dtype='string[pyarrow]'),
+    })
+
+
+def _pandas_shared_targets(df_targets, drug_id, k=10):
+    # by hand: the genes of the drug, then the drugs sharing most of them
+    genes = df_targets.loc[df_targets['drugbank_id'] == drug_id, 'gene_name']
+    shared = df_targets[df_targets['gene_name'].isin(genes) & (df_targets['drugbank_id'] != drug_id)]
+    return shared.groupby('drugbank_id', observed=True).size().nlargest(k)
+
+
+def _run(label, df_targets, num_queries=200):
+    t_build, index = timed(TargetSimilarityIndex.from_dataframe, df_targets, repeat=1)
+    path = tempfile.mkdtemp()
+    try:
+        index.save(path)
+        t_load, loaded = timed(TargetSimilarityIndex.load, path)
+
+        rng = np.random.default_rng(1)
+        queries = rng.choice(index.drug_ids, size=num_queries, replace=False)
+        latencies = []
+        for drug_id in queries:
+            start = time.perf_counter()
+            loaded.similar_drugs(drug_id, k=10)
+            latencies.append(time.perf_counter() - start)
+        t_batch, _ = timed(loaded.similar_drugs, queries, repeat=1)
+        t_pandas, _ = timed(lambda: [_pandas_shared_targets(df_targets, drug_id) for drug_id in queries[:10]], repeat=1)
+    finally:
+        shutil.rmtree(path)
+
+    latencies = np.array(latencies) * 1000
+    print(f'{label}: {len(index)} drugs, {len(index.genes)} genes, {index.by_drug.nnz} drug-gene pairs '
+          f'({index.nbytes() / 1e6:.1f} MB), built in {t_build:.2f} s, loaded from disk in {t_load * 1000:.1f} ms')
+    print(f'  one query (top 10): median {np.median(latencies):.2f} ms, p95 {np.percentile(latencies, 95):.2f} ms, '
+          f'max {latencies.max():.2f} ms')
+    print(f'  {num_queries} queries as one batch: {t_batch * 1000:.0f} ms ({t_batch / num_queries * 1000:.2f} ms per drug)')
+    print(f'  pandas filtering (shared gene counts, unweighted): {t_pandas / 10 * 1000:.1f} ms per drug')
+
+
+def main(total_drugs=20000, copies=10):
+    _run(f'simulated x{copies}', tiled_tables(total_drugs, ['targets'], copies)['targets'])
+    _run('synthetic', synthetic_targets(total_drugs * copies))
+
+
+if __name__ == '__main__':
+    main()
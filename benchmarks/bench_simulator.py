@@ -0,0 +1,77 @@
+# simulator.generate_drugs: the original in-memory generator (deepcopy of the template and
+# parsing of a sampled child for every new drug, one tree pretty-printed at the end) vs. the
+# streaming writer. Every run is a fresh process, so its peak RSS is the memory it needed.
+# Then sharded generation (simulator.generate_shards) with one worker, four and every core.
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from copy import deepcopy
+from pathlib import Path
+
+from lxml import etree
+
+from common import PARTIAL_XML, timed
+
+from parsing import NAMESPACE, parse_drugbank_xml
+from simulator import generate_drugs, generate_shards
+
+
+def _in_memory_generate(xml_in, xml_out, total_drugs):
+    # the original implementation
+    root = parse_drugbank_xml(xml_in)
+    child_map = {}
+    for drug in root.findall(f'{NAMESPACE}drug'):
+        for child in drug:
+            if child.tag != f'{NAMESPACE}drugbank-id':
+                child_map.setdefault(child.tag, []).append(etree.tostring(child, encoding='unicode'))
+    template_drug = root.findall(f'{NAMESPACE}drug')[0]
+    for new_id in range(109, 109 + (total_drugs - 100) + 1):
+        new_drug = deepcopy(template_drug)
+        new_drug.find(f'{NAMESPACE}drugbank-id').text = f'DB{new_id:05d}'
+        for child in list(new_drug):
+            if child.tag != f'{NAMESPACE}drugbank-id':
+                new_drug.remove(child)
+        for xml_strings in child_map.values():
+            new_drug.append(etree.fromstring(random.choice(xml_strings)))
+        root.append(new_drug)
+    etree.ElementTree(root).write(xml_out, encoding='utf-8', xml_declaration=True, pretty_print=True)
+
+
+def _run(generate, xml_out, total_drugs):
+    random.seed(0)
+    start = time.perf_counter()
+    generate(str(PARTIAL_XML), xml_out, total_drugs)
+    # ru_maxrss is in KB on Linux
+    return time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main(sizes=(20000, 100000), shards=8):
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        xml_out = str(Path(directory) / 'simulated.xml')
+        for total_drugs in sizes:
+            results = []
+            for generate in (_in_memory_generate, generate_drugs):
+                with context.Pool(1) as pool:
+                    results.append(pool.apply(_run, (generate, xml_out, total_drugs)))
+            size = Path(xml_out).stat().st_size
+            (t_old, rss_old), (t_new, rss_new) = results
+            print(f'{total_drugs} drugs ({size / 1e6:.0f} MB): in memory {t_old:6.2f} s, {rss_old / 1e6:6.0f} MB peak   '
+                  f'streaming {t_new:5.2f} s, {rss_new / 1e6:4.0f} MB peak ({size / t_new / 1e6:.0f} MB/s)')
+
+        total_drugs = sizes[-1]
+        manifests = []
+        for workers in sorted({1, 4, os.cpu_count()}):
+            out_dir = Path(directory) / f'shards_{workers}'
+            t_shards, manifest = timed(generate_shards, str(PARTIAL_XML), out_dir, total_drugs, shards,
+                                       seed=0, workers=workers, repeat=1)
+            manifests.append(manifest)
+            print(f'{total_drugs} drugs in {shards} shards, {workers} worker(s): {t_shards:5.2f} s')
+        assert all(manifest == manifests[0] for manifest in manifests), 'Shards should not depend on the workers'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# Compares calling the eight build_*_dataframe functions one after another
+# with a single build_all_dataframes pass over the same tree.
+from common import simulated_xml, timed
+
+from parsing import parse_drugbank_xml, iter_drugbank_drugs
+from transformations import (
+    TABLE_SCHEMAS,
+    build_all_dataframes,
+    build_drugs_dataframe,
+    build_synonyms_dataframe,
+    build_products_dataframe,
+    build_pathways_dataframe,
+    build_pathways_to_drugs_dataframe,
+    build_targets_dataframe,
+    build_groups_dataframe,
+    build_drug_interactions_dataframe
+)
+
+BUILDERS = [
+    build_drugs_dataframe,
+    build_synonyms_dataframe,
+    build_products_dataframe,
+    build_pathways_dataframe,
+    build_pathways_to_drugs_dataframe,
+    build_targets_dataframe,
+    build_groups_dataframe,
+    build_drug_interactions_dataframe,
+]
+
+
+def eight_passes(root):
+    return [builder(root) for builder in BUILDERS]
+
+
+def main(total_drugs=20000):
+    xml_path = simulated_xml(total_drugs)
+    root = parse_drugbank_xml(xml_path)
+
+    t_eight, _ = timed(eight_passes, root)
+    t_single, _ = timed(build_all_dataframes, root)
+    print(f'{total_drugs} drugs, all {len(TABLE_SCHEMAS)} tables from a parsed tree')
+    print(f'  eight builders:       {t_eight:7.2f} s')
+    print(f'  build_all_dataframes: {t_single:7.2f} s  ({t_eight / t_single:.2f}x)')
+
+    # end to end from the file, the streaming source is parsed only once as well
+    t_eight_file, _ = timed(lambda: eight_passes(parse_drugbank_xml(xml_path)), repeat=1)
+    t_single_file, _ = timed(lambda: build_all_dataframes(iter_drugbank_drugs(xml_path)), repeat=1)
+    print('from the file')
+    print(f'  parse + eight builders:          {t_eight_file:7.2f} s')
+    print(f'  stream + build_all_dataframes:   {t_single_file:7.2f} s  ({t_eight_file / t_single_file:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# The analyses at 200k drugs (common.tiled_tables): pandas (analyses.py) vs. the same
+# questions as DuckDB queries (sql.py), over the DataFrames and over memory-mapped Arrow
+# files like the snapshots of cache.py, plus a question spanning three tables written as
+# chained pandas masks vs. one query, with one thread and with all of them.
+import os
+import tempfile
+from pathlib import Path
+
+import pyarrow as pa
+from pyarrow import feather
+
+from common import tiled_tables, timed
+
+import analyses
+import sql
+from transformations import encode_drug_ids
+
+TABLES = ['pathways', 'pathways_to_drugs', 'targets', 'groups']
+
+MEMBRANE_QUERY = '''
+    SELECT DISTINCT g.drugbank_id::VARCHAR AS drugbank_id
+    FROM groups g
+    JOIN (SELECT drugbank_id FROM pathways_to_drugs GROUP BY 1 HAVING count(DISTINCT pathway_name) > 3) p
+        ON p.drugbank_id = g.drugbank_id
+    JOIN targets t ON t.drugbank_id = g.drugbank_id
+    WHERE g."group" = 'approved' AND t.cellular_location ILIKE '%membrane%'
+    ORDER BY 1
+'''
+
+
+def _pandas_membrane(tables):
+    # approved drugs with more than 3 pathways, one of whose targets is a membrane protein
+    approved = analyses.drugs_matching_groups(tables['groups'], include=['approved'])
+    counts = analyses.count_pathways_per_drug(tables['pathways_to_drugs'])
+    targets = tables['targets']
+    membrane = targets.loc[targets['cellular_location'].str.contains('membrane', case=False, na=False), 'drugbank_id']
+    drug_ids = set(approved) & set(counts.loc[counts['num_pathways'] > 3, 'drugbank_id']) & set(membrane)
+    return sorted(drug_ids)
+
+
+def _memory_mapped(tables, directory):
+    # the tables written and opened like snapshot files
+    mapped = {}
+    for table, df in tables.items():
+        path = Path(directory) / f'{table}.arrow'
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path, compression='uncompressed')
+        mapped[table] = feather.read_table(path, memory_map=True)
+    return mapped
+
+
+def main(total_drugs=20000, copies=10):
+    tables = encode_drug_ids(tiled_tables(total_drugs, TABLES, copies))
+    print(f'{tables["groups"]["drugbank_id"].nunique()} drugs, '
+          + ', '.join(f'{len(df)} {table}' for table, df in tables.items()))
+
+    with tempfile.TemporaryDirectory() as directory:
+        mapped = _memory_mapped(tables, directory)
+        sources = {'DataFrames': sql.connect(tables), 'mmap Arrow': sql.connect(mapped)}
+        questions = [
+            ('unique pathways', lambda: analyses.count_unique_pathways(tables['pathways']), sql.count_unique_pathways),
+            ('approved, not withdrawn', lambda: analyses.approved_and_non_withdrawn_drugs(tables['groups']),
+             sql.approved_and_non_withdrawn_drugs),
+            ('pathways per drug', lambda: analyses.count_pathways_per_drug(tables['pathways_to_drugs']),
+             sql.count_pathways_per_drug),
+            ('membrane drugs (3 tables)', lambda: _pandas_membrane(tables),
+             lambda source: list(sql.query(MEMBRANE_QUERY, source)['drugbank_id'])),
+        ]
+        # what the pandas versions pay first when the tables come from a snapshot
+        t_load, _ = timed(lambda: {table: arrow_table.to_pandas() for table, arrow_table in mapped.items()})
+        print(f'  loading the tables from the Arrow files into pandas: {t_load * 1000:.1f} ms')
+        print(f'  {"":26} {"pandas":>9} ' + ' '.join(f'{name:>12}' for name in sources))
+        for label, pandas_version, sql_version in questions:
+            t_pandas, expected = timed(pandas_version)
+            times = []
+            for source in sources.values():
+                t_sql, result = timed(sql_version, source)
+                if label == 'pathways per drug':
+                    assert result['num_pathways'].tolist() == expected['num_pathways'].tolist()
+                else:
+                    assert result == expected, label
+                times.append(t_sql)
+            print(f'  {label:26} {t_pandas * 1000:6.1f} ms ' + ' '.join(f'{t * 1000:9.1f} ms' for t in times))
+
+        for threads in sorted({1, os.cpu_count()}):
+            with sql.connect(mapped, threads=threads) as connection:
+                t_query, _ = timed(sql.query, MEMBRANE_QUERY, connection)
+            print(f'  membrane drugs, mmap Arrow, {threads} thread(s): {t_query * 1000:.1f} ms')
+        for connection in sources.values():
+            connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+# Interaction descriptions stored as full strings vs. template codes + drug name slots:
+# memory, filtering on a template and rebuilding the text.
+from common import simulated_xml, timed
+
+from interactions import interaction_descriptions, interactions_with_template
+from transformations import load_tables
+
+PATTERN = 'risk or severity'
+
+
+def _megabytes(data):
+    # Series.memory_usage is a number, DataFrame.memory_usage a Series
+    usage = data.memory_usage(deep=True, index=False)
+    return (usage.sum() if hasattr(usage, 'sum') else usage) / 1e6
+
+
+def main(total_drugs=20000):
+    df = load_tables(simulated_xml(total_drugs), ['drug_interactions'])['drug_interactions']
+    t_rebuild, text = timed(interaction_descriptions, df)
+    encoded = df[['description_template', 'drug_name', 'other_drug_name']]
+
+    t_text, by_text = timed(lambda: df[text.str.contains(PATTERN)])
+    t_codes, by_codes = timed(interactions_with_template, df, PATTERN)
+    assert len(by_text) == len(by_codes)
+
+    print(f'{total_drugs} drugs, {len(df)} interactions, '
+          f'{len(df["description_template"].cat.categories)} templates')
+    print(f'  description as objects:      {_megabytes(text.astype(object)):6.1f} MB')
+    print(f'  description string[pyarrow]: {_megabytes(text):6.1f} MB')
+    print(f'  template + name slots:       {_megabytes(encoded):6.1f} MB')
+    print(f'  filter "{PATTERN}" ({len(by_codes)} rows): text {t_text * 1000:.1f} ms, '
+          f'template codes {t_codes * 1000:.2f} ms ({t_text / t_codes:.0f}x)')
+    print(f'  rebuild every description:   {t_rebuild * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
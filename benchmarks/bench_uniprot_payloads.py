@@ -0,0 +1,254 @@
+# UniProt disease lookups against a local server replaying recorded search responses:
+# the original fetch (complete entries, first page only, response.json()) vs. the client
+# (fields=DISEASE_FIELDS, every page, entries parsed as the pages stream in).
+# The recording is UniProtKB-shaped JSON generated once (seeded) into the data folder,
+# with full entries of realistic size: sequence, features, references, cross-references.
+import gzip
+import json
+import random
+import re
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import requests
+
+from common import DATA_DIR, timed
+
+from analyses import DISEASE_FIELDS, _extract_disease_ids, fetch_diseases_for_genes
+from uniprot import UniProtClient, iter_json_results
+
+_AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+_COMMENT_TYPES = ['FUNCTION', 'SUBUNIT', 'SUBCELLULAR LOCATION', 'TISSUE SPECIFICITY', 'PTM', 'SIMILARITY']
+_FEATURE_TYPES = ['Chain', 'Domain', 'Region', 'Binding site', 'Modified residue', 'Helix', 'Beta strand', 'Turn']
+_ORGANISMS = [('Homo sapiens', 9606), ('Mus musculus', 10090), ('Rattus norvegicus', 10116),
+              ('Bos taurus', 9913), ('Danio rerio', 7955), ('Gallus gallus', 9031)]
+
+
+def _words(rng, count):
+    return ' '.join(''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(3, 10))) for _ in range(count))
+
+
+def _evidences(rng):
+    return [{'evidenceCode': f'ECO:0000{rng.randint(200, 300)}', 'source': 'PubMed', 'id': str(rng.randint(10 ** 7, 4 * 10 ** 7))}
+            for _ in range(rng.randint(1, 3))]
+
+
+def _full_entry(rng, gene, number, diseases):
+    # one UniProtKB entry with the sections a complete search result carries
+    organism, taxon = _ORGANISMS[number % len(_ORGANISMS)]
+    length = rng.randint(300, 1500)
+    comments = [{'commentType': kind, 'texts': [{'value': _words(rng, 60), 'evidences': _evidences(rng)}]}
+                for kind in _COMMENT_TYPES]
+    comments += [{'commentType': 'DISEASE', 'disease': {
+        'diseaseId': disease, 'diseaseAccession': f'DI-{rng.randint(10000, 99999)}', 'acronym': disease[:4].upper(),
+        'description': _words(rng, 40), 'diseaseCrossReference': {'database': 'MIM', 'id': str(rng.randint(10 ** 5, 10 ** 6))},
+        'evidences': _evidences(rng)}, 'note': {'texts': [{'value': _words(rng, 20)}]}} for disease in diseases]
+    return {
+        'entryType': 'UniProtKB reviewed (Swiss-Prot)' if number < 6 else 'UniProtKB unreviewed (TrEMBL)',
+        'primaryAccession': f'{gene[:2]}{number:04d}{rng.randint(0, 9)}',
+        'uniProtkbId': f'{gene}_{organism.split()[0].upper()[:5]}',
+        'entryAudit': {'firstPublicDate': '1995-11-01', 'lastAnnotationUpdateDate': '2024-07-24',
+                       'lastSequenceUpdateDate': '1995-11-01', 'entryVersion': rng.randint(1, 300), 'sequenceVersion': 1},
+        'annotationScore': 5.0,
+        'organism': {'scientificName': organism, 'taxonId': taxon,
+                     'lineage': ['Eukaryota', 'Metazoa', 'Chordata', 'Craniata', 'Vertebrata', 'Euteleostomi']},
+        'proteinExistence': '1: Evidence at protein level',
+        'proteinDescription': {'recommendedName': {'fullName': {'value': _words(rng, 5), 'evidences': _evidences(rng)}},
+                               'alternativeNames': [{'fullName': {'value': _words(rng, 4)}} for _ in range(3)]},
+        'genes': [{'geneName': {'value': gene, 'evidences': _evidences(rng)},
+                   'synonyms': [{'value': f'{gene}{i}'} for i in range(rng.randint(0, 3))]}],
+        'comments': comments,
+        'features': [{'type': rng.choice(_FEATURE_TYPES), 'location': {'start': {'value': start, 'modifier': 'EXACT'},
+                                                                       'end': {'value': start + rng.randint(1, 80), 'modifier': 'EXACT'}},
+                      'description': _words(rng, 4), 'evidences': _evidences(rng)}
+                     for start in sorted(rng.randint(1, length) for _ in range(rng.randint(40, 250)))],
+        'keywords': [{'id': f'KW-{rng.randint(1, 1300):04d}', 'category': 'Molecular function', 'name': _words(rng, 1)}
+                     for _ in range(rng.randint(5, 25))],
+        'references': [{'referenceNumber': i, 'citation': {
+            'id': str(rng.randint(10 ** 7, 4 * 10 ** 7)), 'citationType': 'journal article',
+            'authors': [_words(rng, 2).title() for _ in range(rng.randint(2, 12))], 'title': _words(rng, 12),
+            'publicationDate': str(rng.randint(1980, 2024)), 'journal': _words(rng, 2).title(),
+            'firstPage': str(rng.randint(1, 900)), 'volume': str(rng.randint(1, 300))},
+            'referencePositions': [_words(rng, 5).upper()]} for i in range(rng.randint(5, 60))],
+        'uniProtKBCrossReferences': [{'database': rng.choice(['EMBL', 'PDB', 'RefSeq', 'Ensembl', 'GO', 'InterPro', 'Pfam']),
+                                      'id': f'X{rng.randint(10 ** 5, 10 ** 6)}',
+                                      'properties': [{'key': 'ProteinId', 'value': f'AAA{rng.randint(10 ** 4, 10 ** 5)}.1'},
+                                                     {'key': 'Status', 'value': 'JOINED'}]}
+                                     for _ in range(rng.randint(30, 250))],
+        'sequence': {'value': ''.join(rng.choices(_AMINO_ACIDS, k=length)), 'length': length,
+                     'molWeight': length * 110, 'crc64': f'{rng.getrandbits(64):016X}', 'md5': f'{rng.getrandbits(128):032X}'},
+        'extraAttributes': {'uniParcId': f'UPI{rng.getrandbits(40):010X}'},
+    }
+
+
+def recorded_responses(num_genes=30, seed=0):
+    # {gene: [entries]}, generated once and reused by later runs
+    path = DATA_DIR / f'uniprot_recorded_{num_genes}.json.gz'
+    if not path.exists():
+        print(f'Recording {path.name}...')
+        rng = random.Random(seed)
+        recording = {}
+        for i in range(num_genes):
+            gene = f'GENE{i}'
+            diseases = [f'{_words(rng, 2).title()} syndrome {k}' for k in range(rng.randint(0, 4))]
+            # reviewed human entries carry the diseases, orthologs from other organisms follow
+            recording[gene] = [_full_entry(rng, gene, n, diseases if n % len(_ORGANISMS) == 0 else [])
+                               for n in range(rng.randint(8, 60))]
+        with gzip.open(path, 'wt', encoding='utf-8') as file:
+            json.dump(recording, file)
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _project(entry, fields):
+    # the subset of an entry the UniProt `fields` parameter returns
+    projected = {'entryType': entry['entryType'], 'primaryAccession': entry['primaryAccession']}
+    if 'gene_names' in fields:
+        projected['genes'] = entry['genes']
+    if 'cc_disease' in fields:
+        diseases = [comment for comment in entry['comments'] if comment['commentType'] == 'DISEASE']
+        if diseases:
+            projected['comments'] = diseases
+    return projected
+
+
+class RecordedUniProt(ThreadingHTTPServer):
+    # serves /uniprotkb/search from a recording, with fields, pagination and gzip like UniProt
+    daemon_threads = True
+
+    def __init__(self, recording):
+        super().__init__(('127.0.0.1', 0), _RecordedHandler)
+        self.recording = recording
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class _RecordedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        genes = re.findall(r'gene:"?([^"\s)]+)"?', params['query'])
+        entries = [entry for gene in genes for entry in server.recording.get(gene, [])]
+        if 'fields' in params:
+            fields = params['fields'].split(',')
+            entries = [_project(entry, fields) for entry in entries]
+
+        size, start = int(params.get('size', 25)), int(params.get('cursor', 0))
+        body = json.dumps({'results': entries[start:start + size]}).encode()
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            body = gzip.compress(body, compresslevel=6)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        if start + size < len(entries):
+            next_url = f'{server.url}{url.path}?{urlencode({**params, "cursor": start + size})}'
+            self.send_header('Link', f'<{next_url}>; rel="next"')
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.bytes_sent += len(body)
+
+
+def _original_fetch(base_url, genes):
+    # the original _fetch_uniprot_data + _extract_disease_ids, without the sleep
+    diseases, parse_time, received = {}, 0, 0
+    with requests.Session() as session:
+        for gene in genes:
+            response = session.get(f'{base_url}/uniprotkb/search', params={'query': f'gene:{gene}', 'format': 'json'})
+            response.raise_for_status()
+            received += len(response.content)
+            start = time.perf_counter()
+            json_data = response.json()
+            parse_time += time.perf_counter() - start
+            diseases[gene] = _extract_disease_ids(json_data)
+    return diseases, parse_time, received
+
+
+def _peak_memory(function, *args):
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def _chunks(body, size=64 * 1024):
+    return (body[i:i + size] for i in range(0, len(body), size))
+
+
+def _diseases_loaded(body):
+    return _extract_disease_ids(json.loads(body))
+
+
+def _diseases_streamed(body):
+    # entries are dropped as soon as their diseases are read
+    diseases = set()
+    for entry in iter_json_results(_chunks(body)):
+        diseases.update(_extract_disease_ids({'results': [entry]}))
+    return diseases
+
+
+def main(num_genes=30):
+    recording = recorded_responses(num_genes)
+    genes = list(recording)
+    server = RecordedUniProt(recording)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    server.bytes_sent = 0
+    start = time.perf_counter()
+    original, t_original_parse, original_bytes = _original_fetch(server.url, genes)
+    t_original = time.perf_counter() - start
+    original_wire = server.bytes_sent
+
+    server.bytes_sent = 0
+    with UniProtClient(base_url=server.url, rate=None) as client:
+        start = time.perf_counter()
+        lean = fetch_diseases_for_genes(genes, client)
+        t_lean = time.perf_counter() - start
+        lean_wire, requests_sent = server.bytes_sent, client.requests_sent
+    server.shutdown()
+
+    # parse cost alone, on the bodies of the largest gene: one page of complete entries vs. every projected page
+    largest = max(genes, key=lambda gene: len(recording[gene]))
+    full_page = json.dumps({'results': recording[largest][:25]}).encode()
+    lean_body = json.dumps({'results': [_project(entry, DISEASE_FIELDS) for entry in recording[largest]]}).encode()
+    t_full_parse, _ = timed(_diseases_loaded, full_page)
+    t_lean_parse, _ = timed(_diseases_streamed, lean_body)
+    peak_loaded = _peak_memory(_diseases_loaded, full_page)
+    peak_streamed = _peak_memory(_diseases_streamed, full_page)
+
+    entries = sum(len(entries) for entries in recording.values())
+    found_original = sum(len(names) for names in original.values())
+    found_lean = sum(len(names) for names in lean.values())
+    print(f'{num_genes} genes, {entries} recorded entries ({sum(len(e) > 25 for e in recording.values())} genes over one page)')
+    print(f'  original: {len(genes)} requests, {original_wire / 1e6:7.2f} MB transferred '
+          f'({original_bytes / 1e6:.1f} MB of JSON), parse {t_original_parse * 1000:7.1f} ms, '
+          f'total {t_original * 1000:7.1f} ms, {found_original} gene-disease links')
+    print(f'  client:   {requests_sent} requests, {lean_wire / 1e6:7.2f} MB transferred '
+          f'({original_wire / lean_wire:.0f}x less), total {t_lean * 1000:7.1f} ms, '
+          f'{found_lean} gene-disease links (every page)')
+    print(f'  parse of {largest} ({len(recording[largest])} entries): first page of complete entries '
+          f'{t_full_parse * 1000:.1f} ms vs. every projected page streamed {t_lean_parse * 1000:.2f} ms')
+    print(f'  peak memory reading the diseases of one complete page ({len(full_page) / 1e6:.1f} MB): '
+          f'json.loads {peak_loaded / 1e6:.1f} MB, iter_json_results {peak_streamed / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
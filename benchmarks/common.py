@@ -0,0 +1,56 @@
+import sys
+import time
+from pathlib import Path
+
+# same trick as tests/conftest.py, benchmarks import modules straight from `src`
+src_path = Path(__file__).resolve().parent.parent / 'src'
+sys.path.append(str(src_path))
+
+import pandas as pd
+
+from simulator import generate_drugs
+from transformations import drug_id_columns, load_tables
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+PARTIAL_XML = DATA_DIR / 'drugbank_partial.xml'
+
+
+def simulated_xml(total_drugs):
+    # generated once with simulator.generate_drugs (seeded, so every machine gets the same file) and reused
+    xml_path = DATA_DIR / f'drugbank_simulated_{total_drugs}.xml'
+    if not xml_path.exists():
+        print(f'Generating {xml_path.name}...')
+        generate_drugs(str(PARTIAL_XML), str(xml_path), total_drugs=total_drugs, seed=0)
+    return str(xml_path)
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    # best of `repeat` runs, returns (seconds, result of the last run)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def tiled_tables(total_drugs, tables, copies):
+    """
+    Tables of `total_drugs * copies` drugs, much faster to get than generating and
+    parsing a simulated file that large: the tables of the `total_drugs` simulated file
+    repeated `copies` times. Copy 0 keeps the original drug IDs, the drug IDs of
+    copy k > 0 are shifted by k * 100000 (DB100001...).
+    """
+    tiled = {}
+    for table, df in load_tables(simulated_xml(total_drugs), tables).items():
+        frames = []
+        for k in range(copies):
+            shifted = {}
+            for column in drug_id_columns(table):
+                ids = df[column].astype(str)
+                if k > 0:
+                    ids = 'DB' + (ids.str.slice(2).astype(int) + k * 100000).astype(str).str.zfill(6)
+                shifted[column] = ids
+            frames.append(df.assign(**shifted))
+        tiled[table] = pd.concat(frames, ignore_index=True)
+    return tiled
@@ -1,40 +1,111 @@
+import asyncio
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
 import pandas as pd
-import requests
-import time
+
+from uniprot import ResponseCache, UniProtClient, run as run_uniprot
 
 def count_unique_pathways(df_pathways):
     return df_pathways['pathway_name'].nunique()
 
 
+# Group membership as bitmasks: bit i of a drug's mask is set when the drug belongs
+# to the i-th group of the vocabulary, so any include / exclude query is a couple of
+# vectorized bitwise operations over one small integer per drug.
+GroupMasks = namedtuple('GroupMasks', ['drug_ids', 'masks', 'groups'])
+
+_MASK_DTYPES = (np.uint8, np.uint16, np.uint32, np.uint64)
+
+
+def build_group_masks(df_groups):
+    """
+    Build the per-drug bitmasks of a groups table once.
+    Returns GroupMasks(drug_ids, masks, groups): the sorted drug IDs, their masks
+    and the group vocabulary (bit i stands for groups[i]).
+    """
+    drug_codes, drug_ids = pd.factorize(df_groups['drugbank_id'], sort=True)
+    group_codes, groups = pd.factorize(df_groups['group'], sort=True)
+    if len(groups) > 64:
+        raise ValueError(f'{len(groups)} groups do not fit in a 64-bit mask')
+    dtype = next(dtype for dtype in _MASK_DTYPES if np.iinfo(dtype).bits >= len(groups))
+
+    masks = np.zeros(len(drug_ids), dtype=dtype)
+    valid = (drug_codes >= 0) & (group_codes >= 0)
+    drug_codes, group_codes = drug_codes[valid], group_codes[valid]
+    for bit in range(len(groups)):
+        masks[drug_codes[group_codes == bit]] |= dtype(1 << bit)
+
+    return GroupMasks(drug_ids, masks, list(groups))
+
+
+def _groups_mask(group_masks, groups):
+    # mask of the named groups, None when one of them is not in the vocabulary
+    mask = 0
+    for group in groups:
+        if group not in group_masks.groups:
+            return None
+        mask |= 1 << group_masks.groups.index(group)
+    return group_masks.masks.dtype.type(mask)
+
+
+def drugs_matching_groups(groups, include=(), exclude=()):
+    """
+    IDs of the drugs belonging to every group of `include` and to none of `exclude`,
+    e.g. include=['investigational'], exclude=['approved'].
+    `groups` is a groups table or the GroupMasks built from it by build_group_masks
+    (build them once when asking many questions).
+    """
+    if not isinstance(groups, GroupMasks):
+        groups = build_group_masks(groups)
+    if isinstance(include, str) or isinstance(exclude, str):
+        raise TypeError('include and exclude are collections of group names')
+
+    required = _groups_mask(groups, include)
+    if required is None: # nobody belongs to an unknown group
+        return groups.drug_ids[:0]
+    forbidden = _groups_mask(groups, [group for group in exclude if group in groups.groups])
+
+    masks = groups.masks
+    selected = ((masks & required) == required) & ((masks & forbidden) == 0)
+    return groups.drug_ids[selected]
+
+
 def approved_and_non_withdrawn_drugs(df_groups):
-    # group by drugbank_id and collect unique groups in a set
-    grouped = df_groups.groupby('drugbank_id')['group'].apply(set)
-    
-    # count the number of drug sets that contain 'approved' but do not contain 'withdrawn'
-    count = sum(('approved' in group_set) and not ('withdrawn' in group_set) for group_set in grouped)
+    # count the drugs that are approved but not withdrawn
+    return len(drugs_matching_groups(df_groups, include=['approved'], exclude=['withdrawn']))
+
 
-    return count
-    
 def count_pathways_per_drug(df_pathways_to_drugs):
-    grouped = (
-        df_pathways_to_drugs
-        .groupby('drugbank_id')['pathway_name'] # group by drug ID
+    # integer drug codes, sorted like a groupby (reuses the codes of an encoded drugbank_id)
+    drug_codes, drug_ids = pd.factorize(df_pathways_to_drugs['drugbank_id'], sort=True)
+    counts = (
+        df_pathways_to_drugs['pathway_name']
+        .groupby(drug_codes) # group by drug code
         .nunique() # count unique pathways per drug
-        .reset_index()
-        .rename(columns={'pathway_name': 'num_pathways'})
+        .drop(-1, errors='ignore') # rows without a drug ID
     )
+    grouped = pd.DataFrame({
+        'drugbank_id': drug_ids.take(counts.index.to_numpy()),
+        'num_pathways': counts.to_numpy(),
+    })
     return grouped
 
 
-def _fetch_uniprot_data(gene_name): # calls the Uniprot's rest API to extract json (containing disease data)
-    base_url = "https://rest.uniprot.org/uniprotkb/search"
-    params = {
-        "query": f"gene:{gene_name}",
-        "format": "json",
-    }
-    response = requests.get(base_url, params=params)
-    response.raise_for_status()
-    return response.json()
+# the only UniProtKB fields the disease lookups read
+DISEASE_FIELDS = ('accession', 'gene_names', 'cc_disease')
+
+def _default_client():
+    # responses are kept in uniprot.DEFAULT_RESPONSE_CACHE across runs
+    return UniProtClient(cache=ResponseCache())
+
+def _fetch_uniprot_data(gene_name, client=None): # calls the Uniprot's rest API to extract json (containing disease data)
+    if client is None:
+        with _default_client() as client:
+            return run_uniprot(client.search_gene(gene_name, DISEASE_FIELDS))
+    return run_uniprot(client.search_gene(gene_name, DISEASE_FIELDS))
 
 def _extract_disease_ids(json_data): # parse the json file to get the list of diseases
     diseases = set()
@@ -49,23 +120,39 @@ def _extract_disease_ids(json_data): # parse the json file to get the list of di
     
     return list(diseases)
 
-def _fetch_diseases_from_uniprot(gene_name):
-    uniprot_json = _fetch_uniprot_data(gene_name)
+def _fetch_diseases_from_uniprot(gene_name, client=None):
+    uniprot_json = _fetch_uniprot_data(gene_name, client)
     return _extract_disease_ids(uniprot_json)
 
+async def _fetch_diseases_for_genes(client, genes):
+    # the queries run concurrently, the client bounds and paces them
+    responses = await asyncio.gather(*(client.search_gene(gene, DISEASE_FIELDS) for gene in genes))
+    return {gene: _extract_disease_ids(response) for gene, response in zip(genes, responses)}
+
+def fetch_diseases_for_genes(genes, client=None):
+    """
+    Diseases of every gene of `genes` according to UniProt, as {gene: [disease IDs]}.
+    The genes are queried concurrently through `client` (a uniprot.UniProtClient);
+    by default a client using the persistent response cache is created for the call,
+    so genes fetched before make no network calls.
+    """
+    genes = list(dict.fromkeys(genes))
+    if client is None:
+        with _default_client() as client:
+            return run_uniprot(_fetch_diseases_for_genes(client, genes))
+    return run_uniprot(_fetch_diseases_for_genes(client, genes))
+
 # this function for each unique gene calls fetching function to extract diseases
-def get_diseases_related_to_drug(df_targets, drug_id): 
+def get_diseases_related_to_drug(df_targets, drug_id, client=None): 
     df_filtered = df_targets[df_targets['drugbank_id'] == drug_id]
 
-    unique_genes = df_filtered['gene_name'].dropna().unique()
+    unique_genes = [gene for gene in df_filtered['gene_name'].dropna().unique() if gene]
+    diseases_by_gene = fetch_diseases_for_genes(unique_genes, client)
 
     records = []
 
     for gene in unique_genes:
-        if not gene:
-            continue
-
-        diseases = _fetch_diseases_from_uniprot(gene)
+        diseases = diseases_by_gene[gene]
 
         if diseases:
             for disease in diseases:
@@ -82,7 +169,117 @@ def get_diseases_related_to_drug(df_targets, drug_id):
                 "disease": "No info"
             })
 
-        time.sleep(0.5) # Avoid overloading the API
-
     df_result = pd.DataFrame(records)
-    return df_result
\ No newline at end of file
+    return df_result
+
+def _batch_query(genes):
+    # one UniProt query matching every gene of the batch
+    return '(' + ' OR '.join('gene:"{}"'.format(gene.replace('"', '\\"')) for gene in genes) + ')'
+
+def _entry_gene_names(entry):
+    # lowercased gene names and synonyms of a UniProtKB entry
+    names = set()
+    for gene in entry.get("genes", []):
+        for name in [gene.get("geneName")] + gene.get("synonyms", []):
+            if name and name.get("value"):
+                names.add(name["value"].lower())
+    return names
+
+def _diseases_by_gene(json_data, genes):
+    # split the entries of a batch query between the genes they are named after
+    wanted = {}
+    for gene in genes:
+        wanted.setdefault(gene.lower(), []).append(gene)
+    diseases = {gene: set() for gene in genes}
+    for entry in json_data.get("results", []):
+        entry_diseases = _extract_disease_ids({"results": [entry]})
+        for name in _entry_gene_names(entry):
+            for gene in wanted.get(name, []):
+                diseases[gene].update(entry_diseases)
+    return {gene: sorted(names) for gene, names in diseases.items()}
+
+def _read_checkpoint(checkpoint_path):
+    # {gene: [diseases]} of the genes resolved by previous runs
+    resolved = {}
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return resolved
+    with open(checkpoint_path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError: # line of an interrupted write, its gene is queried again
+                continue
+            resolved[record["gene"]] = record["diseases"]
+    return resolved
+
+def _truncate_partial_line(checkpoint_path):
+    # drop what follows the last newline (an interrupted write), so appended records start on their own line
+    if not os.path.exists(checkpoint_path):
+        return
+    with open(checkpoint_path, 'rb+') as file:
+        data = file.read()
+        if data and not data.endswith(b'\n'):
+            file.truncate(data.rfind(b'\n') + 1)
+
+async def _resolve_gene_batches(client, batches, checkpoint):
+    async def resolve(batch):
+        try:
+            return _diseases_by_gene(await client.search(_batch_query(batch), DISEASE_FIELDS), batch)
+        except Exception as error:
+            return error
+
+    # a failed batch does not stop the others, they are checkpointed before the error is raised
+    resolved, errors = {}, []
+    for batch in asyncio.as_completed([resolve(batch) for batch in batches]):
+        diseases = await batch
+        if isinstance(diseases, Exception):
+            errors.append(diseases)
+            continue
+        resolved.update(diseases)
+        if checkpoint is not None:
+            checkpoint.writelines(json.dumps({"gene": gene, "diseases": names}) + '\n'
+                                  for gene, names in diseases.items())
+            checkpoint.flush()
+    if errors:
+        raise errors[0]
+    return resolved
+
+def annotate_targets_with_diseases(df_targets, client=None, batch_size=50, checkpoint_path=None):
+    """
+    Drug-gene-disease table (drugbank_id, gene_name, disease) of every target, like
+    get_diseases_related_to_drug for all drugs at once ("No info" for genes without disease).
+
+    Every distinct gene is resolved once, `batch_size` genes per UniProt query, entries
+    being matched to genes by gene name or synonym. With `checkpoint_path`, resolved
+    genes are appended to that file as batches complete, and genes already in it are
+    not queried again, so an interrupted run resumes where it stopped.
+    """
+    pairs = df_targets[['drugbank_id', 'gene_name']].dropna().drop_duplicates()
+    pairs = pairs[pairs['gene_name'] != '']
+    genes = pd.unique(pairs['gene_name'].to_numpy(dtype=object))
+
+    resolved = _read_checkpoint(checkpoint_path)
+    pending = [gene for gene in genes if gene not in resolved]
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    if batches:
+        checkpoint = None
+        if checkpoint_path is not None:
+            _truncate_partial_line(checkpoint_path)
+            checkpoint = open(checkpoint_path, 'a', encoding='utf-8')
+        try:
+            if client is None:
+                with _default_client() as client:
+                    resolved.update(run_uniprot(_resolve_gene_batches(client, batches, checkpoint)))
+            else:
+                resolved.update(run_uniprot(_resolve_gene_batches(client, batches, checkpoint)))
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+    # gene -> disease rows, then one merge with the (drug, gene) pairs
+    diseases = [resolved[gene] or ["No info"] for gene in genes]
+    df_diseases = pd.DataFrame({
+        'gene_name': pd.array(np.repeat(genes, [len(names) for names in diseases]), dtype=pairs['gene_name'].dtype),
+        'disease': [disease for names in diseases for disease in names],
+    })
+    return pairs.merge(df_diseases, on='gene_name').reset_index(drop=True)
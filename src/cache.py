@@ -0,0 +1,339 @@
+# Persistent snapshots of the extracted tables, so that the XML is parsed only once
+# per release instead of on every notebook run / server startup.
+# Tables are stored as uncompressed Arrow IPC (Feather v2) files which can be memory-mapped.
+# Every row also records the drug it was extracted from, and every snapshot of an
+# uncompressed XML keeps a hash of the raw bytes of each <drug>, so the snapshot of
+# a new release can be patched from the previous one by re-extracting only the
+# drugs that changed.
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from lxml import etree
+from pyarrow import feather
+
+from drug_index import drug_byte_ranges
+from parsing import is_compressed, iter_drugbank_drugs, read_drugbank_envelope
+from transformations import (
+    TABLE_SCHEMAS, EXTRACTOR_VERSION, ROW_DRUG, build_all_dataframes, check_tables, drug_id_columns, encode_drug_ids,
+    table_dtypes
+)
+
+DEFAULT_CACHE_DIR = '../data/cache'
+DEFAULT_MAX_CACHE_BYTES = 2 * 1024 ** 3 # 2 GB
+
+_MANIFEST = 'manifest.json'
+_HASHES = 'drug_hashes.arrow'
+
+CHANGE_TYPES = ('added', 'removed', 'modified')
+
+
+def _file_fingerprint(xml_path, content_hash=False):
+    # size + mtime is cheap, the full content hash is exact but reads the whole file
+    stat = os.stat(xml_path)
+    if not content_hash:
+        return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+    digest = hashlib.sha256()
+    with open(xml_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_key(xml_path, content_hash=False):
+    """
+    Key identifying the snapshot of `xml_path`: it changes whenever the file
+    or the extraction code (EXTRACTOR_VERSION) changes.
+    """
+    fingerprint = _file_fingerprint(xml_path, content_hash)
+    raw = f'{fingerprint}-v{EXTRACTOR_VERSION}'
+    return f'{Path(xml_path).stem}-{hashlib.sha1(raw.encode()).hexdigest()[:16]}'
+
+
+def _read_manifest(snapshot_dir):
+    try:
+        with open(snapshot_dir / _MANIFEST) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None # missing or half-written snapshot
+
+
+def _dir_size(path):
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+
+def _hash_drugs(xml_path):
+    # {drugbank_id: [start, end]} and {drugbank_id: digest of the raw <drug> bytes}, in file order
+    ranges = drug_byte_ranges(xml_path)
+    if not ranges:
+        return ranges, {}
+    with open(xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        hashes = {
+            drug_id: hashlib.blake2b(mm[start:end], digest_size=16).hexdigest()
+            for drug_id, (start, end) in ranges.items()
+        }
+    return ranges, hashes
+
+
+def _write_snapshot(xml_path, cache_dir, key, tables, hashes=None):
+    # write next to the final location and rename, so readers never see a partial snapshot
+    tmp_dir = cache_dir / f'.{key}-{os.getpid()}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for table, df in tables.items():
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False),
+                              tmp_dir / f'{table}.arrow', compression='uncompressed')
+    if hashes is not None:
+        feather.write_feather(pa.table({'drugbank_id': list(hashes), 'hash': list(hashes.values())}),
+                              tmp_dir / _HASHES, compression='uncompressed')
+
+    manifest = {
+        'source': str(Path(xml_path).resolve()),
+        'extractor_version': EXTRACTOR_VERSION,
+        'tables': list(tables),
+        'created': time.time(),
+    }
+    with open(tmp_dir / _MANIFEST, 'w') as f:
+        json.dump(manifest, f)
+
+    snapshot_dir = cache_dir / key
+    try:
+        tmp_dir.rename(snapshot_dir)
+    except OSError:
+        # another process finished the same snapshot first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _remove_stale_snapshots(cache_dir, xml_path, current_key):
+    source = str(Path(xml_path).resolve())
+    for snapshot_dir in cache_dir.iterdir():
+        if not snapshot_dir.is_dir() or snapshot_dir.name == current_key:
+            continue
+        manifest = _read_manifest(snapshot_dir)
+        if manifest is not None and manifest['source'] == source:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+def evict_snapshots(cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_CACHE_BYTES, keep=()):
+    """
+    Remove the least recently used snapshots until the cache fits in `max_bytes`.
+    Snapshots named in `keep` are never removed. Returns the removed snapshot names.
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return []
+
+    snapshots = []
+    for snapshot_dir in cache_dir.iterdir():
+        if snapshot_dir.is_dir() and not snapshot_dir.name.startswith('.'):
+            # the manifest is touched on every load, so its mtime is the last use
+            manifest_path = snapshot_dir / _MANIFEST
+            last_used = manifest_path.stat().st_mtime if manifest_path.exists() else 0
+            snapshots.append((last_used, snapshot_dir, _dir_size(snapshot_dir)))
+
+    total = sum(size for _, _, size in snapshots)
+    removed = []
+    for _, snapshot_dir, size in sorted(snapshots, key=lambda s: s[0]):
+        if total <= max_bytes:
+            break
+        if snapshot_dir.name in keep:
+            continue
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        total -= size
+        removed.append(snapshot_dir.name)
+
+    return removed
+
+
+def _read_arrow_table(snapshot_dir, table, row_drugs=False):
+    # memory-mapped read, only the requested columns' buffers are touched
+    path = snapshot_dir / f'{table}.arrow'
+    columns = None
+    if not row_drugs:
+        columns = [name for name in feather.read_table(path, memory_map=True).column_names if name != ROW_DRUG]
+    return feather.read_table(path, columns=columns, memory_map=True)
+
+
+def _read_table(snapshot_dir, table, row_drugs=False):
+    return _read_arrow_table(snapshot_dir, table, row_drugs).to_pandas()
+
+
+def _find_base_snapshot(cache_dir, xml_path):
+    # newest snapshot of `xml_path` made by this extractor version and carrying drug hashes
+    source = str(Path(xml_path).resolve())
+    candidates = []
+    for snapshot_dir in cache_dir.iterdir():
+        if not snapshot_dir.is_dir() or snapshot_dir.name.startswith('.'):
+            continue
+        manifest = _read_manifest(snapshot_dir)
+        if (manifest is not None and manifest['source'] == source
+                and manifest['extractor_version'] == EXTRACTOR_VERSION
+                and (snapshot_dir / _HASHES).exists()):
+            candidates.append((manifest['created'], snapshot_dir))
+    return max(candidates, key=lambda c: c[0])[1] if candidates else None
+
+
+def _rows_by_drug(df, drug_ids):
+    # {drugbank_id: list of row tuples} for the rows extracted from `drug_ids`
+    rows = df[df[ROW_DRUG].isin(drug_ids)]
+    values = rows.drop(columns=ROW_DRUG).astype(object)
+    values = values.where(values.notna(), None)
+    grouped = {}
+    for drug_id, row in zip(rows[ROW_DRUG], values.itertuples(index=False, name=None)):
+        grouped.setdefault(drug_id, []).append(row)
+    return grouped
+
+
+def _table_changes(table, old_rows, new_rows, candidates):
+    # added/removed/modified drugs of one table, judged by the rows they produce
+    changes = []
+    for drug_id in candidates:
+        old, new = old_rows.get(drug_id), new_rows.get(drug_id)
+        if old == new:
+            continue
+        change = 'added' if old is None else 'removed' if new is None else 'modified'
+        changes.append((table, change, drug_id))
+    return changes
+
+
+def _change_report(changes):
+    report = pd.DataFrame(changes, columns=['table', 'change', 'drugbank_id'])
+    report['table'] = pd.Categorical(report['table'], categories=list(TABLE_SCHEMAS))
+    report['change'] = pd.Categorical(report['change'], categories=CHANGE_TYPES)
+    return report
+
+
+def _extract_changed_drugs(xml_path, ranges, drug_ids):
+    # parse only the byte ranges of `drug_ids`, wrapped in the document envelope
+    offsets = list(ranges.values())
+    header, footer = read_drugbank_envelope(xml_path, offsets)
+    with open(xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        body = b''.join(mm[ranges[drug_id][0]:ranges[drug_id][1]] for drug_id in drug_ids)
+    return build_all_dataframes(etree.fromstring(header + body + footer), row_drugs=True)
+
+
+def _patch_snapshot(xml_path, base_dir, ranges, hashes):
+    """
+    Patch the tables of the snapshot in `base_dir` into the tables of `xml_path`:
+    rows of removed and changed drugs are dropped, added and changed drugs are
+    extracted again and the rows are put back in the new file order.
+    Returns (tables, changes).
+    """
+    base = feather.read_table(base_dir / _HASHES).to_pydict()
+    old_hashes = dict(zip(base['drugbank_id'], base['hash']))
+    changed = [drug_id for drug_id, digest in hashes.items() if old_hashes.get(drug_id) != digest]
+    removed = [drug_id for drug_id in old_hashes if drug_id not in hashes]
+    candidates = changed + removed
+    extracted = _extract_changed_drugs(xml_path, ranges, changed) if changed else None
+
+    position = {drug_id: i for i, drug_id in enumerate(hashes)}
+    tables, changes = {}, []
+    for table in TABLE_SCHEMAS:
+        old = _read_table(base_dir, table, row_drugs=True)
+        new = extracted[table] if extracted is not None else old.iloc[:0]
+        changes += _table_changes(table, _rows_by_drug(old, candidates), _rows_by_drug(new, changed), candidates)
+
+        df = pd.concat([old[~old[ROW_DRUG].isin(candidates)], new], ignore_index=True)
+        # stable sort: the rows of one drug keep their order
+        order = np.argsort(df[ROW_DRUG].map(position).to_numpy(dtype=np.int64), kind='stable')
+        dtypes = {column: dtype for column, dtype in table_dtypes(table).items() if column not in drug_id_columns(table)}
+        tables[table] = df.iloc[order].reset_index(drop=True).astype(dtypes)
+
+    return encode_drug_ids(tables, hashes), changes
+
+
+def _refresh_snapshot(xml_path, cache_dir, key, base_dir=None):
+    # build the snapshot `key`, incrementally from `base_dir` when possible, and return the changes
+    # raw drug bytes need the uncompressed file, a compressed release is always extracted in full
+    hashes = None
+    if not is_compressed(xml_path):
+        ranges, hashes = _hash_drugs(xml_path)
+
+    if hashes is not None and base_dir is not None:
+        tables, changes = _patch_snapshot(xml_path, base_dir, ranges, hashes)
+    else:
+        tables = build_all_dataframes(iter_drugbank_drugs(xml_path), row_drugs=True)
+        changes = [(table, 'added', drug_id)
+                   for table, df in tables.items() for drug_id in df[ROW_DRUG].unique()]
+
+    _write_snapshot(xml_path, cache_dir, key, tables, hashes)
+    return _change_report(changes)
+
+
+def update_drugbank(xml_path, base_xml_path=None, cache_dir=DEFAULT_CACHE_DIR,
+                    content_hash=False, max_cache_bytes=DEFAULT_MAX_CACHE_BYTES):
+    """
+    Bring the snapshot of `xml_path` up to date incrementally and return a change report.
+    The newest snapshot of `base_xml_path` (by default an older version of `xml_path`
+    itself) is patched: only drugs whose raw <drug> bytes changed are extracted again,
+    rows of removed drugs are deleted. Without a usable base snapshot (or for a
+    compressed file) the tables are extracted in full.
+
+    The report is a DataFrame with the columns table, change ('added', 'removed'
+    or 'modified') and drugbank_id, listing for every table the drugs whose rows
+    in that table appeared, disappeared or changed. It is empty when the snapshot
+    was already up to date.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = snapshot_key(xml_path, content_hash)
+
+    manifest = _read_manifest(cache_dir / key)
+    if manifest is not None and manifest['extractor_version'] == EXTRACTOR_VERSION:
+        return _change_report([])
+
+    base_dir = _find_base_snapshot(cache_dir, base_xml_path or xml_path)
+    report = _refresh_snapshot(xml_path, cache_dir, key, base_dir)
+    _remove_stale_snapshots(cache_dir, xml_path, key)
+    evict_snapshots(cache_dir, max_cache_bytes, keep={key})
+    return report
+
+
+def _current_snapshot(xml_path, cache_dir, content_hash, max_cache_bytes):
+    # directory of the up-to-date snapshot of `xml_path`, built first when needed
+    cache_dir = Path(cache_dir)
+    snapshot_dir = cache_dir / snapshot_key(xml_path, content_hash)
+
+    manifest = _read_manifest(snapshot_dir)
+    if manifest is not None and manifest['extractor_version'] == EXTRACTOR_VERSION:
+        os.utime(snapshot_dir / _MANIFEST) # mark as recently used for eviction
+    else:
+        update_drugbank(xml_path, cache_dir=cache_dir, content_hash=content_hash,
+                        max_cache_bytes=max_cache_bytes)
+    return snapshot_dir
+
+
+def load_drugbank(xml_path, cache_dir=DEFAULT_CACHE_DIR, tables=None,
+                  content_hash=False, max_cache_bytes=DEFAULT_MAX_CACHE_BYTES):
+    """
+    Return a dictionary of the extracted tables (like build_all_dataframes) for `xml_path`,
+    reading them from the on-disk snapshot in `cache_dir` when it is up to date.
+    When the XML or the extractor version changed, the snapshot is rebuilt
+    (patched from the previous snapshot of the file, see update_drugbank),
+    older snapshots of the same file are removed and the cache is trimmed
+    to `max_cache_bytes`.
+    """
+    tables = check_tables(tables)
+    snapshot_dir = _current_snapshot(xml_path, cache_dir, content_hash, max_cache_bytes)
+    # read back from the snapshot, so the first and later loads return the same dtypes
+    return {table: _read_table(snapshot_dir, table) for table in tables}
+
+
+def snapshot_tables(xml_path, cache_dir=DEFAULT_CACHE_DIR, tables=None,
+                    content_hash=False, max_cache_bytes=DEFAULT_MAX_CACHE_BYTES):
+    """
+    Like load_drugbank, but the tables are returned as pyarrow Tables memory-mapped
+    from the snapshot files: nothing is read until a column is used, and pages
+    the OS evicts are read from disk again, so tables larger than memory can be scanned.
+    """
+    tables = check_tables(tables)
+    snapshot_dir = _current_snapshot(xml_path, cache_dir, content_hash, max_cache_bytes)
+    return {table: _read_arrow_table(snapshot_dir, table) for table in tables}
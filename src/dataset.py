@@ -0,0 +1,245 @@
+# One object giving access to every table and analysis of a DrugBank file.
+# Values are computed on first access, memoized, and know what they depend on,
+# so asking for one analysis extracts only the tables it needs.
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from analyses import (
+    count_unique_pathways,
+    build_group_masks,
+    drugs_matching_groups,
+    count_pathways_per_drug,
+    get_diseases_related_to_drug,
+    annotate_targets_with_diseases,
+)
+from cache import load_drugbank
+from interactions import InteractionGraph
+import network
+from pathways import PathwayIncidence
+from similarity import TargetSimilarityIndex
+from sql import query as run_query, referenced_tables
+from transformations import TABLE_SCHEMAS, load_tables
+
+
+class _Value:
+    # descriptor of a memoized value: `function(dataset, *dependency values)`
+    def __init__(self, function, dependencies):
+        self.function = function
+        self.dependencies = tuple(dependencies)
+        self.__doc__ = function.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        owner._values = {**getattr(owner, '_values', {}), name: self}
+
+    def __get__(self, dataset, owner=None):
+        if dataset is None:
+            return self
+        return dataset.get(self.name)
+
+
+def derived(*dependencies):
+    """
+    Decorator declaring a memoized value of DrugBankDataset computed from the
+    named tables / values, which are passed to the function as arguments.
+    """
+    def decorator(function):
+        return _Value(function, dependencies)
+    return decorator
+
+
+def _add_table(cls, table):
+    def load(dataset):
+        return dataset._load_table(table)
+    load.__doc__ = f'The {table} table (see transformations.TABLE_SCHEMAS).'
+    value = _Value(load, ())
+    value.__set_name__(cls, table)
+    setattr(cls, table, value)
+
+
+def _size_of(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Index, pd.Categorical, np.ndarray)):
+        return int(value.nbytes)
+    if isinstance(value, tuple):
+        return sum(_size_of(item) for item in value)
+    if hasattr(value, 'nbytes'): # InteractionGraph, PathwayIncidence, TargetSimilarityIndex
+        return value.nbytes()
+    return sys.getsizeof(value)
+
+
+class DrugBankDataset:
+    """
+    Lazily computed, memoized tables and analyses of the DrugBank XML file `xml_path`.
+
+    Every table of TABLE_SCHEMAS and every analysis is an attribute
+    (dataset.groups, dataset.pathway_counts...) computed on first access
+    from the values it depends on, and reused afterwards. Only the tables a value
+    needs are extracted: with `cache_dir` they are read from the load_drugbank
+    snapshot, otherwise they are streamed from the XML with projection.
+
+    All memoized values are dropped when the XML file changes. With a
+    `memory_budget` (bytes) the least recently used values are evicted once the
+    memoized values take more memory, and computed again when asked for.
+    """
+
+    def __init__(self, xml_path, cache_dir=None, memory_budget=None):
+        self.xml_path = xml_path
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self._memo = OrderedDict() # name -> value, least recently used first
+        self._sizes = {}
+        self._source = self._fingerprint()
+        self._lock = threading.RLock()
+
+    @derived('pathways')
+    def unique_pathway_count(self, pathways):
+        """Number of distinct pathways."""
+        return count_unique_pathways(pathways)
+
+    @derived('groups')
+    def group_masks(self, groups):
+        """Per-drug group bitmasks (analyses.build_group_masks)."""
+        return build_group_masks(groups)
+
+    @derived('group_masks')
+    def approved_non_withdrawn_count(self, group_masks):
+        """Number of drugs approved and not withdrawn."""
+        return len(drugs_matching_groups(group_masks, include=['approved'], exclude=['withdrawn']))
+
+    @derived('pathways_to_drugs')
+    def pathway_counts(self, pathways_to_drugs):
+        """Number of pathways of every drug (drugbank_id, num_pathways)."""
+        return count_pathways_per_drug(pathways_to_drugs)
+
+    @derived('pathways_to_drugs')
+    def pathway_incidence(self, pathways_to_drugs):
+        """Drug x pathway incidence matrix (pathways.PathwayIncidence)."""
+        return PathwayIncidence.from_dataframe(pathways_to_drugs)
+
+    @derived('targets')
+    def target_similarity(self, targets):
+        """Target-profile similarity index of the drugs (similarity.TargetSimilarityIndex)."""
+        return TargetSimilarityIndex.from_dataframe(targets)
+
+    @derived('drug_interactions')
+    def interaction_graph(self, drug_interactions):
+        """Drug interactions as a CSR InteractionGraph."""
+        return InteractionGraph.from_dataframe(drug_interactions)
+
+    @derived('interaction_graph')
+    def network_statistics(self, interaction_graph):
+        """Per-drug statistics of the interaction network (network.network_statistics)."""
+        return network.network_statistics(interaction_graph)
+
+    def drugs_matching_groups(self, include=(), exclude=()):
+        # answered from the memoized group bitmasks
+        return drugs_matching_groups(self.group_masks, include, exclude)
+
+    def diseases_related_to_drug(self, drug_id, client=None):
+        # queries UniProt, so the result is not memoized
+        return get_diseases_related_to_drug(self.targets, drug_id, client)
+
+    def target_diseases(self, client=None, checkpoint_path=None):
+        # diseases of the targets of every drug, resolved gene by gene (not memoized either)
+        return annotate_targets_with_diseases(self.targets, client, checkpoint_path=checkpoint_path)
+
+    def query(self, sql, params=None, threads=None, memory_limit=None):
+        """
+        Run `sql` over the tables and return a DataFrame (see sql.query). With a
+        `cache_dir` the memory-mapped snapshot files are queried, otherwise the
+        memoized tables the query reads, extracted first when needed.
+        """
+        if self.cache_dir is not None:
+            source = self.xml_path
+        else:
+            source = {table: self.get(table) for table in referenced_tables(sql)}
+        return run_query(sql, source, params, self.cache_dir, threads, memory_limit)
+
+    @classmethod
+    def dependencies(cls, name, recursive=False):
+        # names of the values `name` is computed from
+        direct = cls._values[name].dependencies
+        if not recursive:
+            return direct
+        found = []
+        for dependency in direct:
+            for value in cls.dependencies(dependency, recursive=True) + (dependency,):
+                if value not in found:
+                    found.append(value)
+        return tuple(found)
+
+    @classmethod
+    def dependents(cls, name):
+        # names of the values computed (directly or not) from `name`
+        return tuple(value for value in cls._values if name in cls.dependencies(value, recursive=True))
+
+    def _fingerprint(self):
+        stat = os.stat(self.xml_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load_table(self, table):
+        if self.cache_dir is not None:
+            return load_drugbank(self.xml_path, self.cache_dir, tables=[table])[table]
+        return load_tables(self.xml_path, [table])[table]
+
+    def get(self, name):
+        """Return the value `name`, computing it (and what it depends on) if needed."""
+        if name not in self._values:
+            raise KeyError(f'Unknown value: {name}. Available: {list(self._values)}')
+
+        with self._lock:
+            source = self._fingerprint()
+            if source != self._source:
+                self.invalidate()
+                self._source = source
+
+            if name in self._memo:
+                self._memo.move_to_end(name)
+                return self._memo[name]
+
+            value_def = self._values[name]
+            arguments = [self.get(dependency) for dependency in value_def.dependencies]
+            value = value_def.function(self, *arguments)
+
+            self._memo[name] = value
+            self._sizes[name] = _size_of(value)
+            self._evict(keep=name)
+            return value
+
+    def invalidate(self, name=None):
+        """Forget `name` and every value computed from it (everything by default)."""
+        with self._lock:
+            names = list(self._memo) if name is None else (name,) + self.dependents(name)
+            for value in names:
+                self._memo.pop(value, None)
+                self._sizes.pop(value, None)
+
+    def _evict(self, keep):
+        if self.memory_budget is None:
+            return
+        for name in list(self._memo):
+            if self.memory_usage() <= self.memory_budget:
+                break
+            if name != keep:
+                del self._memo[name]
+                del self._sizes[name]
+
+    def memory_usage(self):
+        """Bytes taken by the memoized values."""
+        return sum(self._sizes.values())
+
+    def computed(self):
+        """Names of the memoized values, least recently used first."""
+        return list(self._memo)
+
+
+# every table is a value without dependencies
+for _table in TABLE_SCHEMAS:
+    _add_table(DrugBankDataset, _table)
@@ -0,0 +1,155 @@
+# Random access to single drugs: a sidecar index maps every primary drugbank-id
+# to the byte range of its <drug> element, so one record can be parsed
+# without loading the rest of the release.
+import json
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from lxml import etree
+
+from parsing import scan_drug_offsets
+
+INDEX_SUFFIX = '.idx.json'
+
+# indexes kept open by get_drug_element, the least recently used one is closed beyond that
+MAX_OPEN_INDEXES = 8
+
+_PRIMARY_ID = re.compile(rb'<drugbank-id\s+primary="true"\s*>([^<]*)</drugbank-id>')
+
+
+def index_path_for(xml_path):
+    return f'{xml_path}{INDEX_SUFFIX}'
+
+
+def drug_byte_ranges(xml_path, offsets=None):
+    """
+    Map the primary drugbank-id of every top-level drug to its [start, end) byte range,
+    in file order. `offsets` can pass the result of an earlier scan_drug_offsets.
+    """
+    if offsets is None:
+        offsets = scan_drug_offsets(xml_path)
+    drugs = {}
+
+    with open(xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for start, end in offsets:
+            match = _PRIMARY_ID.search(mm, start, end)
+            if match is not None:
+                drugs[match.group(1).decode()] = [start, end]
+    return drugs
+
+
+def build_drug_index(xml_path, index_path=None):
+    """
+    Scan `xml_path` once and save the sidecar index next to it
+    (`<xml_path>.idx.json` by default). Returns the index dictionary.
+    """
+    offsets = scan_drug_offsets(xml_path)
+    drugs = drug_byte_ranges(xml_path, offsets)
+
+    stat = os.stat(xml_path)
+    index = {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        # the envelope (declaration + <drugbank> root) turns a slice into a valid document
+        'header_end': offsets[0][0] if offsets else 0,
+        'footer_start': offsets[-1][1] if offsets else 0,
+        'drugs': drugs,
+    }
+
+    with open(index_path or index_path_for(xml_path), 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+def load_drug_index(xml_path, index_path=None):
+    # the saved index is reused while the XML is unchanged, otherwise it is rebuilt
+    index_path = index_path or index_path_for(xml_path)
+    stat = os.stat(xml_path)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+        if index['size'] == stat.st_size and index['mtime_ns'] == stat.st_mtime_ns:
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    return build_drug_index(xml_path, index_path)
+
+
+class DrugIndex:
+    """
+    Memory-mapped view of a DrugBank XML file with its sidecar index.
+    get_drug_element parses only the bytes of the requested drug.
+    """
+
+    def __init__(self, xml_path, index_path=None):
+        self.xml_path = xml_path
+        index = load_drug_index(xml_path, index_path)
+        self.drugs = index['drugs']
+
+        self._file = open(xml_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._header = self._mm[:index['header_end']]
+        self._footer = self._mm[index['footer_start']:]
+
+    def __contains__(self, drug_id):
+        return drug_id in self.drugs
+
+    def __len__(self):
+        return len(self.drugs)
+
+    def get_drug_element(self, drug_id):
+        # returns the <drug> element, or None when the id is not in the index
+        offsets = self.drugs.get(drug_id)
+        if offsets is None:
+            return None
+        start, end = offsets
+        root = etree.fromstring(self._header + self._mm[start:end] + self._footer)
+        return root[0]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    @property
+    def closed(self):
+        return self._mm.closed
+
+
+# xml_path -> (mtime_ns, DrugIndex), least recently used first
+_open_indexes = OrderedDict()
+_open_indexes_lock = threading.Lock()
+
+
+def _open_index(xml_path, mtime_ns):
+    # the open index of `xml_path`, closed and opened again when the file changed
+    with _open_indexes_lock:
+        cached = _open_indexes.pop(xml_path, None)
+        if cached is not None and cached[0] != mtime_ns:
+            cached[1].close()
+            cached = None
+        if cached is None:
+            cached = (mtime_ns, DrugIndex(xml_path))
+        _open_indexes[xml_path] = cached
+        while len(_open_indexes) > MAX_OPEN_INDEXES:
+            _, (_, index) = _open_indexes.popitem(last=False)
+            index.close()
+        return cached[1]
+
+
+def close_indexes():
+    """Close the indexes opened by get_drug_element."""
+    with _open_indexes_lock:
+        while _open_indexes:
+            _, (_, index) = _open_indexes.popitem()
+            index.close()
+
+
+def get_drug_element(drug_id, xml_path='../data/drugbank_partial.xml'):
+    """
+    Return the <drug> element with the given primary drugbank-id (None if missing).
+    The index and the memory map are opened once per file and reused by later calls.
+    """
+    return _open_index(xml_path, os.stat(xml_path).st_mtime_ns).get_drug_element(drug_id)
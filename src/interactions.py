@@ -0,0 +1,257 @@
+# Drug-drug interactions as a sparse graph: drug IDs are mapped to int32 indices
+# (their position in the sorted array of IDs) and the adjacency is kept in CSR form,
+# so the neighbors of a drug are one contiguous slice of an int32 array.
+# Descriptions are stored as templates (see TABLE_SCHEMAS['drug_interactions']),
+# the helpers at the bottom rebuild the text and filter on the template codes.
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from scipy import sparse
+
+from transformations import STRING_DTYPE, drug_codes
+
+_ARRAYS = ('drug_ids', 'indptr', 'indices')
+_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+# query rows multiplied at once by the similar_drugs of pathways.py and similarity.py
+# (bounds the intermediate products)
+QUERY_BLOCK = 1024
+
+
+def sorted_index(sorted_ids, drug_id):
+    # position of `drug_id` in the sorted array `sorted_ids`, None if it is not in it
+    # (binary search, no dict)
+    i = np.searchsorted(sorted_ids, drug_id)
+    if i < len(sorted_ids) and sorted_ids[i] == drug_id:
+        return int(i)
+    return None
+
+
+def save_arrays(path, arrays):
+    """Save the arrays of the dictionary `arrays` as .npy files in the directory `path`."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(path / f'{name}.npy', array)
+
+
+def load_arrays(path, names, mmap=True):
+    """
+    Load the arrays `names` written by save_arrays, as a dictionary. With `mmap` they
+    are memory-mapped, so opening is instant and only the pages touched by queries are read.
+    """
+    path = Path(path)
+    mmap_mode = 'r' if mmap else None
+    return {name: np.load(path / f'{name}.npy', mmap_mode=mmap_mode) for name in names}
+
+
+def top_k_positions(scores, values, exclude, k):
+    """
+    Positions (in scores.data) of the `k` largest `values` of every row of the CSR
+    matrix `scores`, best first, ties going to the smaller column; column exclude[r]
+    is skipped in row r. Returns (row of each position, positions).
+    """
+    rows, positions = [], []
+    for r in range(scores.shape[0]):
+        lo, hi = scores.indptr[r], scores.indptr[r + 1]
+        candidates = np.flatnonzero(scores.indices[lo:hi] != exclude[r])
+        row_values = values[lo:hi]
+        if len(candidates) > k:
+            # everything tied with the k-th best stays a candidate
+            kth = -np.partition(-row_values[candidates], k - 1)[k - 1]
+            candidates = candidates[row_values[candidates] >= kth]
+        order = np.lexsort((scores.indices[lo:hi][candidates], -row_values[candidates]))
+        positions.append(lo + candidates[order][:k])
+        rows.append(np.full(len(positions[-1]), r))
+    if not positions:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(positions)
+
+
+class InteractionGraph:
+    """
+    Undirected drug interaction graph in CSR form.
+    `drug_ids` is the sorted array of drug IDs (the index of a drug is its position),
+    the neighbors of drug i are indices[indptr[i]:indptr[i + 1]], sorted.
+    Build it with from_dataframe, or load a saved one with load.
+    """
+
+    def __init__(self, drug_ids, indptr, indices):
+        self.drug_ids = drug_ids
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_dataframe(cls, df_interactions):
+        """
+        Build the graph from a drug_interactions table. Every (drug, other drug) pair is
+        stored in both directions once, however many times and in whichever direction
+        it is listed.
+        """
+        drugs, others = df_interactions['drugbank_id'], df_interactions['other_drugbank_id']
+        if (isinstance(drugs.dtype, pd.CategoricalDtype) and drugs.dtype == others.dtype
+                and drugs.cat.categories.is_monotonic_increasing):
+            # encoded with the (sorted) drug ID dictionary: the codes are the indices
+            drug_ids = drugs.cat.categories.to_numpy(dtype=str)
+            rows, cols = drug_codes(drugs), drug_codes(others)
+        else:
+            drug_ids, codes = np.unique(np.concatenate([drugs.to_numpy(dtype=str), others.to_numpy(dtype=str)]),
+                                        return_inverse=True)
+            codes = codes.astype(np.int32)
+            rows, cols = codes[:len(drugs)], codes[len(drugs):]
+
+        size = len(drug_ids)
+        ones = np.ones(len(rows), dtype=bool)
+        adjacency = sparse.csr_matrix((ones, (rows, cols)), shape=(size, size))
+        adjacency = (adjacency + adjacency.T).tocsr() # symmetric, boolean sum merges the duplicates
+        adjacency.sort_indices()
+
+        return cls(drug_ids, adjacency.indptr.astype(np.int64), adjacency.indices.astype(np.int32))
+
+    def __len__(self):
+        return len(self.drug_ids)
+
+    def __contains__(self, drug_id):
+        return self.index(drug_id) is not None
+
+    @property
+    def num_interactions(self):
+        # every undirected interaction is stored twice (self-interactions once)
+        loops = self.to_scipy().diagonal().sum()
+        return int((len(self.indices) + loops) // 2)
+
+    def index(self, drug_id):
+        # int32 index of `drug_id`, None if it is not in the graph
+        return sorted_index(self.drug_ids, drug_id)
+
+    def _neighbor_indices(self, drug_id):
+        i = self.index(drug_id)
+        if i is None:
+            return self.indices[:0]
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def neighbors(self, drug_id):
+        """IDs of the drugs interacting with `drug_id` (empty for unknown drugs)."""
+        return self.drug_ids[self._neighbor_indices(drug_id)]
+
+    def degree(self, drug_id):
+        return len(self._neighbor_indices(drug_id))
+
+    def interacts(self, drug_id, other_drug_id):
+        j = self.index(other_drug_id)
+        if j is None:
+            return False
+        neighbors = self._neighbor_indices(drug_id)
+        k = np.searchsorted(neighbors, j)
+        return bool(k < len(neighbors) and neighbors[k] == j)
+
+    def interactions_among(self, drug_ids):
+        """
+        DataFrame (drugbank_id, other_drugbank_id) of the interactions between two
+        drugs of `drug_ids`, every pair listed once with drugbank_id < other_drugbank_id.
+        """
+        codes = [i for i in map(self.index, set(drug_ids)) if i is not None]
+        selected = np.zeros(len(self.drug_ids), dtype=bool)
+        selected[codes] = True
+
+        pairs = []
+        for i in codes:
+            neighbors = self.indices[self.indptr[i]:self.indptr[i + 1]]
+            neighbors = neighbors[selected[neighbors] & (neighbors > i)]
+            pairs.extend((i, j) for j in neighbors)
+
+        pairs = np.array(sorted(pairs), dtype=np.int32).reshape(-1, 2)
+        return pd.DataFrame({
+            'drugbank_id': self.drug_ids[pairs[:, 0]],
+            'other_drugbank_id': self.drug_ids[pairs[:, 1]],
+        })
+
+    def any_interaction(self, drug_ids):
+        """True when at least two drugs of `drug_ids` interact with each other."""
+        codes = [i for i in map(self.index, set(drug_ids)) if i is not None]
+        selected = np.zeros(len(self.drug_ids), dtype=bool)
+        selected[codes] = True
+        for i in codes:
+            if selected[self.indices[self.indptr[i]:self.indptr[i + 1]]].any():
+                return True
+        return False
+
+    def to_scipy(self):
+        # adjacency as a scipy CSR matrix sharing the index arrays
+        ones = np.ones(len(self.indices), dtype=bool)
+        size = len(self.drug_ids)
+        return sparse.csr_matrix((ones, self.indices, self.indptr), shape=(size, size))
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def save(self, path):
+        """Save the arrays as .npy files in the directory `path`."""
+        save_arrays(path, {name: getattr(self, name) for name in _ARRAYS})
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a graph written by save, memory-mapped with `mmap` (see load_arrays)."""
+        return cls(**load_arrays(path, _ARRAYS, mmap))
+
+
+def _string_array(series):
+    return pa.chunked_array([pa.array(series.astype(object).where(series.notna(), None), type=pa.string())])
+
+
+def interaction_descriptions(df_interactions):
+    """
+    Full description text of every interaction, rebuilt from `description_template`
+    and the slot columns. Rows sharing a template are assembled together with
+    vectorized string joins. Returns a string Series aligned with `df_interactions`.
+    """
+    templates = df_interactions['description_template']
+    codes = templates.cat.codes.to_numpy()
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(-1, len(templates.cat.categories) + 1))
+    slots = {}
+
+    # rows without a description (code -1) stay missing
+    positions = [order[bounds[0]:bounds[1]]]
+    chunks = [pa.nulls(len(positions[0]), pa.string())]
+    for code, template in enumerate(templates.cat.categories):
+        rows = order[bounds[code + 1]:bounds[code + 2]]
+        if not len(rows):
+            continue
+        positions.append(rows)
+        parts = _PLACEHOLDER.split(template)
+        if len(parts) == 1: # nothing to fill in
+            chunks.append(pa.array([template] * len(rows), pa.string()))
+            continue
+        columns = []
+        for i, part in enumerate(parts):
+            if i % 2: # slot column name
+                if part not in slots:
+                    slots[part] = _string_array(df_interactions[part])
+                columns.append(slots[part].take(rows))
+            elif part:
+                columns.append(pa.scalar(part))
+        chunks.extend(pc.binary_join_element_wise(*columns, '').chunks)
+
+    text = pa.chunked_array(chunks, pa.string())
+    text = text.take(np.argsort(np.concatenate(positions), kind='stable'))
+    return pd.Series(pd.array(text, dtype=STRING_DTYPE), index=df_interactions.index, name='description')
+
+
+def template_codes(df_interactions, pattern, case=False):
+    """Codes of the description templates matching the regular expression `pattern`."""
+    categories = df_interactions['description_template'].cat.categories
+    return np.flatnonzero(categories.str.contains(pattern, case=case, regex=True))
+
+
+def interactions_with_template(df_interactions, pattern, case=False):
+    """
+    Interactions whose description template matches `pattern` (e.g. 'risk or severity').
+    The pattern is tested once per template, the rows are selected on integer codes.
+    """
+    codes = template_codes(df_interactions, pattern, case)
+    return df_interactions[np.isin(df_interactions['description_template'].cat.codes.to_numpy(), codes)]
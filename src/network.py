@@ -0,0 +1,153 @@
+# Whole-network statistics of the drug interaction graph (interactions.InteractionGraph),
+# computed on its CSR adjacency with scipy.sparse.csgraph and vectorized NumPy instead of
+# networkx: degrees, connected components, k-core decomposition, triangles and clustering.
+# Self-interactions are ignored (a drug is not its own neighbor), like networkx requires for k-cores.
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse import csgraph
+
+# wedges (paths of two oriented edges) checked at once when counting triangles
+_WEDGE_BLOCK = 4 * 1024 ** 2
+
+
+def _adjacency(graph):
+    # boolean CSR adjacency without self-loops, sorted indices
+    adjacency = graph.to_scipy()
+    size = adjacency.shape[0]
+    rows = np.repeat(np.arange(size), np.diff(adjacency.indptr))
+    keep = adjacency.indices != rows
+    if keep.all():
+        return adjacency
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows[keep], minlength=size))])
+    return sparse.csr_matrix((adjacency.data[keep], adjacency.indices[keep], indptr), shape=adjacency.shape)
+
+
+def _degrees(adjacency):
+    return np.diff(adjacency.indptr)
+
+
+def degree_distribution(graph):
+    """Number of drugs of every degree (degree, num_drugs), by increasing degree."""
+    counts = np.bincount(_degrees(_adjacency(graph)))
+    degrees = np.flatnonzero(counts)
+    return pd.DataFrame({'degree': degrees, 'num_drugs': counts[degrees]})
+
+
+def connected_components(graph):
+    """
+    Component of every drug (drugbank_id, component, component_size). Components are
+    numbered by decreasing size, 0 being the largest; isolated drugs are components of one.
+    """
+    _, labels = csgraph.connected_components(_adjacency(graph), directed=False)
+    sizes = np.bincount(labels)
+    # renumber by decreasing size, ties by first drug
+    order = np.lexsort((np.arange(len(sizes)), -sizes))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return pd.DataFrame({
+        'drugbank_id': graph.drug_ids,
+        'component': rank[labels],
+        'component_size': sizes[labels],
+    })
+
+
+def _core_numbers(adjacency):
+    # peel every drug of degree <= k at once, then their neighbors that fell to <= k, ...
+    degrees = _degrees(adjacency).astype(np.int64)
+    cores = np.zeros(len(degrees), dtype=np.int64)
+    alive = np.ones(len(degrees), dtype=bool)
+    remaining = len(degrees)
+    while remaining:
+        k = degrees[alive].min()
+        peel = np.flatnonzero(alive & (degrees <= k))
+        while len(peel):
+            cores[peel] = k
+            alive[peel] = False
+            remaining -= len(peel)
+            neighbors = adjacency[peel].indices
+            degrees -= np.bincount(neighbors, minlength=len(degrees))
+            candidates = np.unique(neighbors)
+            peel = candidates[alive[candidates] & (degrees[candidates] <= k)]
+    return cores
+
+
+def core_numbers(graph):
+    """
+    k-core decomposition: the core number of every drug (drugbank_id, core_number),
+    the largest k such that the drug is in the k-core (the maximal subgraph where
+    every drug interacts with at least k others of it).
+    """
+    return pd.DataFrame({'drugbank_id': graph.drug_ids, 'core_number': _core_numbers(_adjacency(graph))})
+
+
+def _triangles(adjacency):
+    # orient every edge from the lower to the higher (degree, index) drug: every triangle
+    # is then the wedge a -> b -> c closed by a -> c, found once
+    size = adjacency.shape[0]
+    degrees = _degrees(adjacency)
+    rank = np.empty(size, dtype=np.int64)
+    rank[np.lexsort((np.arange(size), degrees))] = np.arange(size)
+    edges = adjacency.tocoo()
+    up = rank[edges.row] < rank[edges.col]
+    oriented = sparse.csr_matrix((edges.data[up], (edges.row[up], edges.col[up])), shape=(size, size))
+    oriented.sort_indices()
+
+    sources = np.repeat(np.arange(size, dtype=np.int64), np.diff(oriented.indptr))
+    targets = oriented.indices.astype(np.int64)
+    keys = sources * size + targets # sorted, CSR is row-major with sorted indices
+    out_degrees = np.diff(oriented.indptr)
+    wedge_ends = np.cumsum(out_degrees[targets])
+
+    triangles = np.zeros(size, dtype=np.int64)
+    start = 0
+    while start < len(targets):
+        # the next edges (a, b) whose wedges a -> b -> c fit in one block
+        base = wedge_ends[start - 1] if start else 0
+        stop = max(start + 1, np.searchsorted(wedge_ends, base + _WEDGE_BLOCK, side='right'))
+        a, b = sources[start:stop], targets[start:stop]
+        counts = out_degrees[b]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        c = oriented.indices[np.repeat(oriented.indptr[b], counts) + offsets]
+        a, b = np.repeat(a, counts), np.repeat(b, counts)
+
+        wedge_keys = a * size + c
+        found = keys[np.minimum(np.searchsorted(keys, wedge_keys), len(keys) - 1)] == wedge_keys
+        for corner in (a, b, c):
+            triangles += np.bincount(corner[found], minlength=size)
+        start = stop
+    return triangles
+
+
+def _clustering(triangles, degrees):
+    pairs = degrees * (degrees - 1) / 2
+    return np.divide(triangles, pairs, out=np.zeros(len(triangles)), where=pairs > 0)
+
+
+def triangles(graph):
+    """
+    Triangles through every drug (drugbank_id, triangles, clustering). The clustering
+    coefficient is the share of the drug's neighbor pairs that interact with each other
+    (0 for drugs with less than two neighbors).
+    """
+    adjacency = _adjacency(graph)
+    counts = _triangles(adjacency)
+    return pd.DataFrame({
+        'drugbank_id': graph.drug_ids,
+        'triangles': counts,
+        'clustering': _clustering(counts, _degrees(adjacency)),
+    })
+
+
+def network_statistics(graph):
+    """
+    Every per-drug statistic in one table: drugbank_id, degree, component,
+    component_size, core_number, triangles, clustering.
+    """
+    adjacency = _adjacency(graph)
+    df = connected_components(graph)
+    df.insert(1, 'degree', _degrees(adjacency))
+    df['core_number'] = _core_numbers(adjacency)
+    df['triangles'] = _triangles(adjacency)
+    df['clustering'] = _clustering(df['triangles'].to_numpy(), df['degree'].to_numpy())
+    return df
@@ -0,0 +1,79 @@
+# Multi-core extraction: the file is split on top-level <drug> boundaries
+# and every chunk is parsed and transformed in its own process.
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import pandas as pd
+
+from parsing import scan_drug_offsets, read_drugbank_envelope, parse_drug_slice
+from transformations import (
+    build_all_dataframes, check_tables, drug_id_columns, encode_drug_ids, required_elements, table_dtypes
+)
+
+DEFAULT_CHUNK_SIZE = 2000 # drugs per task
+
+
+def _chunk_offsets(offsets, chunk_size):
+    # consecutive drugs are contiguous in the file, so a chunk is a single byte range
+    return [
+        (offsets[i][0], offsets[min(i + chunk_size, len(offsets)) - 1][1])
+        for i in range(0, len(offsets), chunk_size)
+    ]
+
+
+def _extract_chunk(xml_path, start, end, header, footer, tables):
+    root = parse_drug_slice(xml_path, start, end, header, footer, keep=required_elements(tables))
+    return build_all_dataframes(root, tables)
+
+
+def _concat_chunks(table, frames):
+    if len(frames) == 1:
+        return frames[0]
+    if not frames:
+        return build_all_dataframes([], [table])[table]
+    # chunks have their own categories, re-encoding over the union gives the serial result
+    # (drug ID columns are encoded afterwards, with the dictionary shared by all tables)
+    df = pd.concat(frames, ignore_index=True)
+    id_columns = drug_id_columns(table)
+    return df.astype({column: dtype for column, dtype in table_dtypes(table).items() if column not in id_columns})
+
+
+def _chunk_drug_ids(result):
+    # the drug ID dictionary of one chunk, shared by all its tables
+    for table, df in result.items():
+        for column in drug_id_columns(table):
+            return df[column].cat.categories
+    return []
+
+
+def build_all_dataframes_parallel(xml_path, tables=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parallel version of build_all_dataframes for an (uncompressed) XML file.
+    One scan finds the byte ranges of the top-level drugs, chunks of `chunk_size`
+    drugs are parsed and extracted by a pool of `workers` processes
+    (os.cpu_count() by default) and the per-chunk tables are concatenated in file order,
+    giving the same result as the serial path.
+    """
+    tables = check_tables(tables)
+
+    offsets = scan_drug_offsets(xml_path)
+    header, footer = read_drugbank_envelope(xml_path, offsets)
+    chunks = _chunk_offsets(offsets, chunk_size)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(chunks) <= 1:
+        results = [_extract_chunk(xml_path, start, end, header, footer, tables) for start, end in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            # map keeps the submission order, so the output order is deterministic
+            starts, ends = zip(*chunks)
+            results = list(executor.map(
+                _extract_chunk,
+                repeat(xml_path), starts, ends, repeat(header), repeat(footer), repeat(tables)
+            ))
+
+    merged = {table: _concat_chunks(table, [result[table] for result in results]) for table in tables}
+    if len(results) <= 1:
+        return merged
+    return encode_drug_ids(merged, set().union(*(_chunk_drug_ids(result) for result in results)))
@@ -1,9 +1,263 @@
 # we are using lxml for optimized efficiency when dealing with big xml data
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import mmap
+import re
+import zipfile
+from pathlib import Path
+
 from lxml import etree
 
 NAMESPACE = '{http://www.drugbank.ca}'
 
+COMPRESSED_SUFFIXES = ('.zip', '.gz', '.bz2', '.xz')
+_READ_BUFFER_SIZE = 1024 * 1024
+
+
+def is_compressed(xml_path):
+    return Path(xml_path).suffix.lower() in COMPRESSED_SUFFIXES
+
+
+def _open_zip_member(xml_path):
+    # DrugBank releases are zips with a single "full database.xml" inside
+    with zipfile.ZipFile(xml_path) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        xml_members = [info for info in members if info.filename.lower().endswith('.xml')] or members
+        if not xml_members:
+            raise ValueError(f'{xml_path} does not contain any file')
+        # the opened member keeps the archive's file alive after the `with` block
+        return archive.open(xml_members[0])
+
+
+def open_drugbank(xml_path):
+    """
+    Open a DrugBank XML file for reading as a buffered binary stream.
+    .zip, .gz, .bz2 and .xz files are decompressed on the fly while reading,
+    so compressed releases never have to be extracted to disk.
+    """
+    suffix = Path(xml_path).suffix.lower()
+    if suffix == '.gz':
+        raw = gzip.open(xml_path, 'rb')
+    elif suffix == '.bz2':
+        raw = bz2.open(xml_path, 'rb')
+    elif suffix == '.xz':
+        raw = lzma.open(xml_path, 'rb')
+    elif suffix == '.zip':
+        raw = _open_zip_member(xml_path)
+    else:
+        return open(xml_path, 'rb', buffering=_READ_BUFFER_SIZE)
+    return io.BufferedReader(raw, buffer_size=_READ_BUFFER_SIZE)
+
+
+def _xml_source(xml_path):
+    # plain files are handed to libxml2 by name, which reads them faster than a Python stream
+    if is_compressed(xml_path):
+        return open_drugbank(xml_path)
+    return contextlib.nullcontext(str(xml_path))
+
+
+def _require_uncompressed(xml_path):
+    # byte offsets only make sense in the decompressed file
+    if is_compressed(xml_path):
+        raise ValueError(f'{xml_path} is compressed, byte offsets need the uncompressed XML file')
+
+
 def parse_drugbank_xml(xml_path):
-    tree = etree.parse(xml_path)
+    with _xml_source(xml_path) as source:
+        tree = etree.parse(source)
     root = tree.getroot()
-    return root
\ No newline at end of file
+    return root
+
+
+# Projection pushdown: drug-level elements that (in the DrugBank schema) never occur
+# deeper in the tree can be cut out of the raw bytes before parsing, so consumers that
+# need only a few tables never pay for building sequences, patents, interactions...
+# Elements that also appear nested (name, synonyms, enzymes, external-identifiers, and the
+# unii, cas-number and masses of <salt>) are always kept.
+PROJECTABLE_ELEMENTS = frozenset({
+    'state', 'groups',
+    'general-references', 'synthesis-reference', 'indication', 'pharmacodynamics',
+    'mechanism-of-action', 'toxicity', 'metabolism', 'absorption', 'half-life',
+    'protein-binding', 'route-of-elimination', 'volume-of-distribution', 'clearance',
+    'classification', 'salts', 'products', 'international-brands', 'mixtures',
+    'packagers', 'manufacturers', 'prices', 'categories', 'affected-organisms',
+    'dosages', 'atc-codes', 'ahfs-codes', 'pdb-entries', 'fda-label', 'msds', 'patents',
+    'food-interactions', 'drug-interactions', 'sequences', 'calculated-properties',
+    'experimental-properties', 'external-links', 'pathways', 'reactions', 'snp-effects',
+    'snp-adverse-drug-reactions', 'targets', 'carriers', 'transporters',
+})
+
+
+def _projection_pattern(keep):
+    # regex finding the opening tags of the elements to cut, None when nothing is cut
+    if keep is None:
+        return None
+    cut = sorted(PROJECTABLE_ELEMENTS - set(keep))
+    if not cut:
+        return None
+    names = b'|'.join(re.escape(name.encode()) for name in cut)
+    return re.compile(rb'<(' + names + rb')[\s/>]')
+
+
+def _cut_elements(data, pattern, final=True):
+    """
+    Remove every complete element matched by `pattern` from `data`.
+    Returns (projected bytes, remainder): when `final` is False the remainder is the
+    unfinished tail (an element or a tag cut by the block boundary) to be prepended
+    to the next block.
+    """
+    parts = []
+    pos = 0
+
+    while True:
+        match = pattern.search(data, pos)
+        if match is None:
+            break
+        tag_end = data.find(b'>', match.start())
+        if tag_end == -1:
+            break
+        parts.append(data[pos:match.start()])
+        if data[tag_end - 1] == ord('/'): # empty element
+            pos = tag_end + 1
+            continue
+        closing = b'</' + match.group(1) + b'>'
+        end = data.find(closing, tag_end)
+        if end == -1:
+            pos = match.start()
+            break
+        pos = end + len(closing)
+
+    tail = data[pos:]
+    if final:
+        parts.append(tail)
+        return b''.join(parts), b''
+
+    # keep back whatever might be the beginning of an element to cut
+    match = pattern.search(tail)
+    keep_from = match.start() if match is not None else len(tail)
+    last_tag = tail.rfind(b'<')
+    if last_tag != -1 and tail.find(b'>', last_tag) == -1:
+        keep_from = min(keep_from, last_tag)
+    parts.append(tail[:keep_from])
+    return b''.join(parts), tail[keep_from:]
+
+
+def _projected_events(f, pattern):
+    # feed the projected bytes of `f` to a pull parser, yielding (event, element) like iterparse
+    parser = etree.XMLPullParser(events=('start', 'end'), tag=f'{NAMESPACE}drug')
+    remainder = b''
+
+    for block in iter(lambda: f.read(_READ_BUFFER_SIZE), b''):
+        projected, remainder = _cut_elements(remainder + block, pattern, final=False)
+        parser.feed(projected)
+        yield from parser.read_events()
+
+    projected, _ = _cut_elements(remainder, pattern)
+    parser.feed(projected)
+    parser.close()
+    yield from parser.read_events()
+
+
+def iter_drugbank_drugs(xml_path, keep=None):
+    """
+    Stream the top-level <drug> elements of a DrugBank XML file one at a time.
+    Unlike parse_drugbank_xml the whole tree is never held in memory: every drug
+    is cleared (together with its already processed siblings) as soon as the
+    consumer asks for the next one, so memory stays flat no matter the file size.
+    Nested <drug> elements (e.g. inside <pathways>) are not yielded on their own.
+    Compressed files are streamed through open_drugbank.
+
+    `keep` is an optional set of drug-level element names (e.g. {'drugbank-id', 'pathways'}):
+    the other PROJECTABLE_ELEMENTS are removed before parsing and never built.
+    """
+    pattern = _projection_pattern(keep)
+    depth = 0
+
+    with contextlib.ExitStack() as stack:
+        if pattern is None:
+            source = stack.enter_context(_xml_source(xml_path))
+            context = etree.iterparse(source, events=('start', 'end'), tag=f'{NAMESPACE}drug')
+        else:
+            f = stack.enter_context(open_drugbank(xml_path))
+            context = _projected_events(f, pattern)
+
+        for event, elem in context:
+            if event == 'start':
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth > 0:
+                continue # <drug> nested inside a pathway, it is a part of its parent
+
+            yield elem
+
+            # free the processed drug and everything parsed before it
+            elem.clear(keep_tail=True)
+            parent = elem.getparent()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+        del context
+
+
+# matches <drug ...>, <drug> and </drug> but not <drugbank-id>, <drugs>, <drug-interactions>...
+_DRUG_TAG = re.compile(rb'<(/?)drug[\s>/]')
+
+
+def scan_drug_offsets(xml_path):
+    """
+    Scan the raw bytes of a DrugBank XML file once and return the list of
+    (start, end) byte offsets of every top-level <drug> element, so that
+    xml[start:end] is exactly one complete <drug>...</drug>.
+    Nested <drug> elements (inside pathways) are balanced by a depth counter.
+    Works on the uncompressed file with the default (unprefixed) DrugBank namespace.
+    """
+    _require_uncompressed(xml_path)
+    offsets = []
+    depth = 0
+    start = None
+
+    with open(xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for match in _DRUG_TAG.finditer(mm):
+            tag_end = mm.find(b'>', match.start()) + 1
+            if match.group(1): # closing tag
+                depth -= 1
+                if depth == 0:
+                    offsets.append((start, tag_end))
+            elif mm[tag_end - 2] != ord('/'): # ignore empty <drug/>
+                if depth == 0:
+                    start = match.start()
+                depth += 1
+
+    return offsets
+
+
+def read_drugbank_envelope(xml_path, offsets):
+    """
+    Return the bytes before the first and after the last top-level <drug>
+    (the XML declaration and the <drugbank> root with its namespaces),
+    which turn any slice of drugs into a standalone DrugBank document.
+    """
+    with open(xml_path, 'rb') as f:
+        if not offsets:
+            return f.read(), b''
+        header = f.read(offsets[0][0])
+        f.seek(offsets[-1][1])
+        footer = f.read()
+    return header, footer
+
+
+def parse_drug_slice(xml_path, start, end, header, footer, keep=None):
+    # parse only the bytes [start, end) wrapped in the document envelope,
+    # `keep` projects the drugs like in iter_drugbank_drugs
+    with open(xml_path, 'rb') as f:
+        f.seek(start)
+        body = f.read(end - start)
+    pattern = _projection_pattern(keep)
+    if pattern is not None:
+        body, _ = _cut_elements(body, pattern)
+    return etree.fromstring(header + body + footer)
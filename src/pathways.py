@@ -0,0 +1,123 @@
+# Drug-pathway membership as a sparse incidence matrix: drugs are rows (indexed like
+# InteractionGraph, by their position in the sorted drug IDs), pathways are columns.
+# Pathway sizes, co-occurrence and drug similarity are sums and products of that matrix.
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from interactions import QUERY_BLOCK, sorted_index, top_k_positions
+from transformations import drug_codes
+
+
+class PathwayIncidence:
+    """
+    Drug x pathway incidence matrix in CSR form: matrix[i, j] is 1 when drug
+    drug_ids[i] is in pathway pathways[j]. Both label arrays are sorted.
+    Build it with from_dataframe.
+    """
+
+    def __init__(self, drug_ids, pathways, matrix):
+        self.drug_ids = drug_ids
+        self.pathways = pathways
+        self.matrix = matrix
+
+    @classmethod
+    def from_dataframe(cls, df_pathways_to_drugs):
+        """
+        Build the matrix from a pathways_to_drugs table. A drug listed several
+        times in a pathway counts once, rows without a drug are ignored.
+        """
+        df = df_pathways_to_drugs.dropna(subset=['drugbank_id', 'pathway_name'])
+        drugs = df['drugbank_id']
+        if isinstance(drugs.dtype, pd.CategoricalDtype) and drugs.cat.categories.is_monotonic_increasing:
+            # encoded with the (sorted) drug ID dictionary: the codes are the row indices
+            drug_ids = drugs.cat.categories.to_numpy(dtype=str)
+            rows = drug_codes(drugs)
+        else:
+            drug_ids, rows = np.unique(drugs.to_numpy(dtype=str), return_inverse=True)
+        cols, pathways = pd.factorize(df['pathway_name'], sort=True)
+
+        ones = np.ones(len(rows), dtype=bool)
+        matrix = sparse.csr_matrix((ones, (rows, cols)), shape=(len(drug_ids), len(pathways)))
+        matrix = matrix.astype(np.int32) # the boolean sum merged the duplicates, products need counts
+        matrix.sort_indices()
+        return cls(drug_ids, pathways.to_numpy(dtype=str), matrix)
+
+    def __len__(self):
+        return len(self.drug_ids)
+
+    def index(self, drug_id):
+        # row of `drug_id`, None if it is not in the matrix
+        return sorted_index(self.drug_ids, drug_id)
+
+    def pathways_of(self, drug_id):
+        i = self.index(drug_id)
+        if i is None:
+            return self.pathways[:0]
+        return self.pathways[self.matrix.indices[self.matrix.indptr[i]:self.matrix.indptr[i + 1]]]
+
+    def pathway_counts(self):
+        """Number of drugs of every pathway (pathway_name, num_drugs), largest first."""
+        counts = np.bincount(self.matrix.indices, minlength=len(self.pathways))
+        order = np.lexsort((np.arange(len(counts)), -counts))
+        return pd.DataFrame({'pathway_name': self.pathways[order], 'num_drugs': counts[order]})
+
+    def cooccurrence(self):
+        """
+        Pathway x pathway matrix (CSR): entry (a, b) is the number of drugs in both
+        pathways, the diagonal the number of drugs of each pathway.
+        """
+        return (self.matrix.T @ self.matrix).tocsr()
+
+    def cooccurring_pathways(self, min_drugs=1):
+        """
+        Pairs of distinct pathways sharing at least `min_drugs` drugs
+        (pathway_name, other_pathway_name, num_drugs), most shared drugs first.
+        """
+        pairs = sparse.triu(self.cooccurrence(), k=1).tocoo()
+        keep = pairs.data >= min_drugs
+        rows, cols, counts = pairs.row[keep], pairs.col[keep], pairs.data[keep]
+        order = np.lexsort((cols, rows, -counts))
+        # names as categoricals over the pathway labels, like in the tables
+        return pd.DataFrame({
+            'pathway_name': pd.Categorical.from_codes(rows[order], categories=self.pathways),
+            'other_pathway_name': pd.Categorical.from_codes(cols[order], categories=self.pathways),
+            'num_drugs': counts[order],
+        })
+
+    def similar_drugs(self, drug_ids, k=10):
+        """
+        The `k` drugs whose pathway sets are the most similar (Jaccard index) to those
+        of each drug of `drug_ids` (one ID or many), as a DataFrame (drugbank_id,
+        similar_drugbank_id, jaccard, shared_pathways), best first for each drug.
+        Only drugs sharing a pathway are similar; ties go to the smaller drug ID.
+        """
+        if isinstance(drug_ids, str):
+            drug_ids = [drug_ids]
+        queries = np.array([i for i in map(self.index, drug_ids) if i is not None], dtype=np.int64)
+        sizes = np.diff(self.matrix.indptr)
+        transposed = self.matrix.T.tocsr()
+
+        parts = [], [], [], [] # query, other drug, jaccard, shared pathways
+        for start in range(0, len(queries), QUERY_BLOCK):
+            block = queries[start:start + QUERY_BLOCK]
+            # shared pathway counts of every (query, drug) pair with at least one
+            shared = (self.matrix[block] @ transposed).tocsr()
+            row_of = np.repeat(block, np.diff(shared.indptr))
+            jaccard = shared.data / (sizes[row_of] + sizes[shared.indices] - shared.data)
+
+            rows, best = top_k_positions(shared, jaccard, block, k)
+            for part, values in zip(parts, (block[rows], shared.indices[best], jaccard[best], shared.data[best])):
+                part.append(values)
+
+        query, other, jaccard, common = (np.concatenate(part) if part else np.array([], dtype=np.int64)
+                                         for part in parts)
+        return pd.DataFrame({
+            'drugbank_id': self.drug_ids[query],
+            'similar_drugbank_id': self.drug_ids[other],
+            'jaccard': jaccard.astype(np.float64),
+            'shared_pathways': common.astype(np.int32),
+        })
+
+    def nbytes(self):
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
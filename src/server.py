@@ -2,9 +2,8 @@ from fastapi import FastAPI
 from pydantic import BaseModel
 import uvicorn
 
-from transformations import build_pathways_to_drugs_dataframe
-from analyses import count_pathways_per_drug
-from parsing import parse_drugbank_xml
+from cache import DEFAULT_CACHE_DIR
+from dataset import DrugBankDataset
 
 
 app = FastAPI()
@@ -13,25 +12,24 @@ app = FastAPI()
 class DrugID(BaseModel):
     drugbank_id: str
 
-df_pathways_count_per_drug_global = None
+# tables are parsed only on the first startup, later ones read the cached snapshot;
+# the counts are computed again if the XML file changes while the server runs
+dataset = DrugBankDataset('../data/drugbank_partial.xml', cache_dir=DEFAULT_CACHE_DIR)
 
 
 # This function is executed when the server starts.
 @app.on_event('startup')
 def load_data():
-    root = parse_drugbank_xml('../data/drugbank_partial.xml')
-    global df_pathways_count_per_drug_global
-    df_pathways_to_drugs = build_pathways_to_drugs_dataframe(root)
-    df_pathways_count_per_drug_global = count_pathways_per_drug(df_pathways_to_drugs)
+    dataset.pathway_counts
 
 
 # Define a POST endpoint at "/pathways" to receive a drug id and return the associated pathway count.
 @app.post('/pathways')
 def get_pathways(drug_id: DrugID):
-    global df_pathways_count_per_drug_global
+    df_pathways_count_per_drug = dataset.pathway_counts
 
     ans = None
-    filtered_row = df_pathways_count_per_drug_global.loc[df_pathways_count_per_drug_global['drugbank_id'] == drug_id.drugbank_id, 'num_pathways']
+    filtered_row = df_pathways_count_per_drug.loc[df_pathways_count_per_drug['drugbank_id'] == drug_id.drugbank_id, 'num_pathways']
     if not filtered_row.empty:
         ans = str(filtered_row.iloc[0])
     else:
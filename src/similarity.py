@@ -0,0 +1,111 @@
+# Drug similarity by target profile: every drug is a vector over the genes of its targets,
+# weighted by inverse gene frequency (a gene shared by few drugs says more than a common one)
+# and normalized, so the dot product of two drugs is the cosine of their profiles.
+# Queries multiply by the gene x drug matrix, touching only the drugs sharing a gene.
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from interactions import QUERY_BLOCK, load_arrays, save_arrays, sorted_index, top_k_positions
+
+_ARRAYS = ('drug_ids', 'genes', 'weights',
+           'drug_indptr', 'drug_indices', 'drug_data', 'gene_indptr', 'gene_indices', 'gene_data')
+
+
+class TargetSimilarityIndex:
+    """
+    Target-profile similarity of drugs. `by_drug` is the drug x gene CSR matrix of
+    normalized inverse-gene-frequency weights, `by_gene` the same matrix as gene x drug
+    CSR. `drug_ids` and `genes` are sorted, `weights` holds the weight of every gene.
+    Build it with from_dataframe, save it with save and open it again with load.
+    """
+
+    def __init__(self, drug_ids, genes, weights, by_drug, by_gene):
+        self.drug_ids = drug_ids
+        self.genes = genes
+        self.weights = weights
+        self.by_drug = by_drug
+        self.by_gene = by_gene
+
+    @classmethod
+    def from_dataframe(cls, df_targets, gene_column='gene_name'):
+        """
+        Build the index from a targets table. A gene counts once per drug, rows without
+        a gene are ignored. Gene weights are log(number of drugs / drugs with the gene).
+        """
+        df = df_targets.dropna(subset=['drugbank_id', gene_column])
+        df = df[df[gene_column] != '']
+        drug_ids, rows = np.unique(df['drugbank_id'].to_numpy(dtype=str), return_inverse=True)
+        genes, cols = np.unique(df[gene_column].to_numpy(dtype=str), return_inverse=True)
+
+        ones = np.ones(len(rows), dtype=bool)
+        incidence = sparse.csr_matrix((ones, (rows, cols)), shape=(len(drug_ids), len(genes)))
+        incidence.sort_indices()
+        drugs_per_gene = np.bincount(incidence.indices, minlength=len(genes))
+        weights = np.log(len(drug_ids) / drugs_per_gene).astype(np.float32)
+
+        data = weights[incidence.indices]
+        norms = np.sqrt(np.add.reduceat(data ** 2, incidence.indptr[:-1])) if len(data) else data
+        # a gene held by every drug weighs 0, the norm of such profiles is 0
+        norms = np.repeat(np.where(norms > 0, norms, 1), np.diff(incidence.indptr))
+        by_drug = sparse.csr_matrix((data / norms, incidence.indices, incidence.indptr), shape=incidence.shape)
+        return cls(drug_ids, genes, weights, by_drug, by_drug.T.tocsr())
+
+    def __len__(self):
+        return len(self.drug_ids)
+
+    def index(self, drug_id):
+        # row of `drug_id`, None if it is not in the index
+        return sorted_index(self.drug_ids, drug_id)
+
+    def similar_drugs(self, drug_ids, k=10):
+        """
+        The `k` drugs whose target profiles are the closest to that of each drug of
+        `drug_ids` (one ID or many), as a DataFrame (drugbank_id, similar_drugbank_id,
+        similarity), best first for each drug. Similarities are cosines in [0, 1];
+        only drugs sharing a gene are listed, ties go to the smaller drug ID.
+        """
+        if isinstance(drug_ids, str):
+            drug_ids = [drug_ids]
+        queries = np.array([i for i in map(self.index, drug_ids) if i is not None], dtype=np.int64)
+
+        parts = [], [], [] # query, other drug, similarity
+        for start in range(0, len(queries), QUERY_BLOCK):
+            block = queries[start:start + QUERY_BLOCK]
+            scores = (self.by_drug[block] @ self.by_gene).tocsr()
+            scores.eliminate_zeros() # genes every drug has weigh nothing
+            rows, best = top_k_positions(scores, scores.data, block, k)
+            for part, values in zip(parts, (block[rows], scores.indices[best], scores.data[best])):
+                part.append(values)
+
+        query, other, similarity = (np.concatenate(part) if part else np.array([], dtype=np.int64)
+                                    for part in parts)
+        return pd.DataFrame({
+            'drugbank_id': self.drug_ids[query],
+            'similar_drugbank_id': self.drug_ids[other],
+            'similarity': np.minimum(similarity, 1).astype(np.float32), # rounding can exceed 1
+        })
+
+    def _arrays(self):
+        return {
+            'drug_ids': self.drug_ids, 'genes': self.genes, 'weights': self.weights,
+            'drug_indptr': self.by_drug.indptr, 'drug_indices': self.by_drug.indices, 'drug_data': self.by_drug.data,
+            'gene_indptr': self.by_gene.indptr, 'gene_indices': self.by_gene.indices, 'gene_data': self.by_gene.data,
+        }
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays().values())
+
+    def save(self, path):
+        """Save the arrays as .npy files in the directory `path`."""
+        save_arrays(path, self._arrays())
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load an index written by save, memory-mapped with `mmap` (see load_arrays)."""
+        arrays = load_arrays(path, _ARRAYS, mmap)
+        shape = (len(arrays['drug_ids']), len(arrays['genes']))
+        by_drug = sparse.csr_matrix((arrays['drug_data'], arrays['drug_indices'], arrays['drug_indptr']), shape=shape)
+        by_gene = sparse.csr_matrix((arrays['gene_data'], arrays['gene_indices'], arrays['gene_indptr']),
+                                    shape=shape[::-1])
+        return cls(arrays['drug_ids'], arrays['genes'], arrays['weights'], by_drug, by_gene)
@@ -1,73 +1,231 @@
-from lxml import etree as ET  # or from xml.etree import ElementTree as ET if you prefer
-from parsing import parse_drugbank_xml, NAMESPACE
+from lxml import etree as ET
+from parsing import iter_drugbank_drugs, NAMESPACE
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
+from itertools import repeat
+from pathlib import Path
+import hashlib
+import json
+import os
 import random
+import re
 
+# The output is streamed: the original drugs are copied one at a time, and every synthetic
+# drug is the concatenation of pre-serialized child fragments written straight to the file,
+# so memory does not grow with `total_drugs` and the speed is bounded by the disk.
+# With a seed the output only depends on the seed and the sizes, so benchmark inputs
+# can be generated again byte for byte; generate_shards writes them in parallel.
 
-def _collect_drug_columns(root):
+_DRUGBANK_ID = f'{NAMESPACE}drugbank-id'
+_ID_PLACEHOLDER = 'NEW-DRUGBANK-ID'
+_WRITE_BUFFER_SIZE = 1024 * 1024
+_DRUG_NUMBER = re.compile(r'DB(\d+)')
+
+SHARD_MANIFEST = 'manifest.json'
+
+
+def _serialize(element, nsmap):
+    """
+    Serialize an element of the document without its tail, dropping from its start
+    tag the namespace declarations already made by the <drugbank> root (`nsmap`),
+    so the bytes can be written anywhere inside the output root.
+    """
+    xml = ET.tostring(element, encoding='utf-8', with_tail=False)
+    end = xml.index(b'>') # '>' is escaped in attribute values
+    start_tag = xml[:end]
+    for prefix, uri in nsmap.items():
+        name = 'xmlns' if prefix is None else f'xmlns:{prefix}'
+        start_tag = start_tag.replace(f' {name}="{uri}"'.encode(), b'', 1)
+    return start_tag + xml[end:]
+
+
+def _collect_drug_columns(drug, nsmap, child_map):
+    """
+    Add the serialized children of a drug element to `child_map`, a dictionary
+    mapping tag names to a list of XML fragments (bytes), except for the
+    drugbank-id elements which are handled separately.
+    """
+    for child in drug:
+        # Skip the drugbank-id element to avoid sampling it.
+        if child.tag == _DRUGBANK_ID or not isinstance(child.tag, str): # comments have no tag name
+            continue
+        child_map.setdefault(child.tag, []).append(_serialize(child, nsmap))
+
+
+def _template_parts(template_drug, nsmap):
+    """
+    Split the template drug, stripped of every child but its drugbank-id elements,
+    into the bytes before and after the new primary ID. The second part ends where
+    the sampled children go.
+    """
+    template = deepcopy(template_drug)
+    for child in list(template):
+        if child.tag != _DRUGBANK_ID:
+            template.remove(child)
+    if len(template) == 0:
+        raise ValueError('The template drug has no drugbank-id')
+    template[0].text = _ID_PLACEHOLDER
+    template[-1].tail = '\n  '
+    xml = _serialize(template, nsmap)
+    before, _, after = xml[:xml.rindex(b'</drug>')].partition(_ID_PLACEHOLDER.encode())
+    return before, after
+
+
+def _scan_input(xml_in):
     """
-    Iterate over all drug elements and collect each child's XML string,
-    except for the drugbank-id element which is handled separately.
-    Returns a dictionary mapping tag names to a list of XML strings.
+    Number of drugs of `xml_in` and the largest DrugBank ID number it mentions
+    (as a drug or in an interaction or pathway), 0 when there is none.
     """
-    drugs = root.findall(f'{NAMESPACE}drug')
+    num_drugs, largest = 0, 0
+    for drug in iter_drugbank_drugs(xml_in, keep={'drugbank-id', 'drug-interactions', 'pathways'}):
+        num_drugs += 1
+        for element in drug.iter(_DRUGBANK_ID):
+            match = _DRUG_NUMBER.fullmatch((element.text or '').strip())
+            if match:
+                largest = max(largest, int(match.group(1)))
+    return num_drugs, largest
+
+
+def _write_drugs(xml_in, xml_out, new_ids, rng, copy_originals=True):
+    """
+    Write a DrugBank file with the drugs of `xml_in` (when `copy_originals`) followed
+    by one synthetic drug per number of `new_ids`, sampling children with `rng`.
+    """
+    drugs = iter_drugbank_drugs(xml_in)
+    template_drug = next(drugs, None)
+    if template_drug is None:
+        raise ValueError(f'{xml_in} does not contain any drug')
+    root = template_drug.getparent()
+    nsmap = root.nsmap
+    # the streamed drugs are cleared once the next one is read, the first one is used right away
+    before_id, after_id = _template_parts(template_drug, nsmap)
     child_map = {}
+    _collect_drug_columns(template_drug, nsmap, child_map)
+    first_drug = _serialize(template_drug, nsmap)
 
-    for drug in drugs:
-        for child in drug:
-            # Skip the drugbank-id element to avoid sampling it.
-            if child.tag == f'{NAMESPACE}drugbank-id':
-                continue
-            tag_name = child.tag # e.g., "{NAMESPACE}products"
-            xml_string = ET.tostring(child, encoding='unicode')
-            if tag_name not in child_map:
-                child_map[tag_name] = []
-            child_map[tag_name].append(xml_string)
+    with open(xml_out, 'wb', buffering=_WRITE_BUFFER_SIZE) as f, \
+            ET.xmlfile(f, encoding='utf-8', buffered=False) as xf:
+        xf.write_declaration()
+        with xf.element(root.tag, dict(root.attrib), nsmap=nsmap):
+            # the envelope comes from lxml, the drugs are written as raw bytes between its tags
+            xf.flush()
+            f.write(b'\n')
+            if copy_originals:
+                f.write(first_drug + b'\n')
+            for drug in drugs:
+                _collect_drug_columns(drug, nsmap, child_map)
+                if copy_originals:
+                    f.write(_serialize(drug, nsmap) + b'\n')
 
-    return child_map
+            pools = list(child_map.values())
+            for new_id in new_ids:
+                # for each type of child element, choose one at random from our collected pool.
+                children = [rng.choice(fragments) for fragments in pools]
+                f.write(b''.join((before_id, f'DB{new_id:05d}'.encode(), after_id,
+                                  b'\n  '.join(children), b'\n</drug>\n')))
+        xf.flush()
+        f.write(b'\n')
 
 
-def generate_drugs(xml_in, xml_out, total_drugs=20000):
+def generate_drugs(xml_in, xml_out, total_drugs=20000, seed=None, first_id=None):
     """
-    Generate new drug entries by copying a template drug, manually updating the drugbank-id,
-    and appending randomly chosen child elements (except for drugbank-id).
-    The resulting XML is written to the specified output file.
+    Generate new drug entries by copying a template drug (the first one), giving it
+    a new drugbank-id and randomly chosen child elements (except for drugbank-id)
+    of the original drugs, until the output has `total_drugs` drugs (the original
+    ones included). The original drugs and the new ones are streamed to the
+    specified output file, nothing but the pools of children is kept in memory.
+
+    New IDs are consecutive from `first_id`, by default one past the largest ID the
+    input mentions. Children are drawn from random.Random(seed), or from the global
+    `random` module without a seed.
     """
-    root = parse_drugbank_xml(xml_in)
-    tree = ET.ElementTree(root)
+    num_originals, largest_id = _scan_input(xml_in)
+    first_id = largest_id + 1 if first_id is None else first_id
+    rng = random if seed is None else random.Random(seed)
+    _write_drugs(xml_in, xml_out, range(first_id, first_id + max(0, total_drugs - num_originals)), rng)
 
-    original_drugs = root.findall(f'{NAMESPACE}drug')
 
-    # collect the XML string versions of each child element, excluding drugbank-id
-    child_map = _collect_drug_columns(root)
-    
-    # use the first drug element as a template
-    template_drug = original_drugs[0]
+def shard_seed(seed, shard):
+    # seed of the random generator of one shard: independent of the other shards and of the workers
+    return f'{seed}/{shard}'
 
-    start_new_id = 109  # starting point manually checked
-    end_new_id = start_new_id + (total_drugs - 100)
 
-    for new_id in range(start_new_id, end_new_id + 1):
-        new_drug = deepcopy(template_drug)
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_WRITE_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-        # update the drugbank-id element with the new id.
-        new_drugbank_id = new_drug.find(f'{NAMESPACE}drugbank-id')
-        if new_drugbank_id is not None:
-            new_drugbank_id.text = f"DB{new_id:05d}"
 
-        # remove all children except for the drugbank-id element.
-        for child in list(new_drug):
-            if child.tag != f'{NAMESPACE}drugbank-id':
-                new_drug.remove(child)
+def _write_shard(xml_in, xml_out, first_id, last_id, seed, copy_originals):
+    _write_drugs(xml_in, xml_out, range(first_id, last_id + 1), random.Random(seed), copy_originals)
+    return os.path.getsize(xml_out), _file_sha256(xml_out)
+
+
+def generate_shards(xml_in, out_dir, total_drugs, num_shards, seed=0, first_id=None, workers=None,
+                    manifest=True):
+    """
+    Generate a simulated dataset of `total_drugs` drugs (the original ones included) as
+    `num_shards` DrugBank files, drugbank_shard_00000.xml... in `out_dir`, written in
+    parallel by `workers` processes (os.cpu_count() by default).
+
+    The original drugs are copied to the first shard only and the new drugs are split
+    evenly, every shard getting its own consecutive range of IDs (from `first_id`, like
+    generate_drugs) and its own random generator seeded with shard_seed(seed, shard).
+    The files therefore only depend on the input, the seed and the sizes: the same
+    arguments give byte-identical shards whatever the number of workers.
+
+    Returns the manifest, a dictionary of the arguments and of every shard (file,
+    range of new IDs, number of drugs, seed, size and SHA-256), also written to
+    `out_dir`/manifest.json when `manifest` is true.
+    """
+    if num_shards < 1:
+        raise ValueError('num_shards must be at least 1')
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    num_originals, largest_id = _scan_input(xml_in)
+    first_id = largest_id + 1 if first_id is None else first_id
 
-        # for each type of child element, choose one at random from our collected pool.
-        for tag_name, xml_strings in child_map.items():
-            chosen_str = random.choice(xml_strings)
-            new_child = ET.fromstring(chosen_str)
-            new_drug.append(new_child)
+    # shard k gets the new IDs [starts[k], starts[k + 1])
+    num_new = max(0, total_drugs - num_originals)
+    starts = [first_id + num_new * shard // num_shards for shard in range(num_shards + 1)]
+    shards = [{
+        'file': f'drugbank_shard_{shard:05d}.xml',
+        'first_new_id': f'DB{starts[shard]:05d}',
+        'last_new_id': f'DB{starts[shard + 1] - 1:05d}',
+        'num_drugs': starts[shard + 1] - starts[shard] + (num_originals if shard == 0 else 0),
+        'seed': shard_seed(seed, shard),
+    } for shard in range(num_shards)]
 
-        # append the new drug element to the root.
-        root.append(new_drug)
+    arguments = (
+        repeat(xml_in),
+        [out_dir / shard['file'] for shard in shards],
+        starts[:-1],
+        [start - 1 for start in starts[1:]],
+        [shard['seed'] for shard in shards],
+        [shard == 0 for shard in range(num_shards)],
+    )
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or num_shards == 1:
+        results = list(map(_write_shard, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, num_shards)) as executor:
+            results = list(executor.map(_write_shard, *arguments))
 
-    # here we write the updated XML tree to the output file.
-    tree.write(xml_out, encoding='utf-8', xml_declaration=True, pretty_print=True)
+    for shard, (size, sha256) in zip(shards, results):
+        shard['bytes'] = size
+        shard['sha256'] = sha256
+    # nothing machine- or time-dependent, so the manifest is reproducible as well
+    shard_manifest = {
+        'source': Path(xml_in).name,
+        'source_sha256': _file_sha256(xml_in),
+        'total_drugs': sum(shard['num_drugs'] for shard in shards),
+        'seed': seed,
+        'shards': shards,
+    }
+    if manifest:
+        with open(out_dir / SHARD_MANIFEST, 'w') as f:
+            json.dump(shard_manifest, f, indent=2)
+            f.write('\n')
+    return shard_manifest
@@ -0,0 +1,111 @@
+# SQL over the extracted tables with DuckDB, an embedded in-process engine. Every table is
+# registered as a view over its DataFrame or over the memory-mapped Arrow file of its
+# snapshot (cache.snapshot_tables), which DuckDB scans in parallel without copying it,
+# so a question spanning several tables is one query instead of chained pandas masks.
+# The analyses of analyses.py are written again below as queries, as a reference.
+import os
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from cache import DEFAULT_CACHE_DIR, snapshot_tables
+from transformations import TABLE_SCHEMAS
+
+
+def referenced_tables(sql, available=TABLE_SCHEMAS):
+    """Tables of `available` read by `sql` (all of them when DuckDB cannot tell)."""
+    try:
+        names = duckdb.get_table_names(sql)
+    except duckdb.Error: # get_table_names binds some clauses (JOIN ... USING) to unknown tables
+        return list(available)
+    return [table for table in available if table in names]
+
+
+def connect(source, cache_dir=DEFAULT_CACHE_DIR, tables=None, threads=None, memory_limit=None):
+    """
+    A DuckDB connection in which the tables are views. `source` is a dictionary of
+    tables (DataFrames or pyarrow Tables, e.g. from build_all_dataframes) or the path of
+    a DrugBank XML file, whose snapshot in `cache_dir` is queried (built first when
+    needed, see cache.load_drugbank). `tables` limits the registered tables.
+
+    `threads` and `memory_limit` (e.g. '4GB') are DuckDB settings; beyond the memory
+    limit, joins and aggregations spill to temporary files.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        source = snapshot_tables(source, cache_dir, tables)
+    elif tables is not None:
+        source = {table: source[table] for table in tables}
+
+    config = {}
+    if threads is not None:
+        config['threads'] = threads
+    if memory_limit is not None:
+        config['memory_limit'] = memory_limit
+    connection = duckdb.connect(config=config)
+    for name, table in source.items():
+        if isinstance(table, pd.DataFrame):
+            # converted once: DuckDB would turn every categorical into an ENUM on every scan
+            table = pa.Table.from_pandas(table, preserve_index=False)
+        connection.register(name, table)
+    return connection
+
+
+def query(sql, source, params=None, cache_dir=DEFAULT_CACHE_DIR, threads=None, memory_limit=None):
+    """
+    Run `sql` over the tables of `source` and return the result as a DataFrame.
+    `source` is a connection made by connect or what connect accepts; for an XML
+    path or a dictionary only the tables the query reads are opened. `params` fills the `?` or
+    `$name` placeholders of the query.
+
+        query('SELECT "group", count(*) AS num_drugs FROM groups GROUP BY 1', xml_path)
+    """
+    if isinstance(source, duckdb.DuckDBPyConnection):
+        return source.execute(sql, params).df()
+    tables = referenced_tables(sql, TABLE_SCHEMAS if isinstance(source, (str, os.PathLike)) else source)
+    with connect(source, cache_dir, tables, threads, memory_limit) as connection:
+        return connection.execute(sql, params).df()
+
+
+def count_unique_pathways(source):
+    """Number of distinct pathways (analyses.count_unique_pathways)."""
+    return int(query('SELECT count(DISTINCT pathway_name) FROM pathways', source).iat[0, 0])
+
+
+# the lists are typed, so that empty ones are VARCHAR[] too
+_MATCHING_GROUPS = '''
+    SELECT drugbank_id FROM groups
+    WHERE drugbank_id IS NOT NULL
+    GROUP BY drugbank_id
+    HAVING count(DISTINCT "group") FILTER (WHERE list_contains($include::VARCHAR[], "group"::VARCHAR))
+               = len($include::VARCHAR[])
+       AND count(*) FILTER (WHERE list_contains($exclude::VARCHAR[], "group"::VARCHAR)) = 0
+    ORDER BY drugbank_id
+'''
+
+
+def drugs_matching_groups(source, include=(), exclude=()):
+    """
+    Sorted IDs of the drugs belonging to every group of `include` and to none
+    of `exclude` (analyses.drugs_matching_groups).
+    """
+    if isinstance(include, str) or isinstance(exclude, str):
+        raise TypeError('include and exclude are collections of group names')
+    params = {'include': list(dict.fromkeys(include)), 'exclude': list(exclude)}
+    return pd.Index(query(_MATCHING_GROUPS, source, params)['drugbank_id'], dtype=str)
+
+
+def approved_and_non_withdrawn_drugs(source):
+    # count the drugs that are approved but not withdrawn
+    return len(drugs_matching_groups(source, include=['approved'], exclude=['withdrawn']))
+
+
+def count_pathways_per_drug(source):
+    """Number of pathways of every drug (drugbank_id, num_pathways), by drug ID (analyses.count_pathways_per_drug)."""
+    return query('''
+        SELECT drugbank_id::VARCHAR AS drugbank_id, count(DISTINCT pathway_name) AS num_pathways
+        FROM pathways_to_drugs
+        WHERE drugbank_id IS NOT NULL
+        GROUP BY drugbank_id
+        ORDER BY drugbank_id
+    ''', source)
@@ -1,182 +1,545 @@
+import numpy as np
 import pandas as pd
-from parsing import NAMESPACE
-
-def build_drugs_dataframe(root):
-    records = []
-
-    for drug in root.findall(f'{NAMESPACE}drug'):
-        drug_id = drug.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]')
-        name = drug.findtext(f'{NAMESPACE}name')
-        drug_type = drug.get('type')
-        description = drug.findtext(f'{NAMESPACE}description')
-        state = drug.findtext(f'{NAMESPACE}state')
-        # Task is a little bit ambiguous, these two might be good as well
-        # products = [product.findtext(f'{NAMESPACE}dosage-form') for product in drug.findall(f'{NAMESPACE}products/{NAMESPACE}product')]
-        # dosages = [dosage.findtext(f'{NAMESPACE}form') for dosage in drug.findall(f'{NAMESPACE}dosages/{NAMESPACE}dosage')]
-        indication = drug.findtext(f'{NAMESPACE}indication')
-        mechanism_of_action = drug.findtext(f'{NAMESPACE}mechanism-of-action')
-        food_nodes = drug.findall(f'{NAMESPACE}food-interactions/{NAMESPACE}food-interaction')
-        food_interactions = [fn.text for fn in food_nodes]
-
-        records.append({
-            'drugbank_id': drug_id,
-            'name': name,
-            'type': drug_type,
-            'description': description,
-            'form': state,
-            'indication': indication,
-            'mechanism_of_action': mechanism_of_action,
-            'food_interactions': '; '.join(food_interactions)
-        })
-
-    return pd.DataFrame(records)
-
-
-def build_synonyms_dataframe(root):
-    records = []
-
-    for drug in root.findall(f'{NAMESPACE}drug'):
-        drug_id = drug.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]')
-        synonyms = drug.findall(f'{NAMESPACE}synonyms/{NAMESPACE}synonym')
-        for synonym in synonyms:
-            records.append({
-                'drugbank_id': drug_id,
-                'synonym': synonym.text
-            })
-
-    return pd.DataFrame(records)
-
-
-def build_products_dataframe(root):
-    records = []
-
-    for drug in root.findall(f'{NAMESPACE}drug'):
-        drug_id = drug.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]')
-        for product in drug.findall(f'{NAMESPACE}products/{NAMESPACE}product'):
-            name = product.findtext(f'{NAMESPACE}name')
-            labeller = product.findtext(f'{NAMESPACE}labeller')
-            ndc_product_code = product.findtext(f'{NAMESPACE}ndc-product-code')
-            dosage_form = product.findtext(f'{NAMESPACE}dosage-form')
-            route = product.findtext(f'{NAMESPACE}route')
-            strength = product.findtext(f'{NAMESPACE}strength')
-            country = product.findtext(f'{NAMESPACE}country')
-            source = product.findtext(f'{NAMESPACE}source')
-
-            records.append({
-                'drugbank_id': drug_id,
-                'product_name': name,
-                'labeller': labeller,
-                'ndc_product_code': ndc_product_code,
-                'dosage_form': dosage_form,
-                'route': route,
-                'strength': strength,
-                'country': country,
-                'source': source
-            })
-
-    return pd.DataFrame(records)
-
-
-def build_pathways_dataframe(root):
-    records = []
-
-    for drug in root.findall(f'{NAMESPACE}drug'):
-        pathways = drug.findall(f'{NAMESPACE}pathways/{NAMESPACE}pathway')
-        for pathway in pathways:
-            pathway_name = pathway.findtext(f'{NAMESPACE}name')
-            pathway_smpdb = pathway.findtext(f'{NAMESPACE}smpdb-id')
-            records.append({
-                'pathway_name': pathway_name,
-                'smpdb-id': pathway_smpdb
-            })
-
-    return pd.DataFrame(records)
-
-
-def build_pathways_to_drugs_dataframe(root):
-    records = []
-
-    for drug in root.findall(f'{NAMESPACE}drug'):
-        pathways = drug.findall(f'{NAMESPACE}pathways/{NAMESPACE}pathway')
-        for pathway in pathways:
-            pathway_name = pathway.findtext(f'{NAMESPACE}name')
-            pathway_smpdb = pathway.findtext(f'{NAMESPACE}smpdb-id')
-            drugs = pathway.findall(f'{NAMESPACE}drugs/{NAMESPACE}drug')
-            for drug in drugs:
-                drug_id = drug.findtext(f'{NAMESPACE}drugbank-id')
-                records.append({
-                    'pathway_name': pathway_name,
-                    'drugbank_id': drug_id,
-                    'smpdb-id': pathway_smpdb
-                })
-
-    return pd.DataFrame(records)
-
-
-def build_targets_dataframe(root):
-    records = []
-
-    for drug in root.findall(f'{NAMESPACE}drug'):
-        drug_id = drug.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]')
-        targets = drug.findall(f'{NAMESPACE}targets/{NAMESPACE}target')
-        for target in targets:
-            target_id = target.findtext(f'{NAMESPACE}id')
-            polypep = target.find(f"{NAMESPACE}polypeptide")
-            if polypep is not None:
-                external_id = polypep.get('id')
-                external_source = polypep.get('source')
-                polypep_name = polypep.findtext(f'{NAMESPACE}name')
-                gene_name = polypep.findtext(f'{NAMESPACE}gene-name')
-                for ext_id in polypep.findall(f'{NAMESPACE}external-identifiers/{NAMESPACE}external-identifier'):
-                    if 'GenAtlas' in ext_id.findtext(f'{NAMESPACE}resource'):
-                        genatlas_id = ext_id.findtext(f'{NAMESPACE}identifier')
-                        break
-                chromosome_location = polypep.findtext(f'{NAMESPACE}chromosome-location')
-                cellular_location = polypep.findtext(f'{NAMESPACE}cellular-location')
-                
-                records.append({
-                    'drugbank_id': drug_id,
-                    'target_id': target_id,
-                    'external_id': external_id,
-                    'external_source': external_source,
-                    'polypeptide_name': polypep_name,
-                    'gene_name': gene_name,
-                    'genatlas_id': genatlas_id,
-                    'chromosome_location': chromosome_location,
-                    'cellular_location': cellular_location
-                })
-                
-    return pd.DataFrame(records)
-
-
-def build_groups_dataframe(root):
-    records = []
-
-    for drug in root.findall(f'{NAMESPACE}drug'):
-        drug_id = drug.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]')
-        groups = drug.findall(f'{NAMESPACE}groups/{NAMESPACE}group')
-        for group in groups:
-            records.append({
-                'drugbank_id': drug_id,
-                'group': group.text
-            })
-
-    return pd.DataFrame(records)
-
-
-def build_drug_interactions_dataframe(root):
-    records = []
-
-    for drug in root.findall(f'{NAMESPACE}drug'):
-        drug_id = drug.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]')
-        interactions = drug.findall(f'{NAMESPACE}drug-interactions/{NAMESPACE}drug-interaction')
-        for interaction in interactions:
-            other_drug_id = interaction.findtext(f'{NAMESPACE}drugbank-id')
-            description = interaction.findtext(f'{NAMESPACE}description')
-            records.append({
-                'drugbank_id': drug_id,
-                'other_drugbank_id': other_drug_id,
-                'description': description
-            })
-
-    return pd.DataFrame(records)
\ No newline at end of file
+from lxml import etree
+from parsing import NAMESPACE, iter_drugbank_drugs
+
+# bump whenever the extracted tables change, so that cached snapshots get rebuilt
+EXTRACTOR_VERSION = 4
+
+_NAMESPACES = {'db': NAMESPACE[1:-1]}
+
+# free text columns are stored in Arrow buffers instead of one Python str per cell,
+# columns listed in a schema's `categories` (few distinct values) become categoricals
+STRING_DTYPE = 'string[pyarrow]'
+
+# extra column naming the drug a row comes from (see build_all_dataframes)
+ROW_DRUG = '_row_drug'
+
+
+# every builder accepts either the root returned by parse_drugbank_xml
+# or the stream of drugs returned by iter_drugbank_drugs (which can be consumed only once)
+def _iter_drugs(source):
+    if hasattr(source, 'findall'):
+        return source.findall(f'{NAMESPACE}drug')
+    return source
+
+
+_DRUGBANK_ID = f'{NAMESPACE}drugbank-id'
+_NAME = f'{NAMESPACE}name'
+
+
+def _index_children(element):
+    # one scan over the direct children, first element per tag (like find/findtext)
+    children = {}
+    for child in element:
+        if child.tag not in children:
+            children[child.tag] = child
+    return children
+
+
+def _index_drug(drug):
+    """
+    Scan the direct children of a <drug> once and return its primary drugbank-id
+    together with the tag -> first child dictionary, so the table extractors
+    below never have to search the drug again.
+    """
+    drug_id = None
+    children = {}
+
+    for child in drug:
+        tag = child.tag
+        if tag == _DRUGBANK_ID and drug_id is None and child.get('primary') == 'true':
+            drug_id = child.text or ''
+        if tag not in children:
+            children[tag] = child
+
+    return drug_id, children
+
+
+# Every table is described by the element its rows come from and by how each
+# column is read from a row element:
+#   'tag', 'a/b'    text of the first matching child (None when missing, like findtext)
+#   '.'             text of the row element itself
+#   '@attr', 'a/@x' attribute of the row element / of its first `a` child
+#   XPathText(...)  first element matched by an XPath with predicates
+#   XPathJoin(...)  all text nodes matched by an XPath, joined
+#   DRUG_ID         primary drugbank-id of the drug the row belongs to
+#   DRUG_NAME       name of the drug the row belongs to
+# `categories` lists the low-cardinality columns stored as categoricals.
+# `drug_ids` lists the columns (besides DRUG_ID ones) holding drugbank-ids of other drugs;
+# all drug ID columns share one dictionary encoding (see encode_drug_ids).
+# `templates` maps a text column to the columns whose values are replaced in it by
+# `{column}` placeholders, so that texts differing only by those values (drug names)
+# share one template; interactions.interaction_descriptions puts the values back.
+# Rows of `nested` are generated for every matching element under the outer row
+# and inherit the outer row's columns (pathway -> the drugs taking part in it).
+#
+# At import time the column specs are compiled into a tree of child tags, so a
+# row is extracted with a single scan of each element on the way, whatever the
+# number of columns read from it. Predicates run as precompiled etree.XPath objects.
+
+DRUG_ID = object()
+DRUG_NAME = object()
+_DRUG_FIELDS = (DRUG_ID, DRUG_NAME) # order of the drug-level values passed to the extractors
+
+
+class XPathText:
+    def __init__(self, path):
+        self.path = path
+        self.xpath = etree.XPath(path, namespaces=_NAMESPACES)
+
+    def __call__(self, element):
+        matches = self.xpath(element)
+        if not matches:
+            return None
+        return matches[0].text or ''
+
+
+class XPathJoin:
+    def __init__(self, path, separator):
+        self.path = path
+        self.xpath = etree.XPath(path, namespaces=_NAMESPACES, smart_strings=False)
+        self.separator = separator
+
+    def __call__(self, element):
+        return self.separator.join(self.xpath(element))
+
+
+TABLE_SCHEMAS = {
+    'drugs': {
+        'rows': None, # one row per drug
+        'columns': {
+            'drugbank_id': DRUG_ID,
+            'name': 'name',
+            'type': '@type',
+            'description': 'description',
+            'form': 'state',
+            'indication': 'indication',
+            'mechanism_of_action': 'mechanism-of-action',
+            'food_interactions': XPathJoin('db:food-interactions/db:food-interaction/text()', '; '),
+        },
+        'categories': ['type', 'form'],
+    },
+    'synonyms': {
+        'rows': 'synonyms/synonym',
+        'columns': {
+            'drugbank_id': DRUG_ID,
+            'synonym': '.',
+        },
+    },
+    'products': {
+        'rows': 'products/product',
+        'columns': {
+            'drugbank_id': DRUG_ID,
+            'product_name': 'name',
+            'labeller': 'labeller',
+            'ndc_product_code': 'ndc-product-code',
+            'dosage_form': 'dosage-form',
+            'route': 'route',
+            'strength': 'strength',
+            'country': 'country',
+            'source': 'source',
+        },
+        'categories': ['labeller', 'dosage_form', 'route', 'strength', 'country', 'source'],
+    },
+    'pathways': {
+        'rows': 'pathways/pathway',
+        'columns': {
+            'pathway_name': 'name',
+            'smpdb-id': 'smpdb-id',
+        },
+        'categories': ['pathway_name', 'smpdb-id'],
+    },
+    'pathways_to_drugs': {
+        'rows': 'pathways/pathway',
+        'columns': {
+            'pathway_name': 'name',
+            'drugbank_id': None, # filled by the nested rows
+            'smpdb-id': 'smpdb-id',
+        },
+        'nested': {
+            'rows': 'drugs/drug',
+            'columns': {
+                'drugbank_id': 'drugbank-id',
+            },
+        },
+        'drug_ids': ['drugbank_id'],
+        'categories': ['pathway_name', 'smpdb-id'],
+    },
+    'targets': {
+        'rows': 'targets/target',
+        'required': 'polypeptide', # targets without a polypeptide are skipped
+        'columns': {
+            'drugbank_id': DRUG_ID,
+            'target_id': 'id',
+            'external_id': 'polypeptide/@id',
+            'external_source': 'polypeptide/@source',
+            'polypeptide_name': 'polypeptide/name',
+            'gene_name': 'polypeptide/gene-name',
+            # not every polypeptide is linked to GenAtlas
+            'genatlas_id': XPathText(
+                'db:polypeptide/db:external-identifiers/db:external-identifier'
+                '[contains(db:resource, "GenAtlas")][1]/db:identifier'
+            ),
+            'chromosome_location': 'polypeptide/chromosome-location',
+            'cellular_location': 'polypeptide/cellular-location',
+        },
+        'categories': ['external_source', 'chromosome_location', 'cellular_location'],
+    },
+    'groups': {
+        'rows': 'groups/group',
+        'columns': {
+            'drugbank_id': DRUG_ID,
+            'group': '.',
+        },
+        'categories': ['group'],
+    },
+    'drug_interactions': {
+        'rows': 'drug-interactions/drug-interaction',
+        'columns': {
+            'drugbank_id': DRUG_ID,
+            'other_drugbank_id': 'drugbank-id',
+            'description_template': 'description',
+            'drug_name': DRUG_NAME,
+            'other_drug_name': 'name',
+        },
+        'drug_ids': ['other_drugbank_id'],
+        # "... when Lepirudin is combined with Cetuximab." is stored as
+        # "... when {drug_name} is combined with {other_drug_name}."
+        'templates': {'description_template': ['drug_name', 'other_drug_name']},
+        'categories': ['description_template', 'drug_name', 'other_drug_name'],
+    },
+}
+
+
+class _FieldNode:
+    # what has to be read from one element: its text, attributes, XPaths and child elements
+    def __init__(self):
+        self.text = []
+        self.attributes = []
+        self.xpaths = []
+        self.children = {}
+
+    def add(self, spec, position):
+        if callable(spec):
+            self.xpaths.append((spec, position))
+            return
+        node = self
+        *steps, last = spec.split('/')
+        for step in steps:
+            node = node.children.setdefault(f'{NAMESPACE}{step}', _FieldNode())
+        if last == '.':
+            node.text.append(position)
+        elif last.startswith('@'):
+            node.attributes.append((last[1:], position))
+        else:
+            node.children.setdefault(f'{NAMESPACE}{last}', _FieldNode()).text.append(position)
+
+    def extract(self, element, values, children=None):
+        if self.text:
+            text = element.text or ''
+            for position in self.text:
+                values[position] = text
+        for attribute, position in self.attributes:
+            values[position] = element.get(attribute)
+        for xpath, position in self.xpaths:
+            values[position] = xpath(element)
+        if self.children:
+            if children is None:
+                children = _index_children(element)
+            for tag, node in self.children.items():
+                child = children.get(tag)
+                if child is not None:
+                    node.extract(child, values)
+
+
+def _value_length(item):
+    return len(item[0])
+
+
+def _substitute(text, values):
+    # replace every (value, placeholder) in order, never searching inside inserted placeholders
+    value, placeholder = values[0]
+    if len(values) == 1:
+        return text.replace(value, placeholder)
+    rest = values[1:]
+    return placeholder.join([_substitute(part, rest) for part in text.split(value)])
+
+
+class _CompiledTable:
+    def __init__(self, schema, columns=None):
+        self.columns = columns if columns is not None else list(schema['columns'])
+        self.rows = [f'{NAMESPACE}{step}' for step in schema['rows'].split('/')] if schema['rows'] else None
+        self.required = f'{NAMESPACE}{schema["required"]}' if 'required' in schema else None
+        self.drug_positions = []
+        self.fields = _FieldNode()
+        for name, spec in schema['columns'].items():
+            position = self.columns.index(name)
+            if any(spec is field for field in _DRUG_FIELDS):
+                self.drug_positions.append((_DRUG_FIELDS.index(spec), position))
+            elif spec is not None:
+                self.fields.add(spec, position)
+        self.templates = [
+            (self.columns.index(name), [(self.columns.index(slot), f'{{{slot}}}') for slot in slots])
+            for name, slots in schema.get('templates', {}).items()
+        ]
+        self.nested = _CompiledTable(schema['nested'], self.columns) if 'nested' in schema else None
+
+    def _row_elements(self, children):
+        # `children` is the child index of the element the rows path starts from
+        *containers, item = self.rows
+        parent = None
+        for container in containers:
+            if parent is not None:
+                children = _index_children(parent)
+            parent = children.get(container)
+            if parent is None:
+                return []
+        return [child for child in parent if child.tag == item]
+
+    def _apply_templates(self, row_values):
+        for position, slots in self.templates:
+            text = row_values[position]
+            if not text:
+                continue
+            values = [(row_values[slot], placeholder) for slot, placeholder in slots if row_values[slot]]
+            if len(values) > 1:
+                values.sort(key=_value_length, reverse=True) # a name can be a part of a longer one
+            if values:
+                row_values[position] = _substitute(text, values)
+
+    def extract(self, element, drug_values, children, buffers, values=None):
+        # appends the rows found under `element` (a drug, or an outer row when nested)
+        # to `buffers`, one list per column; `drug_values` follows _DRUG_FIELDS
+        if self.rows is None:
+            row_elements = [(element, children)]
+        else:
+            row_elements = [(row, None) for row in self._row_elements(children)]
+
+        for row, row_children in row_elements:
+            if self.required is not None:
+                row_children = _index_children(row)
+                if self.required not in row_children:
+                    continue
+            row_values = list(values) if values is not None else [None] * len(self.columns)
+            for field, position in self.drug_positions:
+                row_values[position] = drug_values[field]
+            if self.nested is None:
+                self.fields.extract(row, row_values, row_children)
+                if self.templates:
+                    self._apply_templates(row_values)
+                for buffer, value in zip(buffers, row_values):
+                    buffer.append(value)
+            else:
+                row_children = row_children or _index_children(row)
+                self.fields.extract(row, row_values, row_children)
+                self.nested.extract(row, drug_values, row_children, buffers, row_values)
+
+
+_COMPILED_TABLES = {table: _CompiledTable(schema) for table, schema in TABLE_SCHEMAS.items()}
+
+
+def _first_step(spec):
+    # name of the drug-level element a column spec reads from (None for the drug itself)
+    path = spec.path if callable(spec) else spec
+    step = path.split('/')[0].replace('db:', '')
+    if step == '.' or step.startswith('@'):
+        return None
+    return step
+
+
+def check_tables(tables=None):
+    """
+    The list of table names `tables` (all of TABLE_SCHEMAS when None),
+    raising ValueError when one of them is not in TABLE_SCHEMAS.
+    """
+    if tables is None:
+        return list(TABLE_SCHEMAS)
+    unknown = [table for table in tables if table not in TABLE_SCHEMAS]
+    if unknown:
+        raise ValueError(f'Unknown tables: {unknown}. Available: {list(TABLE_SCHEMAS)}')
+    return list(tables)
+
+
+def required_elements(tables=None):
+    """
+    Names of the drug-level elements the given tables are extracted from,
+    worked out from TABLE_SCHEMAS. Passed as `keep` to iter_drugbank_drugs
+    the rest of every drug is skipped while parsing.
+    """
+    if tables is None:
+        tables = list(TABLE_SCHEMAS)
+    elements = {'drugbank-id'}
+
+    for table in tables:
+        schema = TABLE_SCHEMAS[table]
+        if any(spec is DRUG_NAME for spec in schema['columns'].values()):
+            elements.add('name')
+        if schema['rows'] is not None:
+            elements.add(_first_step(schema['rows']))
+            continue
+        for spec in schema['columns'].values():
+            if spec is not None and all(spec is not field for field in _DRUG_FIELDS):
+                elements.add(_first_step(spec))
+
+    elements.discard(None)
+    return elements
+
+
+def drug_id_columns(table):
+    # columns of `table` holding drugbank-ids, encoded with the shared drug ID dictionary
+    schema = TABLE_SCHEMAS[table]
+    columns = [column for column, spec in schema['columns'].items() if spec is DRUG_ID]
+    return columns + schema.get('drug_ids', [])
+
+
+def _column_dtype(table, column):
+    if column in TABLE_SCHEMAS[table].get('categories', ()) or column in drug_id_columns(table):
+        return 'category'
+    return STRING_DTYPE
+
+
+def table_dtypes(table):
+    # declared dtype of every column of `table`
+    # (drug ID columns are categoricals whose categories come from encode_drug_ids)
+    return {column: _column_dtype(table, column) for column in _COMPILED_TABLES[table].columns}
+
+
+def _drug_id_dtype(drug_ids):
+    # the dictionary is sorted, so extractions of any part of a file agree on it
+    return pd.CategoricalDtype(sorted(drug_ids))
+
+
+def encode_drug_ids(tables, drug_ids=()):
+    """
+    Encode the drug ID columns of `tables` (a dictionary of DataFrames) with one shared
+    dictionary: the sorted union of `drug_ids` and every ID found in those columns.
+    Returns the re-encoded tables, merges and group-bys between them run on the codes.
+    """
+    values = set(drug_ids)
+    for table, df in tables.items():
+        for column in drug_id_columns(table):
+            values.update(df[column].dropna().unique())
+    dtype = _drug_id_dtype(values)
+    return {
+        table: df.astype({column: dtype for column in drug_id_columns(table)})
+        for table, df in tables.items()
+    }
+
+
+def drug_codes(ids):
+    """Dense int32 codes of a drug ID column (-1 where missing)."""
+    return ids.cat.codes.to_numpy().astype(np.int32, copy=False)
+
+
+def decode_drug_codes(codes, dictionary):
+    """
+    Drug IDs of int32 `codes` in `dictionary` (the categories of a drug ID column),
+    as a string array with missing values where the code is -1.
+    """
+    codes = np.asarray(codes)
+    return pd.array(pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(dictionary)), dtype=STRING_DTYPE)
+
+
+def _to_dataframe(table, buffers, drug_dtype):
+    columns = {}
+    id_columns = drug_id_columns(table)
+    for column, buffer in zip(_COMPILED_TABLES[table].columns, buffers):
+        if column in id_columns:
+            columns[column] = pd.Categorical(buffer, dtype=drug_dtype)
+        elif _column_dtype(table, column) == 'category':
+            columns[column] = pd.Categorical(buffer)
+        else:
+            columns[column] = pd.array(buffer, dtype=STRING_DTYPE)
+    return pd.DataFrame(columns)
+
+
+def _build_dataframe(source, table):
+    return build_all_dataframes(source, [table])[table]
+
+
+def build_drugs_dataframe(source):
+    return _build_dataframe(source, 'drugs')
+
+
+def build_synonyms_dataframe(source):
+    return _build_dataframe(source, 'synonyms')
+
+
+def build_products_dataframe(source):
+    return _build_dataframe(source, 'products')
+
+
+def build_pathways_dataframe(source):
+    return _build_dataframe(source, 'pathways')
+
+
+def build_pathways_to_drugs_dataframe(source):
+    return _build_dataframe(source, 'pathways_to_drugs')
+
+
+def build_targets_dataframe(source):
+    return _build_dataframe(source, 'targets')
+
+
+def build_groups_dataframe(source):
+    return _build_dataframe(source, 'groups')
+
+
+def build_drug_interactions_dataframe(source):
+    return _build_dataframe(source, 'drug_interactions')
+
+
+def build_all_dataframes(source, tables=None, row_drugs=False):
+    """
+    Build several tables while visiting every drug only once.
+    `tables` is a list of names from TABLE_SCHEMAS (all of them by default).
+    Returns a dictionary mapping table names to DataFrames, each identical
+    to what the matching build_*_dataframe function returns.
+    The drug ID columns of all tables share one dictionary made of the primary
+    drugbank-id of every drug and of the IDs they reference (see encode_drug_ids).
+    With `row_drugs` every table gets an extra ROW_DRUG column holding the primary
+    drugbank-id of the drug each row was extracted from.
+    """
+    tables = check_tables(tables)
+
+    buffers = {table: [[] for _ in _COMPILED_TABLES[table].columns] for table in tables}
+    extractors = [(buffers[table], _COMPILED_TABLES[table]) for table in tables]
+    owners = {table: [] for table in tables} if row_drugs else None
+    drug_ids = set()
+
+    for drug in _iter_drugs(source):
+        drug_id, children = _index_drug(drug)
+        drug_ids.add(drug_id)
+        name = children.get(_NAME)
+        drug_values = (drug_id, name.text if name is not None else None)
+        for table_buffers, compiled in extractors:
+            compiled.extract(drug, drug_values, children, table_buffers)
+        if owners is not None:
+            # every column buffer grows by one value per row
+            for table, table_owners in owners.items():
+                table_owners.extend([drug_id] * (len(buffers[table][0]) - len(table_owners)))
+
+    # IDs of other drugs referenced by the rows, drugs missing from the file included
+    for table in tables:
+        for column in drug_id_columns(table):
+            drug_ids.update(buffers[table][_COMPILED_TABLES[table].columns.index(column)])
+    drug_ids.discard(None)
+    drug_dtype = _drug_id_dtype(drug_ids)
+
+    dataframes = {table: _to_dataframe(table, buffers[table], drug_dtype) for table in tables}
+    if owners is not None:
+        for table, df in dataframes.items():
+            df[ROW_DRUG] = pd.array(owners[table], dtype=STRING_DTYPE)
+    return dataframes
+
+
+def load_tables(xml_path, tables=None):
+    """
+    Stream `xml_path` and build the given tables (all by default) in one pass,
+    parsing only the parts of every drug those tables need.
+    """
+    if tables is None:
+        tables = list(TABLE_SCHEMAS)
+    drugs = iter_drugbank_drugs(xml_path, keep=required_elements(tables))
+    return build_all_dataframes(drugs, tables)
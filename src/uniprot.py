@@ -0,0 +1,417 @@
+# Client for the UniProt REST API used by the disease lookups in analyses.py.
+# Requests run concurrently from asyncio (a bounded number at a time, over one pooled
+# requests.Session), are spaced by a token bucket so UniProt's rate limits are respected,
+# and are retried with exponential backoff when UniProt answers 429 or 5xx.
+# Responses can be kept in a persistent SQLite cache (ResponseCache), so genes shared
+# by several drugs or notebook runs are fetched once.
+# Search pages are parsed while they stream in (iter_json_results), entry by entry.
+import asyncio
+import codecs
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+UNIPROT_BASE_URL = 'https://rest.uniprot.org'
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+DEFAULT_RESPONSE_CACHE = '../data/cache/uniprot.sqlite'
+DEFAULT_TTL = 30 * 24 * 3600 # 30 days
+DEFAULT_MAX_RESPONSE_BYTES = 256 * 1024 ** 2 # 256 MB
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def default_base_url():
+    # the UNIPROT_BASE_URL environment variable points the client at another server (tests, mirrors)
+    return os.environ.get('UNIPROT_BASE_URL', UNIPROT_BASE_URL)
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to `capacity`.
+    Meant for one event loop: nothing is awaited between checking and taking a token.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _JSONStream:
+    # JSON text arriving as byte chunks, decoded value by value
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._done = False
+        self.buffer = ''
+        self.pos = 0
+
+    def _read(self):
+        # drop what was consumed and append the next chunk
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._done = True
+            text = self._text.decode(b'', final=True)
+        else:
+            text = self._text.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+
+    def peek(self):
+        # next character after whitespace, '' at the end of the stream
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self._done:
+                return ''
+            self._read()
+
+    def take(self, expected):
+        char = self.peek()
+        if not char or char not in expected:
+            raise ValueError(f'Invalid JSON stream: expected one of {expected!r}, got {char!r}')
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+                # a number at the very end of the buffer may still continue
+                if end < len(self.buffer) or self._done:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._done:
+                    raise
+            self._read()
+
+
+def iter_json_results(chunks, key='results'):
+    """
+    Yield the items of the array `key` of the JSON object sent as the byte `chunks`
+    (e.g. response.iter_content()), each as soon as it is complete. Only the item
+    being decoded is buffered, never the whole document.
+    """
+    stream = _JSONStream(chunks)
+    stream.take('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        name = stream.value()
+        stream.take(':')
+        if name != key:
+            stream.value() # other members are skipped
+        else:
+            stream.take('[')
+            closed = stream.peek() == ']'
+            if closed:
+                stream.take(']')
+            while not closed:
+                yield stream.value()
+                closed = stream.take(',]') == ']'
+        if stream.take(',}') == '}':
+            return
+
+
+def _read_results(response):
+    return list(iter_json_results(response.iter_content(STREAM_CHUNK_SIZE)))
+
+
+def cache_key(path, params=None):
+    """
+    Key of a request in ResponseCache: the path and the parameters sorted by name,
+    values lowercased with whitespace collapsed (UniProt queries are case-insensitive),
+    so 'gene:EGFR' and ' gene:egfr' share an entry.
+    """
+    params = sorted((name, ' '.join(str(value).split()).lower()) for name, value in (params or {}).items())
+    return f'{path}?{urlencode(params)}'
+
+
+class ResponseCache:
+    """
+    Response bodies stored in the SQLite database `path`, by cache_key.
+
+    Entries older than `ttl` seconds are not served (None disables expiry).
+    Once the bodies take more than `max_bytes`, the least recently used entries
+    are removed. `hits` and `misses` count the lookups of this instance.
+    The cache can be shared by several threads and processes.
+    """
+
+    def __init__(self, path=DEFAULT_RESPONSE_CACHE, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_RESPONSE_BYTES):
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, '
+                'fetched_at REAL NOT NULL, last_used REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+
+    def get(self, key, allow_expired=False):
+        """Cached body of `key`, None when it is missing or expired (unless `allow_expired`)."""
+        with self._lock:
+            row = self._connection.execute('SELECT body, fetched_at FROM responses WHERE key = ?', (key,)).fetchone()
+            now = time.time()
+            if row is None or (not allow_expired and self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self._connection.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, body):
+        with self._lock:
+            now = time.time()
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)', (key, body, len(body), now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = []
+        for key, size in self._connection.execute('SELECT key, size FROM responses ORDER BY last_used'):
+            if total <= self.max_bytes:
+                break
+            removed.append((key,))
+            total -= size
+        self._connection.executemany('DELETE FROM responses WHERE key = ?', removed)
+
+    def stats(self):
+        # lookups of this instance and current content of the cache
+        with self._lock:
+            entries, size = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM responses')
+
+    def close(self):
+        self._connection.close()
+
+    def __len__(self):
+        return self.stats()['entries']
+
+
+class UniProtClient:
+    """
+    asyncio client for rest.uniprot.org (or `base_url`).
+
+    At most `concurrency` requests are in flight at a time, sharing a pool of
+    keep-alive connections; `rate` requests per second (bursts of `burst`) are
+    allowed by a token bucket (None disables it). Responses with a status in
+    RETRY_STATUSES and connection errors are retried up to `max_retries` times,
+    waiting backoff * 2**attempt seconds, or what the Retry-After header asks.
+
+    With a ResponseCache `cache`, get_json answers from it when it can and stores
+    what it fetches. `offline` clients never touch the network: they serve cached
+    responses, even expired ones, and raise KeyError for the others.
+    """
+
+    def __init__(self, base_url=None, concurrency=8, rate=10, burst=None,
+                 max_retries=5, backoff=0.5, timeout=30, cache=None, offline=False):
+        if offline and cache is None:
+            raise ValueError('An offline client needs a cache')
+        self.base_url = (base_url or default_base_url()).rstrip('/')
+        self.cache = cache
+        self.offline = offline
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.requests_sent = 0
+        self.bytes_received = 0 # response bodies, as transferred (compressed or not)
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        # blocking requests run here, one worker per allowed request in flight
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='uniprot')
+        self._bucket = TokenBucket(rate, burst) if rate else None
+        self._semaphores = {} # asyncio primitives belong to one event loop
+        self._lock = threading.Lock()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores = {loop: asyncio.Semaphore(self.concurrency)}
+        return self._semaphores[loop]
+
+    def _get(self, url, params, read=None):
+        # with `read`, the body of a successful response is streamed to read(response)
+        with self._lock:
+            self.requests_sent += 1
+        response = self._session.get(url, params=params, timeout=self.timeout, stream=read is not None)
+        value = None
+        if read is not None:
+            with response:
+                if response.ok:
+                    value = read(response)
+        with self._lock:
+            self.bytes_received += response.raw.tell()
+        return response, value
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass # an HTTP date, fall back to the backoff
+        return self.backoff * 2 ** attempt
+
+    async def get(self, path, params=None):
+        """
+        GET `path` (e.g. '/uniprotkb/search', or a full URL such as a next page link)
+        and return the response, retrying when needed.
+        """
+        return (await self._request(path, params))[0]
+
+    async def _request(self, path, params=None, read=None):
+        # (response, read(response)) of a GET, retrying when needed
+        url = path if path.startswith(('http://', 'https://')) else f'{self.base_url}{path}'
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(self.max_retries + 1):
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            async with self._semaphore():
+                try:
+                    response, value = await loop.run_in_executor(self._executor, self._get, url, params, read)
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                    if attempt == self.max_retries:
+                        raise
+                    response = None
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response, value
+            if attempt == self.max_retries:
+                response.raise_for_status()
+            # wait outside the semaphore, other requests can go on meanwhile
+            await asyncio.sleep(self._retry_delay(attempt, response))
+
+    def _cached(self, path, params):
+        # cached body of the request (path, params), None when it has to be fetched
+        if self.cache is None:
+            return None
+        key = cache_key(path, params)
+        body = self.cache.get(key, allow_expired=self.offline)
+        if body is None and self.offline:
+            raise KeyError(f'{key} is not cached (offline mode)')
+        return body
+
+    async def _cached_body(self, path, params, fetch):
+        # body of the request (path, params), from the cache or from `fetch()`
+        body = self._cached(path, params)
+        if body is None:
+            body = await fetch()
+            if self.cache is not None:
+                self.cache.put(cache_key(path, params), body)
+        return body
+
+    async def get_json(self, path, params=None):
+        async def fetch():
+            return (await self.get(path, params)).content
+        return json.loads(await self._cached_body(path, params, fetch))
+
+    async def search(self, query, fields=None, size=500, path='/uniprotkb/search', **params):
+        """
+        Every entry matching the UniProt `query`, as {'results': [...]}.
+        With `fields` (e.g. ['accession', 'cc_disease']) UniProt sends only those fields.
+        Pages of `size` entries are followed through their Link: rel="next" headers and
+        parsed entry by entry as they stream in; the merged result is returned as it is
+        and stored in the cache, whose body is parsed only on later hits.
+        """
+        params = {'query': query, 'format': 'json', 'size': size, **params}
+        if fields is not None:
+            params['fields'] = fields if isinstance(fields, str) else ','.join(fields)
+
+        async def fetch():
+            results = []
+            response, page = await self._request(path, params, _read_results)
+            while True:
+                results.extend(page)
+                next_page = response.links.get('next')
+                if next_page is None:
+                    return results
+                response, page = await self._request(next_page['url'], read=_read_results)
+
+        body = self._cached(path, params)
+        if body is not None:
+            return json.loads(body)
+        # the pages were decoded while streaming, the cache gets a copy and nothing is parsed again
+        result = {'results': await fetch()}
+        if self.cache is not None:
+            self.cache.put(cache_key(path, params), json.dumps(result).encode())
+        return result
+
+    async def search_gene(self, gene_name, fields=None):
+        # UniProtKB entries of a gene (every page), as JSON
+        return await self.search(f'gene:{gene_name}', fields)
+
+    def close(self):
+        self._session.close()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run(coroutine):
+    """
+    Run `coroutine` to completion from synchronous code and return its result.
+    Inside an already running event loop (e.g. Jupyter) it runs on a separate thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
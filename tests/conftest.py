@@ -1,7 +1,20 @@
+import shutil
 import sys
 from pathlib import Path
 
+import pytest
+
 # this file is loaded when pytest is run on our `tests` folder
 # this way we can acess files from `src` folder without any issues
 src_path = Path(__file__).resolve().parent.parent / 'src'
-sys.path.append(str(src_path))
\ No newline at end of file
+sys.path.append(str(src_path))
+
+XML_PATH = '../data/drugbank_partial.xml'
+
+
+@pytest.fixture
+def xml_copy(tmp_path):
+    # a copy of the partial DrugBank file, for the tests that modify or index it
+    xml_path = tmp_path / 'drugbank.xml'
+    shutil.copy(XML_PATH, xml_path)
+    return xml_path
@@ -4,6 +4,8 @@ import pandas as pd
 from analyses import (
     count_unique_pathways,
     approved_and_non_withdrawn_drugs,
+    build_group_masks,
+    drugs_matching_groups,
     count_pathways_per_drug
 )
 
@@ -53,3 +55,28 @@ def test_count_pathways_per_drug():
     res_dict = dict(zip(df_count['drugbank_id'], df_count['num_pathways']))
     assert res_dict.get('DB00001') == 2, f'Expected DB00001 => 2, got {res_dict.get("DB00001")}'
     assert res_dict.get('DB01022') == 1, f'Expected DB01022 => 1, got {res_dict.get("DB01022")}'
+
+
+def test_drugs_matching_groups():
+    df_groups = pd.DataFrame([
+        {'drugbank_id': 'DB00001', 'group': 'approved'},
+        {'drugbank_id': 'DB00001', 'group': 'withdrawn'},
+        {'drugbank_id': 'DB00002', 'group': 'approved'},
+        {'drugbank_id': 'DB00002', 'group': 'nutraceutical'},
+        {'drugbank_id': 'DB00003', 'group': 'investigational'},
+        {'drugbank_id': 'DB00004', 'group': 'approved'},
+        {'drugbank_id': 'DB00004', 'group': 'investigational'},
+    ])
+    group_masks = build_group_masks(df_groups)
+    assert group_masks.groups == ['approved', 'investigational', 'nutraceutical', 'withdrawn']
+
+    def matching(**query):
+        return list(drugs_matching_groups(group_masks, **query))
+
+    assert matching(include=['investigational'], exclude=['approved']) == ['DB00003']
+    assert matching(include=['nutraceutical', 'approved']) == ['DB00002']
+    assert matching(include=['approved'], exclude=['withdrawn']) == ['DB00002', 'DB00004']
+    assert matching(exclude=['approved']) == ['DB00003']
+    assert matching(include=['vet_approved']) == [], 'Nobody belongs to a group missing from the table'
+    assert matching(include=['approved'], exclude=['vet_approved']) == ['DB00001', 'DB00002', 'DB00004']
+    assert list(drugs_matching_groups(df_groups, include=['withdrawn'])) == ['DB00001']
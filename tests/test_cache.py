@@ -0,0 +1,78 @@
+import os
+import pandas as pd
+
+from cache import load_drugbank, update_drugbank, evict_snapshots, snapshot_key
+from drug_index import drug_byte_ranges
+from parsing import parse_drugbank_xml
+from transformations import build_all_dataframes, build_synonyms_dataframe
+
+
+def test_load_drugbank_matches_builders(xml_copy, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    expected = build_synonyms_dataframe(parse_drugbank_xml(str(xml_copy)))
+
+    first = load_drugbank(xml_copy, cache_dir, tables=['synonyms'])['synonyms']
+    second = load_drugbank(xml_copy, cache_dir, tables=['synonyms'])['synonyms']
+
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first, expected, check_dtype=False)
+    assert (cache_dir / snapshot_key(xml_copy)).is_dir(), 'Snapshot should be stored'
+
+
+def test_stale_snapshot_is_rebuilt(xml_copy, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    load_drugbank(xml_copy, cache_dir, tables=['drugs'])
+    old_key = snapshot_key(xml_copy)
+
+    # drop the first drug, the cached snapshot no longer describes the file
+    root = parse_drugbank_xml(str(xml_copy))
+    root.remove(root[0])
+    root.getroottree().write(str(xml_copy))
+    os.utime(xml_copy, ns=(0, 1))
+
+    df_drugs = load_drugbank(xml_copy, cache_dir, tables=['drugs'])['drugs']
+    assert len(df_drugs) == 99, 'Tables should be extracted again from the changed file'
+    assert snapshot_key(xml_copy) != old_key
+    assert not (cache_dir / old_key).exists(), 'Stale snapshot should be removed'
+
+
+def test_evict_snapshots(xml_copy, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    load_drugbank(xml_copy, cache_dir, tables=['drugs'])
+    key = snapshot_key(xml_copy)
+
+    assert evict_snapshots(cache_dir, max_bytes=0, keep={key}) == []
+    assert evict_snapshots(cache_dir, max_bytes=0) == [key]
+    assert not (cache_dir / key).exists()
+
+
+def test_update_drugbank_patches_changed_drugs(xml_copy, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    first = update_drugbank(xml_copy, cache_dir=cache_dir)
+    assert set(first['change']) == {'added'}
+    assert update_drugbank(xml_copy, cache_dir=cache_dir).empty, 'Up to date snapshot has no changes'
+
+    # new release: DB00003 removed, a synonym of DB00001 renamed, DB00002 copied as DB99999
+    data = xml_copy.read_bytes()
+    ranges = drug_byte_ranges(xml_copy)
+    removed_start, removed_end = ranges['DB00003']
+    added = data[slice(*ranges['DB00002'])].replace(b'DB00002', b'DB99999')
+    data = data[:removed_start] + data[removed_end:]
+    data = data.replace(b'Desulfatohirudin', b'Desulfatohirudin-2')
+    footer_start = data.rindex(b'</drugbank>')
+    data = data[:footer_start] + added + data[footer_start:]
+    xml_copy.write_bytes(data)
+    os.utime(xml_copy, ns=(0, 1))
+
+    report = update_drugbank(xml_copy, cache_dir=cache_dir)
+    changes = set(report.itertuples(index=False, name=None))
+    assert ('synonyms', 'modified', 'DB00001') in changes
+    assert ('drugs', 'removed', 'DB00003') in changes
+    assert ('drugs', 'added', 'DB99999') in changes
+    assert ('drugs', 'modified', 'DB00001') not in changes, 'Only tables whose rows changed are reported'
+
+    # the patched snapshot equals a full extraction of the new release
+    tables = load_drugbank(xml_copy, cache_dir)
+    expected = build_all_dataframes(parse_drugbank_xml(str(xml_copy)))
+    for table, df in expected.items():
+        pd.testing.assert_frame_equal(tables[table], df)
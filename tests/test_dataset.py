@@ -0,0 +1,63 @@
+import os
+import pytest
+import pandas as pd
+
+from analyses import count_pathways_per_drug
+from dataset import DrugBankDataset
+from parsing import parse_drugbank_xml
+from transformations import build_all_dataframes
+
+XML_PATH = '../data/drugbank_partial.xml'
+
+
+def test_dataset_computes_only_dependencies():
+    dataset = DrugBankDataset(XML_PATH)
+    expected = count_pathways_per_drug(build_all_dataframes(parse_drugbank_xml(XML_PATH))['pathways_to_drugs'])
+
+    pd.testing.assert_frame_equal(dataset.pathway_counts, expected)
+    assert dataset.computed() == ['pathways_to_drugs', 'pathway_counts'], 'Only the needed table should be extracted'
+    assert dataset.pathway_counts is dataset.pathway_counts, 'Values should be memoized'
+    assert DrugBankDataset.dependencies('pathway_counts') == ('pathways_to_drugs',)
+    assert 'pathway_counts' in DrugBankDataset.dependents('pathways_to_drugs')
+
+
+def test_dataset_matches_builders(tmp_path):
+    expected = build_all_dataframes(parse_drugbank_xml(XML_PATH))
+    for cache_dir in (None, tmp_path / 'cache'):
+        dataset = DrugBankDataset(XML_PATH, cache_dir=cache_dir)
+        for table, df in expected.items():
+            pd.testing.assert_frame_equal(getattr(dataset, table), df)
+
+
+def test_dataset_invalidation(xml_copy):
+    dataset = DrugBankDataset(xml_copy)
+    assert len(dataset.drugs) == 100
+    dataset.groups
+
+    dataset.invalidate('drugs')
+    assert dataset.computed() == ['groups']
+
+    # drop the first drug, every memoized value is stale
+    root = parse_drugbank_xml(str(xml_copy))
+    root.remove(root[0])
+    root.getroottree().write(str(xml_copy))
+    os.utime(xml_copy, ns=(0, 1))
+
+    assert len(dataset.drugs) == 99
+    assert dataset.computed() == ['drugs']
+
+
+def test_dataset_memory_budget():
+    dataset = DrugBankDataset(XML_PATH, memory_budget=0)
+    dataset.drugs
+    dataset.pathway_counts
+    assert dataset.computed() == ['pathway_counts'], 'Only the last value should stay within the budget'
+
+    dataset = DrugBankDataset(XML_PATH, memory_budget=10 ** 9)
+    dataset.drugs
+    dataset.pathway_counts
+    assert dataset.computed() == ['drugs', 'pathways_to_drugs', 'pathway_counts']
+    assert dataset.memory_usage() > 0
+
+    with pytest.raises(KeyError):
+        dataset.get('not_a_value')
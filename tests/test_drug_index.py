@@ -0,0 +1,77 @@
+import os
+import shutil
+import pytest
+
+import drug_index
+
+from drug_index import DrugIndex, build_drug_index, load_drug_index, get_drug_element
+from parsing import parse_drugbank_xml, NAMESPACE
+from transformations import build_synonyms_dataframe
+
+XML_PATH = '../data/drugbank_partial.xml'
+
+
+def test_index_covers_all_drugs(xml_copy):
+    xml_copy = str(xml_copy)
+    index = build_drug_index(xml_copy)
+    root = parse_drugbank_xml(xml_copy)
+    expected = {d.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]') for d in root.findall(f'{NAMESPACE}drug')}
+    assert set(index['drugs']) == expected
+
+
+@pytest.mark.parametrize('drug_id, synonym', [
+    ('DB00001', 'Desulfatohirudin'),
+    ('DB00002', 'Cetuximab'),
+])
+def test_get_drug_element(xml_copy, drug_id, synonym):
+    drug = get_drug_element(drug_id, str(xml_copy))
+    assert drug is not None
+    assert drug.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]') == drug_id
+
+    # the single element works with the regular builders
+    df_synonyms = build_synonyms_dataframe([drug])
+    assert synonym in df_synonyms['synonym'].tolist()
+
+
+def test_unknown_drug_returns_none(xml_copy):
+    index = DrugIndex(str(xml_copy))
+    assert 'DB99999' not in index
+    assert index.get_drug_element('DB99999') is None
+    index.close()
+
+
+def test_stale_index_is_rebuilt(xml_copy):
+    xml_copy = str(xml_copy)
+    build_drug_index(xml_copy)
+    with open(xml_copy, 'a') as f:
+        f.write('\n')
+    index = load_drug_index(xml_copy)
+    assert index['size'] == len(open(xml_copy, 'rb').read())
+
+
+def test_open_indexes_are_closed_when_stale_or_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(drug_index, 'MAX_OPEN_INDEXES', 2)
+    paths = [str(tmp_path / f'drugbank_{i}.xml') for i in range(3)]
+    for path in paths:
+        shutil.copy(XML_PATH, path)
+    try:
+        first = drug_index._open_index(paths[0], os.stat(paths[0]).st_mtime_ns)
+        assert get_drug_element('DB00001', paths[0]) is not None
+        assert drug_index._open_index(paths[0], os.stat(paths[0]).st_mtime_ns) is first
+
+        # a modified file closes its old index
+        stat = os.stat(paths[0])
+        os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert get_drug_element('DB00001', paths[0]) is not None
+        assert first.closed
+        second = drug_index._open_index(paths[0], os.stat(paths[0]).st_mtime_ns)
+        assert not second.closed
+
+        # the least recently used index is closed beyond MAX_OPEN_INDEXES
+        get_drug_element('DB00002', paths[1])
+        get_drug_element('DB00002', paths[2])
+        assert second.closed
+        assert list(drug_index._open_indexes) == paths[1:]
+    finally:
+        drug_index.close_indexes()
+    assert not drug_index._open_indexes
@@ -0,0 +1,81 @@
+import pytest
+import pandas as pd
+from lxml import etree
+
+from interactions import InteractionGraph, interaction_descriptions, interactions_with_template
+from parsing import parse_drugbank_xml
+from transformations import build_drug_interactions_dataframe
+
+
+@pytest.fixture
+def graph():
+    df_interactions = pd.DataFrame({
+        'drugbank_id':       ['DB00001', 'DB00001', 'DB00002', 'DB00003', 'DB00001'],
+        'other_drugbank_id': ['DB00002', 'DB00003', 'DB00001', 'DB00004', 'DB00002'],
+        'description':       ['a', 'b', 'a', 'c', 'a'],
+    })
+    return InteractionGraph.from_dataframe(df_interactions)
+
+
+def test_symmetric_duplicates_merged(graph):
+    assert len(graph) == 4
+    assert graph.num_interactions == 3, 'Pairs listed twice or in both directions should be merged'
+    assert list(graph.neighbors('DB00001')) == ['DB00002', 'DB00003']
+    assert list(graph.neighbors('DB00004')) == ['DB00003']
+    assert graph.degree('DB00002') == 1
+    assert len(graph.neighbors('DB09999')) == 0
+    assert graph.interacts('DB00002', 'DB00001') and not graph.interacts('DB00002', 'DB00003')
+
+
+def test_interactions_among(graph):
+    assert graph.any_interaction(['DB00002', 'DB00003', 'DB00001'])
+    assert not graph.any_interaction(['DB00002', 'DB00003', 'DB00009'])
+    among = graph.interactions_among(['DB00001', 'DB00002', 'DB00003'])
+    assert list(among.itertuples(index=False, name=None)) == [('DB00001', 'DB00002'), ('DB00001', 'DB00003')]
+
+
+def test_save_and_load(tmp_path):
+    df_interactions = build_drug_interactions_dataframe(parse_drugbank_xml('../data/drugbank_partial.xml'))
+    graph = InteractionGraph.from_dataframe(df_interactions)
+    graph.save(tmp_path / 'graph')
+    loaded = InteractionGraph.load(tmp_path / 'graph')
+
+    for drug_id, other_drug_id in zip(df_interactions['drugbank_id'], df_interactions['other_drugbank_id']):
+        assert other_drug_id in loaded.neighbors(drug_id)
+        assert drug_id in loaded.neighbors(other_drug_id)
+    assert (loaded.to_scipy() != graph.to_scipy()).nnz == 0
+
+
+def _interaction(other_id, other_name, description):
+    return (f'<drug-interaction><drugbank-id>{other_id}</drugbank-id><name>{other_name}</name>'
+            f'<description>{description}</description></drug-interaction>')
+
+
+def test_description_templates():
+    descriptions = [
+        ('DB00010', 'Drug10', 'The risk or severity of bleeding can be increased when Drug1 is combined with Drug10.'),
+        ('DB00002', 'name', 'The risk or severity of bleeding can be increased when Drug1 is combined with name.'),
+        ('DB00003', 'Drug3', 'Drug3 may decrease the excretion rate of Drug1.'),
+        ('DB00004', 'Drug4', 'No names here.'),
+    ]
+    root = etree.fromstring(
+        '<drugbank xmlns="http://www.drugbank.ca">'
+        '<drug><drugbank-id primary="true">DB00001</drugbank-id><name>Drug1</name><drug-interactions>'
+        + ''.join(_interaction(*description) for description in descriptions) +
+        '<drug-interaction><drugbank-id>DB00005</drugbank-id><name>Drug5</name></drug-interaction>'
+        '</drug-interactions></drug>'
+        '</drugbank>'
+    )
+
+    df_interactions = build_drug_interactions_dataframe(root)
+    templates = df_interactions['description_template']
+
+    assert templates[0] == 'The risk or severity of bleeding can be increased when {drug_name} is combined with {other_drug_name}.'
+    assert templates[0] == templates[1], 'Descriptions differing only by drug names should share a template'
+    assert len(templates.cat.categories) == 3
+    rebuilt = interaction_descriptions(df_interactions)
+    assert rebuilt[:4].tolist() == [description for _, _, description in descriptions]
+    assert pd.isna(rebuilt[4])
+
+    risky = interactions_with_template(df_interactions, 'risk or severity')
+    assert risky['other_drugbank_id'].tolist() == ['DB00010', 'DB00002']
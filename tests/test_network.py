@@ -0,0 +1,57 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+import network
+from interactions import InteractionGraph
+from network import connected_components, core_numbers, degree_distribution, network_statistics, triangles
+from parsing import parse_drugbank_xml
+from transformations import build_drug_interactions_dataframe
+
+
+@pytest.fixture(params=['partial', 'random'])
+def graphs(request):
+    # the interaction graph and the same graph in networkx (without self-interactions)
+    if request.param == 'partial':
+        df_interactions = build_drug_interactions_dataframe(parse_drugbank_xml('../data/drugbank_partial.xml'))
+    else:
+        rng = np.random.default_rng(0)
+        ids = np.array([f'DB{i:05d}' for i in range(300)])
+        df_interactions = pd.DataFrame({'drugbank_id': ids[rng.integers(0, 300, 1500)],
+                                        'other_drugbank_id': ids[rng.integers(0, 300, 1500)]})
+    graph = InteractionGraph.from_dataframe(df_interactions)
+    nx_graph = nx.Graph()
+    nx_graph.add_nodes_from(graph.drug_ids)
+    nx_graph.add_edges_from((a, b) for a, b in zip(df_interactions['drugbank_id'].astype(str),
+                                                   df_interactions['other_drugbank_id'].astype(str)) if a != b)
+    return graph, nx_graph
+
+
+def test_degrees_and_components(graphs):
+    graph, nx_graph = graphs
+    distribution = degree_distribution(graph)
+    expected = pd.Series(dict(nx_graph.degree())).value_counts().sort_index()
+    assert dict(zip(distribution['degree'], distribution['num_drugs'])) == expected.to_dict()
+
+    components = connected_components(graph)
+    expected = sorted((len(c) for c in nx.connected_components(nx_graph)), reverse=True)
+    assert components.groupby('component')['drugbank_id'].size().tolist() == expected
+    for component in nx.connected_components(nx_graph):
+        assert components.loc[components['drugbank_id'].isin(component), 'component'].nunique() == 1
+
+
+def test_cores_and_triangles(graphs, monkeypatch):
+    graph, nx_graph = graphs
+    monkeypatch.setattr(network, '_WEDGE_BLOCK', 7) # many blocks
+    cores = core_numbers(graph)
+    assert dict(zip(cores['drugbank_id'], cores['core_number'])) == nx.core_number(nx_graph)
+
+    df = triangles(graph)
+    assert dict(zip(df['drugbank_id'], df['triangles'])) == nx.triangles(nx_graph)
+    assert df['clustering'].to_numpy() == pytest.approx([nx.clustering(nx_graph)[d] for d in df['drugbank_id']])
+
+    statistics = network_statistics(graph)
+    assert list(statistics.columns) == ['drugbank_id', 'degree', 'component', 'component_size',
+                                        'core_number', 'triangles', 'clustering']
+    pd.testing.assert_series_equal(statistics['triangles'], df['triangles'])
@@ -0,0 +1,29 @@
+import pytest
+import pandas as pd
+
+from parallel import build_all_dataframes_parallel
+from parsing import parse_drugbank_xml, scan_drug_offsets
+from transformations import build_all_dataframes
+
+XML_PATH = '../data/drugbank_partial.xml'
+
+
+def test_scan_drug_offsets_finds_top_level_drugs():
+    offsets = scan_drug_offsets(XML_PATH)
+    assert len(offsets) == 100, f'Expected 100 top-level drugs, found {len(offsets)}.'
+
+    with open(XML_PATH, 'rb') as f:
+        data = f.read()
+    for start, end in offsets:
+        assert data[start:end].startswith(b'<drug ')
+        assert data[start:end].endswith(b'</drug>')
+
+
+@pytest.mark.parametrize('workers, chunk_size', [(1, 7), (2, 7)])
+def test_parallel_matches_serial(workers, chunk_size):
+    expected = build_all_dataframes(parse_drugbank_xml(XML_PATH))
+    result = build_all_dataframes_parallel(XML_PATH, workers=workers, chunk_size=chunk_size)
+
+    assert list(result) == list(expected)
+    for table in expected:
+        pd.testing.assert_frame_equal(result[table], expected[table])
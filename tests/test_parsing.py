@@ -1,6 +1,87 @@
+import bz2
+import gzip
+import lzma
+import zipfile
+
 import pytest
-from parsing import parse_drugbank_xml
+from lxml import etree
+
+import parsing
+from parsing import parse_drugbank_xml, iter_drugbank_drugs, NAMESPACE
 
 def test_parse_drugbank_xml():
     root = parse_drugbank_xml('../data/drugbank_partial.xml')
-    assert root is not None, 'XML root should not be None'
\ No newline at end of file
+    assert root is not None, 'XML root should not be None'
+
+def test_iter_drugbank_drugs_matches_parse():
+    root = parse_drugbank_xml('../data/drugbank_partial.xml')
+    expected = [d.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]') for d in root.findall(f'{NAMESPACE}drug')]
+
+    streamed = [d.findtext(f'{NAMESPACE}drugbank-id[@primary="true"]') for d in iter_drugbank_drugs('../data/drugbank_partial.xml')]
+    assert streamed == expected, 'Streaming should yield the same top-level drugs in the same order'
+
+
+@pytest.mark.parametrize('suffix', ['.gz', '.bz2', '.xz', '.zip'])
+def test_compressed_inputs(tmp_path, suffix):
+    with open('../data/drugbank_partial.xml', 'rb') as f:
+        data = f.read()
+
+    compressed_path = tmp_path / f'drugbank.xml{suffix}'
+    if suffix == '.zip':
+        with zipfile.ZipFile(compressed_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('full database.xml', data)
+    else:
+        opener = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}[suffix]
+        with opener(compressed_path, 'wb') as f:
+            f.write(data)
+
+    root = parse_drugbank_xml(str(compressed_path))
+    assert len(root.findall(f'{NAMESPACE}drug')) == 100
+    assert sum(1 for _ in iter_drugbank_drugs(str(compressed_path))) == 100
+
+
+def test_projection_skips_unneeded_elements(monkeypatch):
+    # tiny reads make elements to cut span several blocks
+    monkeypatch.setattr(parsing, '_READ_BUFFER_SIZE', 61)
+
+    count = 0
+    with_pathways = 0
+    # streamed drugs are cleared once the next one is requested, so check them on the fly
+    for drug in iter_drugbank_drugs('../data/drugbank_partial.xml', keep={'drugbank-id', 'pathways'}):
+        count += 1
+        assert drug.find(f'{NAMESPACE}drug-interactions') is None, 'drug-interactions should not be parsed'
+        assert drug.find(f'{NAMESPACE}targets') is None, 'targets should not be parsed'
+        assert drug.find(f'{NAMESPACE}name') is not None, 'elements that also appear nested are kept'
+        with_pathways += drug.find(f'{NAMESPACE}pathways') is not None
+
+    assert count == 100
+    assert with_pathways > 0
+
+
+SALT_XML = b'''<?xml version="1.0" encoding="UTF-8"?>
+<drugbank xmlns="http://www.drugbank.ca">
+<drug type="small molecule">
+  <drugbank-id primary="true">DB00001</drugbank-id>
+  <name>X</name>
+  <cas-number>1-2-3</cas-number>
+  <unii>DRUGUNII</unii>
+  <average-mass>100.1</average-mass>
+  <monoisotopic-mass>100.0</monoisotopic-mass>
+  <salts>
+    <salt><drugbank-id>DBSALT001</drugbank-id><name>X sodium</name><unii>SALTUNII</unii>
+      <cas-number>4-5-6</cas-number><average-mass>122.1</average-mass><monoisotopic-mass>122.0</monoisotopic-mass></salt>
+  </salts>
+</drug>
+</drugbank>
+'''
+
+
+def test_projection_keeps_kept_subtrees(tmp_path):
+    xml_path = tmp_path / 'salts.xml'
+    xml_path.write_bytes(SALT_XML)
+
+    def salts(keep):
+        return [etree.tostring(drug.find(f'{NAMESPACE}salts')) for drug in iter_drugbank_drugs(str(xml_path), keep=keep)]
+
+    assert salts({'drugbank-id', 'salts'}) == salts(None), 'Projection should not change a kept subtree'
+    assert b'SALTUNII' in salts({'drugbank-id', 'salts'})[0]
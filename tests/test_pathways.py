@@ -0,0 +1,61 @@
+import pytest
+import pandas as pd
+
+from analyses import count_pathways_per_drug
+from parsing import parse_drugbank_xml
+from pathways import PathwayIncidence
+from transformations import build_pathways_to_drugs_dataframe
+
+
+@pytest.fixture
+def df_pathways_to_drugs():
+    return build_pathways_to_drugs_dataframe(parse_drugbank_xml('../data/drugbank_partial.xml'))
+
+
+def test_incidence_counts(df_pathways_to_drugs):
+    incidence = PathwayIncidence.from_dataframe(df_pathways_to_drugs)
+    pairs = df_pathways_to_drugs[['drugbank_id', 'pathway_name']].drop_duplicates().astype(str)
+
+    assert incidence.matrix.nnz == len(pairs)
+    counts = incidence.pathway_counts()
+    expected = pairs.groupby('pathway_name')['drugbank_id'].nunique()
+    assert dict(zip(counts['pathway_name'], counts['num_drugs'])) == expected.to_dict()
+    assert counts['num_drugs'].is_monotonic_decreasing
+
+    per_drug = count_pathways_per_drug(df_pathways_to_drugs).astype({'drugbank_id': str})
+    for drug_id, num_pathways in per_drug.itertuples(index=False):
+        assert len(incidence.pathways_of(drug_id)) == num_pathways
+
+
+def test_cooccurring_pathways(df_pathways_to_drugs):
+    incidence = PathwayIncidence.from_dataframe(df_pathways_to_drugs)
+    pairs = df_pathways_to_drugs[['drugbank_id', 'pathway_name']].drop_duplicates().astype(str)
+
+    # the pandas way: self-join on the drug
+    joined = pairs.merge(pairs, on='drugbank_id')
+    joined = joined[joined['pathway_name_x'] < joined['pathway_name_y']]
+    expected = joined.groupby(['pathway_name_x', 'pathway_name_y']).size()
+
+    cooccurring = incidence.cooccurring_pathways()
+    assert dict(zip(zip(cooccurring['pathway_name'], cooccurring['other_pathway_name']), cooccurring['num_drugs'])) \
+        == expected.to_dict()
+    assert len(incidence.cooccurring_pathways(min_drugs=3)) == (expected >= 3).sum()
+
+
+def test_similar_drugs(df_pathways_to_drugs):
+    incidence = PathwayIncidence.from_dataframe(df_pathways_to_drugs)
+    pairs = df_pathways_to_drugs[['drugbank_id', 'pathway_name']].drop_duplicates().astype(str)
+    sets = pairs.groupby('drugbank_id')['pathway_name'].apply(set)
+
+    drug_ids = list(sets.index[:10])
+    similar = incidence.similar_drugs(drug_ids + ['DB99999'], k=5)
+    for drug_id in drug_ids:
+        scores = sorted(((-len(sets[drug_id] & other) / len(sets[drug_id] | other), other_id)
+                         for other_id, other in sets.items() if other_id != drug_id and sets[drug_id] & other))
+        rows = similar[similar['drugbank_id'] == drug_id]
+        assert list(rows['similar_drugbank_id']) == [other_id for _, other_id in scores[:5]]
+        assert rows['jaccard'].tolist() == pytest.approx([-score for score, _ in scores[:5]])
+
+    assert set(similar['drugbank_id']) == set(drug_ids)
+    pd.testing.assert_frame_equal(incidence.similar_drugs(drug_ids[0], k=5),
+                                  similar[similar['drugbank_id'] == drug_ids[0]].reset_index(drop=True))
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from parsing import parse_drugbank_xml
+from similarity import TargetSimilarityIndex
+from transformations import build_targets_dataframe
+
+
+@pytest.fixture
+def df_targets():
+    return build_targets_dataframe(parse_drugbank_xml('../data/drugbank_partial.xml'))
+
+
+def _dense_similarities(df_targets):
+    # the same weighting with a dense drug x gene table
+    incidence = pd.crosstab(df_targets['drugbank_id'].astype(str), df_targets['gene_name'].astype(str)) > 0
+    weights = np.log(len(incidence) / incidence.sum())
+    vectors = incidence * weights
+    vectors = vectors.div(np.sqrt((vectors ** 2).sum(axis=1)), axis=0)
+    return vectors @ vectors.T
+
+
+def test_similar_drugs(df_targets):
+    index = TargetSimilarityIndex.from_dataframe(df_targets)
+    similarities = _dense_similarities(df_targets)
+
+    drug_ids = list(similarities.index[:10])
+    similar = index.similar_drugs(drug_ids + ['DB99999'], k=5)
+    assert set(similar['drugbank_id']) == set(drug_ids)
+    for drug_id in drug_ids:
+        scores = similarities[drug_id].drop(drug_id)
+        scores = scores[scores > 0]
+        expected = sorted(zip(-scores.round(5), scores.index))[:5]
+        rows = similar[similar['drugbank_id'] == drug_id]
+        assert rows['similarity'].tolist() == pytest.approx([-score for score, _ in expected], abs=1e-5)
+        # the same drugs, up to ties
+        assert set(rows['similar_drugbank_id']) <= set(scores.index[scores.round(5) >= -expected[-1][0]])
+
+    pd.testing.assert_frame_equal(index.similar_drugs(drug_ids[0], k=5),
+                                  similar[similar['drugbank_id'] == drug_ids[0]].reset_index(drop=True))
+
+
+def test_save_and_load(df_targets, tmp_path):
+    index = TargetSimilarityIndex.from_dataframe(df_targets)
+    index.save(tmp_path / 'index')
+    for mmap in (True, False):
+        loaded = TargetSimilarityIndex.load(tmp_path / 'index', mmap=mmap)
+        assert len(loaded) == len(index) and list(loaded.genes) == list(index.genes)
+        pd.testing.assert_frame_equal(loaded.similar_drugs(index.drug_ids[:20], k=3),
+                                      index.similar_drugs(index.drug_ids[:20], k=3))
@@ -0,0 +1,76 @@
+import json
+import random
+import pytest
+import pandas as pd
+from lxml import etree
+
+from parsing import iter_drugbank_drugs, NAMESPACE
+from simulator import generate_drugs, generate_shards
+from transformations import load_tables
+
+XML_PATH = '../data/drugbank_partial.xml'
+
+
+@pytest.fixture(scope='module')
+def partial_tables():
+    return load_tables(XML_PATH)
+
+
+def test_generate_drugs_streams_a_valid_file(tmp_path, partial_tables):
+    out_path = tmp_path / 'simulated.xml'
+    random.seed(0)
+    generate_drugs(XML_PATH, out_path, total_drugs=500)
+
+    tables = load_tables(out_path)
+    ids = list(tables['drugs']['drugbank_id'])
+    assert ids[:100] == list(partial_tables['drugs']['drugbank_id']), 'The original drugs should come first'
+    # the new IDs follow the largest ID of the input
+    assert ids[100:] == [f'DB{i:05d}' for i in range(101, 501)]
+
+    # the original drugs are copied unchanged
+    pd.testing.assert_frame_equal(tables['drugs'].iloc[:100].astype(str),
+                                  partial_tables['drugs'].astype(str))
+
+    # every child of a synthetic drug (but its IDs) is a child of one of the original drugs
+    def children(drug):
+        return [etree.tostring(child, with_tail=False) for child in drug if child.tag != f'{NAMESPACE}drugbank-id']
+
+    original = {child for drug in iter_drugbank_drugs(XML_PATH) for child in children(drug)}
+    for drug in iter_drugbank_drugs(str(out_path)):
+        if drug.findtext(f'{NAMESPACE}drugbank-id') > 'DB00100':
+            assert set(children(drug)) <= original
+
+
+def test_generate_drugs_matches_seed(tmp_path):
+    paths = [tmp_path / f'simulated_{i}.xml' for i in range(4)]
+    for path, seed in zip(paths, (1, 1, 2)):
+        generate_drugs(XML_PATH, path, total_drugs=300, seed=seed)
+    random.seed(1) # without a seed, the global generator is used
+    generate_drugs(XML_PATH, paths[3], total_drugs=300)
+
+    assert paths[0].read_bytes() == paths[1].read_bytes()
+    assert paths[0].read_bytes() != paths[2].read_bytes()
+    assert paths[0].read_bytes() == paths[3].read_bytes()
+
+
+def test_generate_shards(tmp_path):
+    manifest = generate_shards(XML_PATH, tmp_path / 'serial', total_drugs=1000, num_shards=3, seed=5, workers=1)
+    parallel = generate_shards(XML_PATH, tmp_path / 'parallel', total_drugs=1000, num_shards=3, seed=5, workers=3)
+
+    # byte-identical whatever the workers
+    for name in ['manifest.json'] + [shard['file'] for shard in manifest['shards']]:
+        assert (tmp_path / 'serial' / name).read_bytes() == (tmp_path / 'parallel' / name).read_bytes(), name
+    assert json.loads((tmp_path / 'serial' / 'manifest.json').read_text()) == manifest == parallel
+
+    ids = []
+    for shard in manifest['shards']:
+        shard_ids = list(load_tables(tmp_path / 'serial' / shard['file'], ['drugs'])['drugs']['drugbank_id'])
+        assert len(shard_ids) == shard['num_drugs']
+        assert shard_ids[-1] == shard['last_new_id']
+        ids += shard_ids
+    assert ids == sorted(set(ids)) and len(ids) == manifest['total_drugs'] == 1000, 'ID ranges should not overlap'
+    assert ids[:100] == [f'DB{i:05d}' for i in range(1, 101)], 'The original drugs should be in the first shard'
+
+    other_seed = generate_shards(XML_PATH, tmp_path / 'other', total_drugs=1000, num_shards=3, seed=6, manifest=False)
+    assert not (tmp_path / 'other' / 'manifest.json').exists()
+    assert [shard['sha256'] for shard in other_seed['shards']] != [shard['sha256'] for shard in manifest['shards']]
@@ -0,0 +1,75 @@
+import pytest
+import pandas as pd
+
+import analyses
+import sql
+from dataset import DrugBankDataset
+from transformations import load_tables
+
+XML_PATH = '../data/drugbank_partial.xml'
+
+# approved drugs with more than $min_pathways pathways, one of whose targets is a membrane protein
+MEMBRANE_QUERY = '''
+    SELECT DISTINCT g.drugbank_id::VARCHAR AS drugbank_id
+    FROM groups g
+    JOIN (SELECT drugbank_id FROM pathways_to_drugs GROUP BY 1 HAVING count(DISTINCT pathway_name) > $min_pathways) p
+        ON p.drugbank_id = g.drugbank_id
+    JOIN targets t ON t.drugbank_id = g.drugbank_id
+    WHERE g."group" = 'approved' AND t.cellular_location ILIKE '%membrane%'
+    ORDER BY 1
+'''
+
+
+@pytest.fixture(scope='module')
+def tables():
+    return load_tables(XML_PATH)
+
+
+@pytest.fixture(params=['tables', 'snapshot'])
+def source(request, tables, tmp_path):
+    # the same questions asked of the DataFrames and of the memory-mapped snapshot
+    if request.param == 'tables':
+        return tables
+    return sql.connect(XML_PATH, cache_dir=tmp_path / 'cache')
+
+
+def test_sql_analyses_match_pandas(source, tables):
+    assert sql.count_unique_pathways(source) == analyses.count_unique_pathways(tables['pathways'])
+    assert sql.approved_and_non_withdrawn_drugs(source) == analyses.approved_and_non_withdrawn_drugs(tables['groups'])
+
+    expected = analyses.count_pathways_per_drug(tables['pathways_to_drugs'])
+    pd.testing.assert_frame_equal(sql.count_pathways_per_drug(source), expected.astype({'drugbank_id': str}))
+
+    masks = analyses.build_group_masks(tables['groups'])
+    for include, exclude in [((), ()), (['investigational'], ['approved']), (['approved', 'vet_approved'], ()),
+                             (['approved'], ['unknown']), (['unknown'], ())]:
+        assert list(sql.drugs_matching_groups(source, include, exclude)) == \
+            list(analyses.drugs_matching_groups(masks, include, exclude))
+
+
+def test_query_across_tables(source, tables):
+    result = sql.query(MEMBRANE_QUERY, source, {'min_pathways': 0})
+
+    counts = analyses.count_pathways_per_drug(tables['pathways_to_drugs'])
+    targets = tables['targets']
+    membrane = targets.loc[targets['cellular_location'].str.contains('membrane', case=False, na=False), 'drugbank_id']
+    expected = sorted(
+        set(analyses.drugs_matching_groups(tables['groups'], include=['approved']))
+        & set(counts.loc[counts['num_pathways'] > 0, 'drugbank_id']) & set(membrane)
+    )
+    assert expected, 'The partial file should have such drugs'
+    assert list(result['drugbank_id']) == expected
+
+
+def test_dataset_query(tmp_path):
+    dataset = DrugBankDataset(XML_PATH)
+    result = dataset.query('SELECT "group"::VARCHAR AS "group", count(*) AS num_drugs FROM groups GROUP BY 1 ORDER BY 1')
+    assert dataset.computed() == ['groups'], 'Only the tables read by the query should be extracted'
+
+    expected = dataset.groups.groupby('group', observed=True).size()
+    assert dict(zip(result['group'], result['num_drugs'])) == expected.to_dict()
+
+    cached = DrugBankDataset(XML_PATH, cache_dir=tmp_path / 'cache')
+    pd.testing.assert_frame_equal(cached.query(MEMBRANE_QUERY, {'min_pathways': 0}),
+                                  dataset.query(MEMBRANE_QUERY, {'min_pathways': 0}))
+    assert cached.computed() == [], 'The snapshot should be queried without memoizing tables'
@@ -1,11 +1,16 @@
 import pytest
+import pandas as pd
 from transformations import (
     build_drugs_dataframe,
-    build_synonyms_dataframe
+    build_synonyms_dataframe,
+    build_targets_dataframe
+)
+from parsing import parse_drugbank_xml, iter_drugbank_drugs
+from lxml import etree
+from transformations import (
+    build_pathways_to_drugs_dataframe, build_all_dataframes, load_tables, required_elements, table_dtypes,
+    drug_id_columns, encode_drug_ids, drug_codes, decode_drug_codes, check_tables, TABLE_SCHEMAS
 )
-from parsing import parse_drugbank_xml
-from unittest.mock import Mock
-from transformations import build_pathways_to_drugs_dataframe
 
 def test_build_drugs_dataframe():
     root = parse_drugbank_xml('../data/drugbank_partial.xml')
@@ -32,28 +37,19 @@ def test_synonyms_include(drug_id, synonym):
 
 
 def test_build_pathways_to_drugs_dataframe():
-    root_mock = Mock() # This simulates the "root"
-    drug_mock = Mock() # This simulates <drug>
-    pathway_mock = Mock() # This simulates <pathway>
-    pathway_drug_mock = Mock() # This simulates <drugs><drug>
-
-    root_mock.findall.return_value = [drug_mock]
-
-    drug_mock.findall.return_value = [pathway_mock]
-
-    def pathway_findtext_side_effect(arg):
-        if arg.endswith('name'):
-            return 'pathway_name'
-        elif arg.endswith('smpdb-id'):
-            return 'SMP123'
-        return None
+    # a single <drug> with one <pathway> that lists one <drugs><drug>
+    root = etree.fromstring(
+        '<drugbank xmlns="http://www.drugbank.ca">'
+        '<drug><drugbank-id primary="true">DB00002</drugbank-id>'
+        '<pathways><pathway>'
+        '<smpdb-id>SMP123</smpdb-id><name>pathway_name</name>'
+        '<drugs><drug><drugbank-id>DB00001</drugbank-id><name>Lepirudin</name></drug></drugs>'
+        '</pathway></pathways>'
+        '</drug>'
+        '</drugbank>'
+    )
 
-    pathway_mock.findtext.side_effect = pathway_findtext_side_effect
-    pathway_mock.findall.return_value = [pathway_drug_mock]
-
-    pathway_drug_mock.findtext.return_value = 'DB00001'
-
-    df_pathways = build_pathways_to_drugs_dataframe(root_mock)
+    df_pathways = build_pathways_to_drugs_dataframe(root)
 
     assert len(df_pathways) == 1, 'Should return exactly one record'
     assert list(df_pathways.columns) == ['pathway_name', 'drugbank_id', 'smpdb-id'], \
@@ -63,3 +59,136 @@ def test_build_pathways_to_drugs_dataframe():
     assert row['pathway_name'] == 'pathway_name'
     assert row['drugbank_id'] == 'DB00001'
     assert row['smpdb-id'] == 'SMP123'
+
+
+def test_builders_accept_drug_stream():
+    root = parse_drugbank_xml('../data/drugbank_partial.xml')
+    df_from_root = build_synonyms_dataframe(root)
+    df_from_stream = build_synonyms_dataframe(iter_drugbank_drugs('../data/drugbank_partial.xml'))
+    pd.testing.assert_frame_equal(df_from_root, df_from_stream)
+
+
+def test_build_all_dataframes_rows():
+    root = etree.fromstring(
+        '<drugbank xmlns="http://www.drugbank.ca">'
+        '<drug type="biotech"><drugbank-id primary="true">DB00001</drugbank-id><drugbank-id>BTD00024</drugbank-id>'
+        '<name>Lepirudin</name><description>Recombinant hirudin</description><state>liquid</state>'
+        '<indication>Thrombosis</indication><mechanism-of-action>Binds thrombin</mechanism-of-action>'
+        '<synonyms><synonym>Hirudin variant-1</synonym><synonym>Lepirudin recombinant</synonym></synonyms>'
+        '<food-interactions><food-interaction>Avoid alcohol.</food-interaction>'
+        '<food-interaction>Take with food.</food-interaction></food-interactions>'
+        '</drug>'
+        '<drug type="small molecule"><drugbank-id primary="true">DB00002</drugbank-id><name>Cetuximab</name>'
+        '<synonyms><synonym>Cetuximabum</synonym></synonyms><food-interactions/>'
+        '<pathways><pathway><smpdb-id>SMP00001</smpdb-id><name>Cetuximab Action</name>'
+        '<drugs><drug><drugbank-id>DB00002</drugbank-id><name>Cetuximab</name></drug>'
+        '<drug><drugbank-id>DB00001</drugbank-id><name>Lepirudin</name></drug></drugs>'
+        '</pathway></pathways>'
+        '</drug>'
+        '</drugbank>'
+    )
+    tables = build_all_dataframes(root, tables=['drugs', 'synonyms', 'pathways_to_drugs'])
+
+    def rows(df):
+        return df.astype(object).where(df.notna(), None).values.tolist()
+
+    assert list(tables) == ['drugs', 'synonyms', 'pathways_to_drugs']
+    assert list(tables['drugs'].columns) == ['drugbank_id', 'name', 'type', 'description', 'form', 'indication',
+                                             'mechanism_of_action', 'food_interactions']
+    assert rows(tables['drugs']) == [
+        ['DB00001', 'Lepirudin', 'biotech', 'Recombinant hirudin', 'liquid', 'Thrombosis', 'Binds thrombin',
+         'Avoid alcohol.; Take with food.'],
+        ['DB00002', 'Cetuximab', 'small molecule', None, None, None, None, ''],
+    ]
+    assert list(tables['synonyms'].columns) == ['drugbank_id', 'synonym']
+    assert rows(tables['synonyms']) == [
+        ['DB00001', 'Hirudin variant-1'],
+        ['DB00001', 'Lepirudin recombinant'],
+        ['DB00002', 'Cetuximabum'],
+    ]
+    assert list(tables['pathways_to_drugs'].columns) == ['pathway_name', 'drugbank_id', 'smpdb-id']
+    assert rows(tables['pathways_to_drugs']) == [
+        ['Cetuximab Action', 'DB00002', 'SMP00001'],
+        ['Cetuximab Action', 'DB00001', 'SMP00001'],
+    ]
+    # the drug ID columns share one dictionary
+    assert all(list(df['drugbank_id'].cat.categories) == ['DB00001', 'DB00002'] for df in tables.values())
+
+
+def test_build_all_dataframes_unknown_table():
+    root = parse_drugbank_xml('../data/drugbank_partial.xml')
+    with pytest.raises(ValueError, match=r"Unknown tables: \['not_a_table'\]"):
+        build_all_dataframes(root, tables=['not_a_table'])
+    assert check_tables() == list(TABLE_SCHEMAS)
+    assert check_tables(('groups', 'drugs')) == ['groups', 'drugs']
+
+
+def test_build_targets_dataframe_schema_fields():
+    root = etree.fromstring(
+        '<drugbank xmlns="http://www.drugbank.ca">'
+        '<drug><drugbank-id primary="true">DB00001</drugbank-id>'
+        '<targets>'
+        '<target><id>BE1</id><polypeptide id="P1" source="Swiss-Prot"><name>Prothrombin</name><gene-name>F2</gene-name>'
+        '<external-identifiers>'
+        '<external-identifier><resource>UniProtKB</resource><identifier>P1</identifier></external-identifier>'
+        '<external-identifier><resource>GenAtlas</resource><identifier>F2</identifier></external-identifier>'
+        '</external-identifiers></polypeptide></target>'
+        '<target><id>BE2</id><polypeptide id="P2" source="Swiss-Prot"><gene-name>EGFR</gene-name></polypeptide></target>'
+        '<target><id>BE3</id></target>'
+        '</targets>'
+        '</drug>'
+        '</drugbank>'
+    )
+
+    df_targets = build_targets_dataframe(root)
+
+    assert df_targets['target_id'].tolist() == ['BE1', 'BE2'], 'Targets without a polypeptide are skipped'
+    assert df_targets['external_id'].tolist() == ['P1', 'P2']
+    assert df_targets['genatlas_id'].iloc[0] == 'F2'
+    assert pd.isna(df_targets['genatlas_id'].iloc[1]), 'No GenAtlas identifier should give a missing value'
+    assert df_targets['polypeptide_name'].iloc[0] == 'Prothrombin'
+    assert pd.isna(df_targets['polypeptide_name'].iloc[1])
+
+
+def test_load_tables_with_projection():
+    root = parse_drugbank_xml('../data/drugbank_partial.xml')
+    assert required_elements(['pathways_to_drugs']) == {'drugbank-id', 'pathways'}
+
+    tables = load_tables('../data/drugbank_partial.xml', ['pathways_to_drugs', 'groups'])
+    pd.testing.assert_frame_equal(tables['pathways_to_drugs'], build_pathways_to_drugs_dataframe(root))
+    pd.testing.assert_frame_equal(tables['groups'], build_all_dataframes(root, ['groups'])['groups'])
+
+
+def test_compact_dtypes():
+    root = parse_drugbank_xml('../data/drugbank_partial.xml')
+    tables = build_all_dataframes(root)
+
+    assert isinstance(tables['groups']['group'].dtype, pd.CategoricalDtype)
+    assert tables['groups']['drugbank_id'].dtype == table_dtypes('groups')['drugbank_id']
+    for table, df in tables.items():
+        for column, dtype in table_dtypes(table).items():
+            assert df[column].dtype == dtype, f'{table}.{column}'
+
+    empty = build_all_dataframes([], ['products'])['products']
+    assert empty.empty and list(empty.columns) == list(table_dtypes('products'))
+
+
+def test_shared_drug_id_dictionary():
+    root = parse_drugbank_xml('../data/drugbank_partial.xml')
+    tables = build_all_dataframes(root)
+
+    dtypes = {str(tables[table][column].dtype) for table in tables for column in drug_id_columns(table)}
+    assert len(dtypes) == 1, 'All drug ID columns should share one dictionary'
+    dictionary = tables['drugs']['drugbank_id'].cat.categories
+    assert list(dictionary) == sorted(dictionary)
+    assert set(tables['drug_interactions']['other_drugbank_id']) <= set(dictionary)
+
+    codes = drug_codes(tables['groups']['drugbank_id'])
+    assert codes.dtype == 'int32'
+    assert list(decode_drug_codes(codes, dictionary)) == list(tables['groups']['drugbank_id'])
+
+    # tables built separately are brought to one dictionary again
+    separate = {table: build_all_dataframes(root, [table])[table] for table in ['groups', 'drug_interactions']}
+    encoded = encode_drug_ids(separate)
+    assert encoded['groups']['drugbank_id'].dtype == encoded['drug_interactions']['other_drugbank_id'].dtype
+    pd.testing.assert_frame_equal(encoded['groups'], tables['groups'])
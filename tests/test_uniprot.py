@@ -0,0 +1,217 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+import pandas as pd
+import requests
+
+from analyses import annotate_targets_with_diseases, fetch_diseases_for_genes, get_diseases_related_to_drug
+import uniprot
+from uniprot import ResponseCache, TokenBucket, UniProtClient, cache_key, iter_json_results, run
+from uniprot_stand_in import UniProtStandIn
+
+
+@pytest.fixture
+def uniprot_server():
+    server = UniProtStandIn({})
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_diseases_related_to_drug(uniprot_server):
+    uniprot_server.genes = {'GENE1': ['Disease A', 'Disease B'], 'GENE2': []}
+    df_targets = pd.DataFrame({
+        'drugbank_id': ['DB00001', 'DB00001', 'DB00001', 'DB00002'],
+        'gene_name': ['GENE1', 'GENE2', None, 'GENE3'],
+    })
+
+    with UniProtClient(base_url=uniprot_server.url, rate=None) as client:
+        df_result = get_diseases_related_to_drug(df_targets, 'DB00001', client=client)
+
+    assert sorted(uniprot_server.queries) == ['gene:GENE1', 'gene:GENE2']
+    assert list(df_result.columns) == ['drugbank_id', 'gene_name', 'disease']
+    assert sorted(map(tuple, df_result.to_numpy())) == [
+        ('DB00001', 'GENE1', 'Disease A'),
+        ('DB00001', 'GENE1', 'Disease B'),
+        ('DB00001', 'GENE2', 'No info'),
+    ]
+
+
+def test_client_bounds_concurrency(uniprot_server):
+    uniprot_server.genes = {f'GENE{i}': [f'Disease {i}'] for i in range(12)}
+    uniprot_server.delay = 0.05
+
+    with UniProtClient(base_url=uniprot_server.url, concurrency=3, rate=None) as client:
+        diseases = fetch_diseases_for_genes(list(uniprot_server.genes), client)
+
+    assert diseases == {gene: names for gene, names in uniprot_server.genes.items()}
+    assert 1 < uniprot_server.max_in_flight <= 3, 'Requests should run concurrently, at most 3 at a time'
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_client_retries(uniprot_server, status):
+    uniprot_server.genes = {'GENE1': ['Disease A']}
+    uniprot_server.failures = 2
+    uniprot_server.failure_status = status
+
+    with UniProtClient(base_url=uniprot_server.url, rate=None, backoff=0.01) as client:
+        assert fetch_diseases_for_genes(['GENE1'], client) == {'GENE1': ['Disease A']}
+        assert client.requests_sent == 3
+
+    # out of retries
+    uniprot_server.failures = 3
+    with UniProtClient(base_url=uniprot_server.url, rate=None, backoff=0.01, max_retries=2) as client:
+        with pytest.raises(requests.HTTPError):
+            fetch_diseases_for_genes(['GENE1'], client)
+
+
+def test_token_bucket_rate():
+    async def acquire_all(bucket, count):
+        start = time.perf_counter()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.perf_counter() - start
+
+    # a burst of 5 is immediate, the 5 next tokens come at 50 per second
+    elapsed = asyncio.run(acquire_all(TokenBucket(rate=50, capacity=5), 10))
+    assert 0.08 <= elapsed < 1
+
+
+def test_response_cache_warm(uniprot_server, tmp_path):
+    uniprot_server.genes = {'GENE1': ['Disease A'], 'GENE2': ['Disease B']}
+    df_targets = pd.DataFrame({'drugbank_id': ['DB00001', 'DB00001'], 'gene_name': ['GENE1', 'GENE2']})
+    cache_path = tmp_path / 'uniprot.sqlite'
+
+    with UniProtClient(base_url=uniprot_server.url, rate=None, cache=ResponseCache(cache_path)) as client:
+        expected = get_diseases_related_to_drug(df_targets, 'DB00001', client=client)
+        stats = client.cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (0, 2, 2)
+
+    # a new client on the same file answers from the cache
+    with UniProtClient(base_url=uniprot_server.url, rate=None, cache=ResponseCache(cache_path)) as client:
+        pd.testing.assert_frame_equal(get_diseases_related_to_drug(df_targets, 'DB00001', client=client), expected)
+        assert (client.cache.hits, client.cache.misses, client.requests_sent) == (2, 0, 0)
+    assert len(uniprot_server.queries) == 2, 'A warm cache should make no network calls'
+
+    # offline clients serve expired entries and never fetch the others
+    with UniProtClient(base_url=uniprot_server.url, cache=ResponseCache(cache_path, ttl=0), offline=True) as client:
+        assert fetch_diseases_for_genes(['gene1'], client) == {'gene1': ['Disease A']}
+        with pytest.raises(KeyError):
+            fetch_diseases_for_genes(['GENE3'], client)
+    assert len(uniprot_server.queries) == 2
+
+
+def test_search_parses_cached_body_only_on_hits(uniprot_server, tmp_path, monkeypatch):
+    uniprot_server.genes = {'GENE1': ['Disease A']}
+    loads, json_loads = [], json.loads
+    monkeypatch.setattr(uniprot.json, 'loads', lambda body: loads.append(body) or json_loads(body))
+
+    with UniProtClient(base_url=uniprot_server.url, rate=None, cache=ResponseCache(tmp_path / 'cache.sqlite')) as client:
+        fetched = run(client.search_gene('GENE1'))
+        assert loads == [], 'Streamed pages should not be parsed again on a miss'
+        assert run(client.search_gene('GENE1')) == fetched
+        assert len(loads) == 1 and client.requests_sent == 1
+
+
+def test_response_cache_expiry_and_eviction(tmp_path):
+    assert cache_key('/search', {'query': ' gene:EGFR', 'format': 'json'}) == cache_key('/search', {'format': 'JSON', 'query': 'gene:egfr'})
+
+    cache = ResponseCache(tmp_path / 'expired.sqlite', ttl=0)
+    cache.put('a', b'1')
+    time.sleep(0.01)
+    assert cache.get('a') is None
+    assert cache.get('a', allow_expired=True) == b'1'
+
+    cache = ResponseCache(tmp_path / 'lru.sqlite', max_bytes=20)
+    for key in 'abc':
+        cache.put(key, b'x' * 6)
+        time.sleep(0.01)
+    assert cache.get('a') == b'x' * 6 # 'b' is now the least recently used
+    cache.put('d', b'x' * 6)
+    assert cache.get('b') is None
+    assert all(cache.get(key) for key in 'acd')
+    assert cache.stats()['bytes'] == 18
+
+
+def test_search_follows_pages(uniprot_server):
+    uniprot_server.genes = {f'GENE{i}': [] for i in range(5)}
+    with UniProtClient(base_url=uniprot_server.url, rate=None) as client:
+        results = run(client.search(' OR '.join(f'gene:GENE{i}' for i in range(5)), ['accession', 'genes'], size=2))
+    assert [entry['primaryAccession'] for entry in results['results']] == [f'PGENE{i}' for i in range(5)]
+    assert len(uniprot_server.queries) == 3
+    assert all(params['fields'] == 'accession,genes' for params in uniprot_server.requests)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_iter_json_results(chunk_size):
+    document = {
+        'warnings': [{'message': 'x]}', 'count': 12345}],
+        'results': [{'name': 'ä€\U0001F600', 'values': [1.5, -2e3, None, True]}, [], 'text', 678, {}],
+        'total': 98765,
+    }
+    body = json.dumps(document, ensure_ascii=False, indent=1).encode()
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    assert list(iter_json_results(chunks)) == document['results']
+
+    assert list(iter_json_results([b'{"results": []}'])) == []
+    assert list(iter_json_results([b' { } '])) == []
+    with pytest.raises(ValueError):
+        list(iter_json_results([b'{"results": [1, 2']))
+
+
+def test_annotate_targets_with_diseases(uniprot_server, tmp_path):
+    uniprot_server.genes = {f'GENE{i}': [f'Disease {i}', f'Disease {i % 3}'] for i in range(1, 7)}
+    uniprot_server.genes['GENE7'] = []
+    df_targets = pd.DataFrame({
+        'drugbank_id': ['DB00001', 'DB00001', 'DB00002', 'DB00003', 'DB00003', 'DB00004'],
+        'gene_name': ['GENE1', 'GENE2', 'GENE2', 'GENE7', None, 'GENE8'],
+    })
+    df_targets = pd.concat([df_targets] + [pd.DataFrame({'drugbank_id': [f'DB0001{i}'], 'gene_name': [f'GENE{i}']})
+                                           for i in range(3, 7)], ignore_index=True)
+
+    with UniProtClient(base_url=uniprot_server.url, rate=None) as client:
+        df_result = annotate_targets_with_diseases(df_targets, client, batch_size=3)
+        uniprot_server.queries.clear()
+        pd.testing.assert_frame_equal(annotate_targets_with_diseases(df_targets, client, batch_size=3), df_result)
+        assert len(uniprot_server.queries) == 3, 'Every gene should be resolved once, 3 per query'
+
+    with UniProtClient(base_url=uniprot_server.url, rate=None) as client:
+        expected = pd.concat([get_diseases_related_to_drug(df_targets, drug_id, client=client)
+                              for drug_id in df_targets['drugbank_id'].unique()], ignore_index=True)
+    key = ['drugbank_id', 'gene_name', 'disease']
+    assert sorted(map(tuple, df_result[key].to_numpy())) == sorted(map(tuple, expected[key].to_numpy()))
+
+    # interrupted run: one batch fails, the next run queries only that gene
+    checkpoint_path = tmp_path / 'checkpoint.jsonl'
+    uniprot_server.queries.clear()
+    uniprot_server.failures = 1
+    with UniProtClient(base_url=uniprot_server.url, rate=None, concurrency=1, max_retries=0) as client:
+        with pytest.raises(requests.HTTPError):
+            annotate_targets_with_diseases(df_targets, client, batch_size=1, checkpoint_path=checkpoint_path)
+        resumed = annotate_targets_with_diseases(df_targets, client, batch_size=1, checkpoint_path=checkpoint_path)
+    pd.testing.assert_frame_equal(resumed, df_result)
+    assert sorted(uniprot_server.queries) == sorted(set(uniprot_server.queries)), 'No gene should be fetched twice'
+    assert len(uniprot_server.queries) == 8
+    assert len(open(checkpoint_path).readlines()) == 8
+
+
+def test_annotate_resumes_after_truncated_checkpoint(uniprot_server, tmp_path):
+    uniprot_server.genes = {'GENEA': ['Disease A'], 'GENEB': ['Disease B'], 'GENEC': []}
+    df_targets = pd.DataFrame({'drugbank_id': ['DB00001', 'DB00002', 'DB00003'],
+                               'gene_name': ['GENEA', 'GENEB', 'GENEC']})
+    checkpoint_path = tmp_path / 'checkpoint.jsonl'
+    # the write of GENEB's record was interrupted
+    checkpoint_path.write_text('{"gene": "GENEA", "diseases": ["Disease A"]}\n{"gene": "GENEB", "dis')
+
+    with UniProtClient(base_url=uniprot_server.url, rate=None) as client:
+        first = annotate_targets_with_diseases(df_targets, client, batch_size=1, checkpoint_path=checkpoint_path)
+        assert len(uniprot_server.queries) == 2, 'Only GENEB and GENEC should be queried'
+        uniprot_server.queries.clear()
+        second = annotate_targets_with_diseases(df_targets, client, batch_size=1, checkpoint_path=checkpoint_path)
+    assert uniprot_server.queries == [], 'No gene should be queried again'
+    pd.testing.assert_frame_equal(first, second)
+    assert sorted(json.loads(line)['gene'] for line in open(checkpoint_path)) == ['GENEA', 'GENEB', 'GENEC']
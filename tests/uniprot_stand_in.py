@@ -0,0 +1,92 @@
+# Local HTTP stand-in for the UniProt REST API, served by the uniprot_server fixture of test_uniprot.py
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+
+class UniProtStandIn(ThreadingHTTPServer):
+    """
+    Local stand-in for rest.uniprot.org answering /uniprotkb/search?query=gene:X
+    (or (gene:"X" OR gene:"Y"...)) with one entry per gene of `genes`
+    ({gene: [disease IDs]}), `size` entries per page linked by cursors.
+    The first `failures` requests are answered with `failure_status`,
+    every answer is delayed by `delay` seconds.
+    """
+    daemon_threads = True
+
+    def __init__(self, genes):
+        super().__init__(('127.0.0.1', 0), _UniProtHandler)
+        self.genes = genes
+        self.failures = 0
+        self.failure_status = 429
+        self.delay = 0
+        self.queries = []
+        self.requests = [] # parameters of the answered requests
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def entries(self, query):
+        genes = re.findall(r'gene:"?([^"\s)]+)"?', query)
+        return [{
+            'primaryAccession': f'P{gene}',
+            'genes': [{'geneName': {'value': gene}}],
+            'comments': [{'commentType': 'DISEASE', 'disease': {'diseaseId': disease}}
+                         for disease in self.genes[gene]],
+        } for gene in genes if gene in self.genes]
+
+
+class _UniProtHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            failing = server.failures > 0
+            server.failures -= failing
+        try:
+            time.sleep(server.delay)
+            if failing:
+                self._send(server.failure_status, b'{}')
+                return
+            url = urlparse(self.path)
+            params = dict(parse_qsl(url.query))
+            with server.lock:
+                server.queries.append(params.get('query', ''))
+                server.requests.append(params)
+
+            entries = server.entries(params.get('query', ''))
+            size = int(params.get('size', 25))
+            start = int(params.get('cursor', 0))
+            headers = []
+            if start + size < len(entries):
+                next_url = f'{server.url}{url.path}?{urlencode({**params, "cursor": start + size})}'
+                headers.append(('Link', f'<{next_url}>; rel="next"'))
+            body = json.dumps({'results': entries[start:start + size]}).encode()
+            self._send(200, body, headers)
+        finally:
+            with server.lock:
+                server.in_flight -= 1